@@ -0,0 +1,279 @@
+"""
+Massenvalidierung von H5P-Inhalten (Korpus-Gate für Extraktion und Generierung).
+
+Quellen:
+  - JSONL (auch .jsonl.gz): Zeilen mit "output"-Feld (Trainingspaare, der
+    String wird als content.json geprüft) oder direkt content.json-Objekte
+  - Verzeichnisse mit .h5p/.zip-Paketen (content/content.json)
+
+Der Content-Typ (H5P.MultiChoice, H5P.TrueFalse, ...) kommt aus h5p.json bzw.
+einem "mainLibrary"-Feld der JSONL-Zeile, sonst wird er erkannt (siehe
+validator_registry); gemischte Korpora laufen so in einem Durchgang.
+
+Der Hauptprozess liest nur Rohbytes in großen Blöcken; Parsen und Prüfen
+laufen in einem Prozess-Pool. Pro Datensatz werden ALLE Verstöße gesammelt,
+zusätzlich entsteht ein Fehler-Histogramm (Ziffern normalisiert, z.B.
+"Antwort #: Fehlendes Feld 'text'").
+
+Start:
+    python -m src.bulk_validation data/processed/train_data.jsonl data/raw --report invalid.jsonl
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from src import validator_registry
+
+CHUNK_BYTES = 4 * 1024 * 1024  # Leseblock für JSONL
+H5P_BATCH_SIZE = 256  # Pakete pro Worker-Auftrag
+_DIGITS = re.compile(r"\b\d+\b")  # nur freistehende Zahlen (Indizes), nicht "H5P"
+
+
+@dataclass
+class ValidationSummary:
+    """Aggregat über alle geprüften Datensätze"""
+    total: int = 0
+    valid: int = 0
+    bytes_read: int = 0
+    seconds: float = 0.0
+    histogram: Counter = field(default_factory=Counter)
+
+    @property
+    def invalid(self) -> int:
+        return self.total - self.valid
+
+    @property
+    def records_per_second(self) -> float:
+        return self.total / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes_read / 1024 ** 2 / self.seconds if self.seconds > 0 else 0.0
+
+    def add_batch(self, total: int, valid: int, histogram: Counter, bytes_read: int):
+        self.total += total
+        self.valid += valid
+        self.bytes_read += bytes_read
+        self.histogram.update(histogram)
+
+
+def error_kind(message: str) -> str:
+    """Histogramm-Schlüssel: Ziffern normalisieren, JSON-Fehlerposition abschneiden"""
+    if message.startswith("Invalides JSON"):
+        return "Invalides JSON: " + message.split(": ", 1)[-1].split(":", 1)[0]
+    return _DIGITS.sub("#", message)
+
+
+def content_violations(data, main_library: Optional[str] = None) -> List[str]:
+    """Alle Verstöße einer geparsten content.json (Typ per mainLibrary oder erkannt)"""
+    return validator_registry.validate(data, main_library)
+
+
+def record_violations(line: str) -> List[str]:
+    """
+    Alle Verstöße einer JSONL-Zeile (Trainingspaar mit "output" oder direkt content.json).
+    Ein optionales Feld "mainLibrary" im Trainingspaar legt den Content-Typ fest.
+    """
+    main_library = None
+    try:
+        record = json.loads(line)
+        if isinstance(record, dict) and isinstance(record.get("output"), str):
+            main_library = record.get("mainLibrary")
+            record = json.loads(record["output"])
+    except json.JSONDecodeError as e:
+        return [f"Invalides JSON: {e}"]
+    return content_violations(record, main_library)
+
+
+def read_h5p_package(path: str) -> Tuple[Optional[dict], Optional[str]]:
+    """content.json und mainLibrary (aus h5p.json) eines Pakets"""
+    from src.extract_h5p import extract_h5p_content_json
+
+    content = extract_h5p_content_json(path)
+    main_library = None
+    with zipfile.ZipFile(path) as package:
+        try:
+            main_library = json.loads(package.read("h5p.json")).get("mainLibrary")
+        except (KeyError, json.JSONDecodeError):
+            pass
+    return content, main_library
+
+
+# --------------------------------------
+# Worker (laufen im Prozess-Pool)
+# --------------------------------------
+
+def _validate_jsonl_block(job: Tuple[str, int, bytes]):
+    """Prüft einen Block ganzer Zeilen; liefert Zähler, Histogramm und ungültige Datensätze"""
+    source, first_line, block = job
+    total = valid = 0
+    histogram = Counter()
+    invalid = []
+    for offset, raw in enumerate(block.split(b"\n")):
+        line = raw.strip()
+        if not line:
+            continue
+        total += 1
+        errors = record_violations(line.decode("utf-8", errors="replace"))
+        if not errors:
+            valid += 1
+            continue
+        histogram.update(error_kind(error) for error in errors)
+        invalid.append({"source": source, "line": first_line + offset, "errors": errors})
+    return total, valid, histogram, invalid, len(block)
+
+
+def _validate_h5p_batch(paths: List[str]):
+    """Prüft eine Liste von .h5p-Paketen (ZIP lesen + content.json nach mainLibrary prüfen)"""
+    total = valid = bytes_read = 0
+    histogram = Counter()
+    invalid = []
+    for path in paths:
+        total += 1
+        bytes_read += os.path.getsize(path)
+        try:
+            content, main_library = read_h5p_package(path)
+            errors = ["content.json nicht gefunden"] if content is None else content_violations(content, main_library)
+        except json.JSONDecodeError as e:
+            errors = [f"Invalides JSON: {e}"]
+        except Exception as e:
+            errors = [f"Paket nicht lesbar: {type(e).__name__}"]
+        if not errors:
+            valid += 1
+            continue
+        histogram.update(error_kind(error) for error in errors)
+        invalid.append({"source": path, "line": None, "errors": errors})
+    return total, valid, histogram, invalid, bytes_read
+
+
+# --------------------------------------
+# Job-Erzeugung (Hauptprozess, nur I/O)
+# --------------------------------------
+
+def _open_binary(path: Path):
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+def _jsonl_jobs(path: Path) -> Iterator[Tuple[str, int, bytes]]:
+    """Liest große Blöcke und schneidet sie an der letzten Zeilengrenze"""
+    line_number = 1
+    rest = b""
+    with _open_binary(path) as f:
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            chunk = rest + chunk
+            cut = chunk.rfind(b"\n")
+            if cut < 0:
+                rest = chunk
+                continue
+            block, rest = chunk[:cut], chunk[cut + 1:]
+            yield str(path), line_number, block
+            line_number += block.count(b"\n") + 1
+    if rest.strip():
+        yield str(path), line_number, rest
+
+
+def _h5p_jobs(directory: Path) -> Iterator[List[str]]:
+    from src.extract_h5p import H5P_EXTENSIONS
+
+    batch = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(H5P_EXTENSIONS):
+                batch.append(os.path.join(root, name))
+                if len(batch) == H5P_BATCH_SIZE:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def _bounded_map(pool: ProcessPoolExecutor, fn: Callable, jobs: Iterable, max_pending: int) -> Iterator:
+    """Wie pool.map, aber mit begrenzter Zahl offener Aufträge (konstanter Speicher)"""
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.submit(fn, job))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def validate_paths(
+    paths: List[Path],
+    workers: Optional[int] = None,
+    on_invalid: Optional[Callable[[dict], None]] = None
+) -> ValidationSummary:
+    """
+    Validiert JSONL-Dateien und .h5p-Verzeichnisse parallel.
+    on_invalid wird für jeden ungültigen Datensatz mit {source, line, errors} aufgerufen.
+    """
+    workers = workers or os.cpu_count() or 1
+    summary = ValidationSummary()
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path in map(Path, paths):
+            if path.is_dir():
+                results = _bounded_map(pool, _validate_h5p_batch, _h5p_jobs(path), workers * 2)
+            else:
+                results = _bounded_map(pool, _validate_jsonl_block, _jsonl_jobs(path), workers * 2)
+            for total, valid, histogram, invalid, bytes_read in results:
+                summary.add_batch(total, valid, histogram, bytes_read)
+                if on_invalid is not None:
+                    for record in invalid:
+                        on_invalid(record)
+
+    summary.seconds = time.perf_counter() - start
+    return summary
+
+
+def print_summary(summary: ValidationSummary, top: int = 20):
+    print(
+        f"📊 {summary.total} Datensätze: {summary.valid} valide, {summary.invalid} ungültig "
+        f"({summary.records_per_second:,.0f} Datensätze/s, {summary.mb_per_second:.1f} MB/s)"
+    )
+    if summary.histogram:
+        print("Fehler-Histogramm:")
+        for kind, count in summary.histogram.most_common(top):
+            print(f"  {count:>9}  {kind}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Massenvalidierung von H5P-Inhalten (JSONL oder .h5p-Ordner)")
+    parser.add_argument("paths", type=Path, nargs="+", help="JSONL-Dateien (.jsonl, .jsonl.gz) und/oder Ordner mit .h5p")
+    parser.add_argument("--workers", type=int, default=None, help="Prozesse (Standard: alle CPUs)")
+    parser.add_argument("--report", type=Path, default=None, help="JSONL mit allen Verstößen pro ungültigem Datensatz")
+    parser.add_argument("--top", type=int, default=20, help="Zeilen im Fehler-Histogramm")
+    parser.add_argument("--max-invalid-ratio", type=float, default=0.0,
+                        help="Exit-Code 1, wenn der Anteil ungültiger Datensätze darüber liegt")
+    args = parser.parse_args()
+
+    report = open(args.report, "w", encoding="utf-8") if args.report else None
+    try:
+        on_invalid = (lambda record: report.write(json.dumps(record, ensure_ascii=False) + "\n")) if report else None
+        summary = validate_paths(args.paths, args.workers, on_invalid)
+    finally:
+        if report:
+            report.close()
+
+    print_summary(summary, args.top)
+    if summary.total and summary.invalid / summary.total > args.max_invalid_ratio:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Asynchrone, Adapter-only Checkpoints.
+
+Beim Speichern werden nur die trainierbaren LoRA-Tensoren, der Optimizer-/
+Scheduler-Zustand, der TrainerState und die RNG-Zustände in den Arbeitsspeicher
+kopiert; ein Hintergrund-Thread schreibt sie in ein temporäres Verzeichnis und
+benennt es atomar in checkpoint-<step> um. Ein sichtbares checkpoint-<step>
+ist damit immer vollständig.
+
+Die Dateinamen entsprechen dem Trainer-Format (adapter_model.safetensors,
+optimizer.pt, scheduler.pt, trainer_state.json, rng_state.pth), sodass
+Trainer.train(resume_from_checkpoint=...) inkl. Überspringen bereits gesehener
+Batches direkt funktioniert.
+"""
+
+import copy
+import dataclasses
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import torch
+from peft.utils import get_peft_model_state_dict
+from safetensors.torch import save_file
+from transformers import TrainerCallback
+
+CHECKPOINT_PATTERN = re.compile(r"^checkpoint-(\d+)$")
+TMP_PREFIX = ".tmp-"
+REQUIRED_FILES = ("adapter_model.safetensors", "optimizer.pt", "trainer_state.json")
+
+
+def _snapshot(value: Any) -> Any:
+    """Kopiert verschachtelte Optimizer-/Scheduler-Zustände (Tensoren werden geklont)"""
+    if isinstance(value, torch.Tensor):
+        return value.detach().clone()
+    if isinstance(value, dict):
+        return {key: _snapshot(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_snapshot(item) for item in value)
+    return copy.deepcopy(value)
+
+
+def list_checkpoints(output_dir: Path) -> list:
+    """Vollständige checkpoint-<step>-Verzeichnisse, aufsteigend nach Schritt"""
+    output_dir = Path(output_dir)
+    if not output_dir.exists():
+        return []
+    checkpoints = []
+    for path in output_dir.iterdir():
+        match = CHECKPOINT_PATTERN.match(path.name)
+        if match and path.is_dir() and all((path / name).exists() for name in REQUIRED_FILES):
+            checkpoints.append((int(match.group(1)), path))
+    return [path for _, path in sorted(checkpoints)]
+
+
+def find_latest_checkpoint(output_dir: Path) -> Optional[Path]:
+    """Neuester vollständiger Checkpoint (ältere bzw. halb geschriebene werden ignoriert)"""
+    checkpoints = list_checkpoints(output_dir)
+    return checkpoints[-1] if checkpoints else None
+
+
+class AsyncCheckpointCallback(TrainerCallback):
+    """
+    Ersetzt das blockierende Trainer-Speichern (save_strategy="no").
+    Im Trainingsloop wird nur kopiert; Serialisierung, Umbenennen und
+    Aufräumen alter Checkpoints laufen auf einem Hintergrund-Thread.
+    """
+
+    def __init__(self, output_dir: Path, save_steps: int, save_total_limit: Optional[int], logger: logging.Logger):
+        self.output_dir = Path(output_dir)
+        self.save_steps = save_steps
+        self.save_total_limit = save_total_limit
+        self.logger = logger
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-writer")
+        self._pending: Optional[Future] = None
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        # Reste eines abgebrochenen Laufs (nie umbenannt → unvollständig)
+        if state.is_world_process_zero and self.output_dir.exists():
+            for stale in self.output_dir.glob(f"{TMP_PREFIX}checkpoint-*"):
+                shutil.rmtree(stale, ignore_errors=True)
+
+    def on_step_end(self, args, state, control, model=None, optimizer=None, lr_scheduler=None, **kwargs):
+        if self.save_steps <= 0 or state.global_step % self.save_steps != 0:
+            return
+        # DDP: Zustände sind auf allen Ranks identisch → nur Rank 0 schreibt
+        if not state.is_world_process_zero:
+            return
+
+        # Höchstens ein Schreibvorgang gleichzeitig (begrenzt den Speicher für Snapshots)
+        if self._pending is not None and not self._pending.done():
+            wait_start = time.perf_counter()
+            wait([self._pending])
+            self.logger.warning(
+                f"⏳ Checkpoint-Writer hinkt hinterher: {time.perf_counter() - wait_start:.1f}s gewartet"
+            )
+
+        start = time.perf_counter()
+        snapshot = {
+            "step": state.global_step,
+            "adapter": {name: tensor.detach().clone() for name, tensor in get_peft_model_state_dict(model).items()},
+            "adapter_config": model.peft_config[model.active_adapter],
+            "optimizer": _snapshot(optimizer.state_dict()),
+            "scheduler": _snapshot(lr_scheduler.state_dict()) if lr_scheduler is not None else None,
+            "trainer_state": json.dumps(dataclasses.asdict(state), indent=2, sort_keys=True) + "\n",
+            "rng_state": {
+                "python": random.getstate(),
+                "numpy": np.random.get_state(),
+                "cpu": torch.random.get_rng_state(),
+            },
+        }
+        self.logger.info(
+            f"💾 Checkpoint-Snapshot Schritt {state.global_step} in {time.perf_counter() - start:.2f}s "
+            f"(Schreiben im Hintergrund)"
+        )
+        self._pending = self._executor.submit(self._write, snapshot)
+        self._pending.add_done_callback(self._report_error)
+
+    def _report_error(self, future: Future):
+        if future.exception() is not None:
+            self.logger.error(f"❌ Checkpoint schreiben fehlgeschlagen: {future.exception()}")
+
+    def _write(self, snapshot: dict):
+        """Läuft auf dem Writer-Thread: temporär schreiben → atomar umbenennen → aufräumen"""
+        name = f"checkpoint-{snapshot['step']}"
+        final_dir = self.output_dir / name
+        tmp_dir = self.output_dir / f"{TMP_PREFIX}{name}"
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+
+        save_file(snapshot["adapter"], str(tmp_dir / "adapter_model.safetensors"), metadata={"format": "pt"})
+        snapshot["adapter_config"].save_pretrained(str(tmp_dir))
+        torch.save(snapshot["optimizer"], tmp_dir / "optimizer.pt")
+        if snapshot["scheduler"] is not None:
+            torch.save(snapshot["scheduler"], tmp_dir / "scheduler.pt")
+        torch.save(snapshot["rng_state"], tmp_dir / "rng_state.pth")
+        # trainer_state.json zuletzt: erst mit ihr gilt der Checkpoint als vollständig
+        (tmp_dir / "trainer_state.json").write_text(snapshot["trainer_state"], encoding="utf-8")
+
+        if final_dir.exists():
+            shutil.rmtree(final_dir)
+        os.replace(tmp_dir, final_dir)
+        self.logger.info(f"✓ Checkpoint geschrieben: {final_dir}")
+        self._prune()
+
+    def _prune(self):
+        if not self.save_total_limit:
+            return
+        checkpoints = list_checkpoints(self.output_dir)
+        for old in checkpoints[:-self.save_total_limit]:
+            shutil.rmtree(old, ignore_errors=True)
+            self.logger.info(f"🗑️ Alter Checkpoint entfernt: {old.name}")
+
+    def wait(self):
+        """Blockiert, bis alle ausstehenden Checkpoints geschrieben sind"""
+        if self._pending is not None:
+            wait([self._pending])
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self.wait()
+        self._executor.shutdown(wait=True)
@@ -9,6 +9,17 @@ class DataConfig:
     train_path: Path = Path("data/processed/train_data.jsonl")
     eval_path: Optional[Path] = None
     max_length: int = 1024  # H5P-JSONs sind länger
+    max_length_low_memory: int = 2048  # gilt mit TrainingConfig.low_memory (lange H5P-Typen ohne Kürzung)
+    dynamic_padding: bool = False  # Pro Batch nur bis zum längsten Beispiel auffüllen (opt-in)
+    packing: bool = False  # Mehrere kurze Beispiele in einen Block von max_length packen
+    cache_dir: Optional[Path] = Path("data/cache/tokenized")  # None = kein Tokenisierungs-Cache
+    num_proc: int = 4  # Prozesse für die Tokenisierung bei Cache-Miss
+    # Streaming für Korpora größer als der Arbeitsspeicher
+    streaming: bool = False
+    train_shards: Optional[str] = None  # Glob, z.B. "data/processed/train-*.jsonl.gz"
+    shuffle_buffer_size: int = 10_000
+    shuffle_seed: int = 42
+    validation_sample_every: int = 100  # JSON-Prüfung jedes n-ten Datensatzes
 
 
 @dataclass
@@ -47,7 +58,38 @@ class TrainingConfig:
     eval_steps: int = 100
     use_fp16: bool = False
     save_total_limit: int = 3
+    async_checkpointing: bool = True  # Adapter-only Checkpoints im Hintergrund statt Trainer-Speichern
+    resume: bool = False  # Vom neuesten vollständigen Checkpoint in output_dir fortsetzen (bewusst aktivieren)
     max_grad_norm: float = 1.0
+    # Speichersparendes Profil: bf16-Basisgewichte, fp32-LoRA, bf16-Autocast, Gradient Checkpointing
+    low_memory: bool = False
+    max_steps: int = -1  # Pflicht im Streaming-Modus (Datensatzlänge unbekannt)
+    # Datenparalleles CPU-Training (gloo, ein Rank pro NUMA-Knoten)
+    distributed: bool = False
+    num_ranks: Optional[int] = None  # None = Anzahl NUMA-Knoten
+    threads_per_rank: Optional[int] = None  # None = alle CPUs des Knotens
+
+
+@dataclass
+class ProfilingConfig:
+    """torch.profiler-Mitschnitt (opt-in)"""
+    enabled: bool = False
+    wait_steps: int = 1  # Schritte/Anfragen ohne Aufzeichnung
+    warmup_steps: int = 1  # aufgezeichnet, aber verworfen
+    active_steps: int = 3  # ausgewertet
+    output_dir: Path = Path("outputs/profiles")
+    row_limit: int = 30  # Zeilen der Top-Ops-Tabelle
+    record_shapes: bool = True
+
+
+@dataclass
+class ResultCacheConfig:
+    """Ergebnis-Cache für validierte Generierungen (siehe result_cache.py)"""
+    enabled: bool = True
+    memory_entries: int = 1024  # LRU im Arbeitsspeicher
+    path: Optional[Path] = Path("outputs/cache/results.sqlite")  # None = nur Arbeitsspeicher
+    ttl_seconds: Optional[float] = 7 * 24 * 3600  # None = kein Ablauf
+    max_disk_bytes: int = 256 * 1024 ** 2  # Größenlimit der SQLite-Stufe (LRU-Verdrängung)
 
 
 @dataclass
@@ -57,5 +99,6 @@ class Config:
     model: ModelConfig = field(default_factory=ModelConfig)
     lora: LoRAConfig = field(default_factory=LoRAConfig)
     training: TrainingConfig = field(default_factory=TrainingConfig)
+    profiling: ProfilingConfig = field(default_factory=ProfilingConfig)
 
 
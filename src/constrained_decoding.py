@@ -0,0 +1,332 @@
+"""
+Grammar-Constrained Decoding für H5P-MultipleChoice (STRICT MODE).
+
+Das Schema entspricht den Regeln aus H5PValidator.validate_multiple_choice:
+- question: nicht-leerer String
+- answers: mindestens 2 Objekte mit text (nicht-leer) und correct (bool),
+  mindestens eine Antwort mit correct = true
+- behaviour.singleAnswer: bool, true nur bei genau 1 richtigen Antwort
+- overallFeedback: Liste
+
+Das Schema wird einmal in ein flaches Programm (Zeichen-Automat) übersetzt.
+TokenAutomaton legt darüber einen Trie des Tokenizer-Vokabulars und cached
+pro Zustand die erlaubten Token-IDs. Der LogitsProcessor maskiert damit
+alle Tokens, die das Dokument ungültig machen würden.
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from transformers import LogitsProcessor
+
+
+# --------------------------------------
+# Schema-Beschreibung
+# --------------------------------------
+
+def obj(*fields):
+    return ("object", fields)
+
+
+def arr(item, min_items: int, max_items: int, guard: Optional[str] = None):
+    return ("array", item, min_items, max_items, guard)
+
+
+def string(non_empty: bool = True):
+    return ("string", non_empty)
+
+
+def boolean(tag: Optional[str] = None):
+    return ("bool", tag)
+
+
+def integer():
+    return ("int",)
+
+
+# Reihenfolge und Trennzeichen wie json.dumps() im Trainingskorpus
+MULTICHOICE_SCHEMA = obj(
+    ("question", string()),
+    ("answers", arr(
+        obj(("text", string()), ("correct", boolean("correct"))),
+        min_items=2, max_items=8, guard="has_correct"
+    )),
+    ("behaviour", obj(("singleAnswer", boolean("single_answer")))),
+    ("overallFeedback", arr(
+        obj(("from", integer()), ("to", integer()), ("text", string(non_empty=False))),
+        min_items=1, max_items=4
+    )),
+)
+
+
+# --------------------------------------
+# Zeichen-Automat
+# --------------------------------------
+
+# Opcodes
+_WS, _LIT, _STR, _BOOL, _INT, _LOOP = range(6)
+
+_ESCAPES = '"\\/bfnrt'
+_WS_ESCAPES = "fnrt"  # Escapes, die str.strip() wieder entfernen würde
+_MAX_INT_DIGITS = 4
+
+# Zustand: (pc, sub, flag, correct_count, items)
+State = Tuple[int, int, int, int, int]
+
+
+class JsonGrammar:
+    """Deterministischer Zeichen-Automat für ein kompiliertes Schema"""
+
+    def __init__(self, schema=MULTICHOICE_SCHEMA):
+        self.ops: List[tuple] = [(_WS,)]
+        self._compile(schema)
+
+    def _compile(self, node):
+        kind = node[0]
+        if kind == "object":
+            for i, (key, child) in enumerate(node[1]):
+                prefix = "{" if i == 0 else ", "
+                self.ops.append((_LIT, f"{prefix}{json.dumps(key)}: "))
+                self._compile(child)
+            self.ops.append((_LIT, "}"))
+        elif kind == "array":
+            _, item, min_items, max_items, guard = node
+            self.ops.append((_LIT, "["))
+            body_pc = None
+            for i in range(min_items):
+                if i > 0:
+                    self.ops.append((_LIT, ", "))
+                body_pc = len(self.ops)
+                self._compile(item)
+            self.ops.append((_LOOP, body_pc, min_items, max_items, guard))
+        elif kind == "string":
+            self.ops.append((_STR, node[1]))
+        elif kind == "bool":
+            self.ops.append((_BOOL, node[1]))
+        elif kind == "int":
+            self.ops.append((_INT,))
+        else:
+            raise ValueError(f"Unbekannter Schema-Knoten: {kind}")
+
+    def initial_state(self) -> State:
+        return (0, 0, 0, 0, 0)
+
+    def is_done(self, state: State) -> bool:
+        return state[0] == len(self.ops)
+
+    def step(self, state: State, ch: str) -> Optional[State]:
+        """Konsumiert ein Zeichen; None = Zeichen nicht erlaubt"""
+        pc, sub, flag, correct, items = state
+        if pc == len(self.ops):
+            return None
+
+        op = self.ops[pc]
+        code = op[0]
+
+        if code == _WS:
+            if sub == 0 and ch in " \n":
+                return (pc, 1, 0, correct, items)
+            return self.step((pc + 1, 0, 0, correct, items), ch)
+
+        if code == _LIT:
+            text = op[1]
+            if text[sub] != ch:
+                return None
+            if sub + 1 == len(text):
+                return (pc + 1, 0, 0, correct, items)
+            return (pc, sub + 1, 0, correct, items)
+
+        if code == _STR:
+            non_empty = op[1]
+            if sub == 0:
+                return (pc, 1, 0, correct, items) if ch == '"' else None
+            if sub == 1:
+                if ch == '"':
+                    if non_empty and not flag:
+                        return None
+                    return (pc + 1, 0, 0, correct, items)
+                if ch == "\\":
+                    return (pc, 2, flag, correct, items)
+                if ch < " ":
+                    return None
+                return (pc, 1, flag or int(not ch.isspace()), correct, items)
+            # sub == 2: nach Backslash (\u-Escapes sind nicht erlaubt)
+            if ch not in _ESCAPES:
+                return None
+            return (pc, 1, flag or int(ch not in _WS_ESCAPES), correct, items)
+
+        if code == _BOOL:
+            tag = op[1]
+            if sub == 0:
+                if ch == "t":
+                    if tag == "single_answer" and correct != 1:
+                        return None
+                    return (pc, 1, 0, correct, items)
+                if ch == "f":
+                    return (pc, 11, 0, correct, items)
+                return None
+            literal, pos = ("true", sub) if sub < 10 else ("false", sub - 10)
+            if literal[pos] != ch:
+                return None
+            if pos + 1 < len(literal):
+                return (pc, sub + 1, 0, correct, items)
+            if literal == "true" and tag == "correct":
+                correct = min(correct + 1, 2)
+            return (pc + 1, 0, 0, correct, items)
+
+        if code == _INT:
+            if ch.isdigit():
+                # Keine führenden Nullen (sonst schlägt json.loads fehl)
+                if flag or sub >= _MAX_INT_DIGITS:
+                    return None
+                return (pc, sub + 1, int(sub == 0 and ch == "0"), correct, items)
+            if sub == 0:
+                return None
+            return self.step((pc + 1, 0, 0, correct, items), ch)
+
+        # _LOOP: ", " → weiteres Element, "]" → Array schließen
+        _, body_pc, min_items, max_items, guard = op
+        count = items or min_items
+        if sub == 0:
+            if ch == "," and count < max_items:
+                return (pc, 1, 0, correct, count)
+            if ch == "]":
+                if guard == "has_correct" and correct == 0:
+                    return None
+                return (pc + 1, 0, 0, correct, 0)
+            return None
+        if ch == " ":
+            return (body_pc, 0, 0, correct, count + 1)
+        return None
+
+    def feed(self, state: Optional[State], text: str) -> Optional[State]:
+        for ch in text:
+            if state is None:
+                return None
+            state = self.step(state, ch)
+        return state
+
+    def forced_text(self, state: State) -> Tuple[str, State]:
+        """Liefert den eindeutig festgelegten Text ab state (z.B. '{"question": "')"""
+        text = ""
+        while state[0] < len(self.ops):
+            op = self.ops[state[0]]
+            if op[0] == _WS and state[1] == 0:
+                state = (state[0] + 1, 0, 0, state[3], state[4])
+            elif op[0] == _LIT:
+                remaining = op[1][state[1]:]
+                text += remaining
+                state = self.feed(state, remaining)
+            elif op[0] == _STR and state[1] == 0:
+                text += '"'
+                state = self.step(state, '"')
+            else:
+                break
+        return text, state
+
+
+# --------------------------------------
+# Token-Automat
+# --------------------------------------
+
+# Platzhalter für Nicht-ASCII-Byte-Tokens (nur innerhalb von Strings erlaubt)
+_BYTE_PLACEHOLDER = "ÿ"
+
+
+def _token_text(token: str) -> str:
+    """Sentencepiece-Token (TinyLlama) → Klartext"""
+    if token.startswith("<0x") and token.endswith(">") and len(token) == 6:
+        value = int(token[3:5], 16)
+        return chr(value) if value < 0x80 else _BYTE_PLACEHOLDER
+    return token.replace("▁", " ")
+
+
+class TokenAutomaton:
+    """Übersetzt JsonGrammar-Zustände in erlaubte Token-IDs (einmal pro Tokenizer)"""
+
+    def __init__(self, tokenizer, grammar: Optional[JsonGrammar] = None):
+        self.grammar = grammar or JsonGrammar()
+        self.eos_token_id = tokenizer.eos_token_id
+        self.token_texts: List[str] = []
+        self._trie: Dict = {}
+        self._allowed_cache: Dict[State, List[int]] = {}
+        self._advance_cache: Dict[Tuple[State, int], Optional[State]] = {}
+
+        special_ids = set(tokenizer.all_special_ids)
+        for token_id, token in enumerate(tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))):
+            text = "" if token_id in special_ids or token is None else _token_text(token)
+            self.token_texts.append(text)
+            if text:
+                node = self._trie
+                for ch in text:
+                    node = node.setdefault(ch, {})
+                node.setdefault(None, []).append(token_id)
+
+    def allowed_token_ids(self, state: Optional[State]) -> List[int]:
+        if state is None or self.grammar.is_done(state):
+            return [self.eos_token_id]
+
+        cached = self._allowed_cache.get(state)
+        if cached is not None:
+            return cached
+
+        allowed: List[int] = []
+        stack = [(self._trie, state)]
+        while stack:
+            node, node_state = stack.pop()
+            for ch, child in node.items():
+                if ch is None:
+                    allowed.extend(child)
+                    continue
+                next_state = self.grammar.step(node_state, ch)
+                if next_state is not None:
+                    stack.append((child, next_state))
+
+        self._allowed_cache[state] = allowed
+        return allowed
+
+    def advance(self, state: Optional[State], token_id: int) -> Optional[State]:
+        if state is None or self.grammar.is_done(state):
+            return state
+
+        key = (state, token_id)
+        if key not in self._advance_cache:
+            text = self.token_texts[token_id] if token_id < len(self.token_texts) else ""
+            self._advance_cache[key] = self.grammar.feed(state, text) if text else None
+        return self._advance_cache[key]
+
+
+class H5PJsonLogitsProcessor(LogitsProcessor):
+    """
+    Maskiert alle Tokens, die nicht zum MultiChoice-Schema passen.
+
+    Zustandsbehaftet: pro generate()-Aufruf eine neue Instanz anlegen.
+    Unterstützt Greedy und Sampling (auch num_return_sequences), kein Beam Search.
+    """
+
+    def __init__(self, automaton: TokenAutomaton, start_state: Optional[State] = None):
+        self.automaton = automaton
+        self.start_state = start_state or automaton.grammar.initial_state()
+        self._states: Optional[List[Optional[State]]] = None
+        self._tensor_cache: Dict[Optional[State], torch.Tensor] = {}
+
+    def _allowed_tensor(self, state: Optional[State], device) -> torch.Tensor:
+        ids = self._tensor_cache.get(state)
+        if ids is None:
+            ids = torch.tensor(self.automaton.allowed_token_ids(state), dtype=torch.long, device=device)
+            self._tensor_cache[state] = ids
+        return ids
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        if self._states is None:
+            self._states = [self.start_state] * input_ids.shape[0]
+        else:
+            for row, token_id in enumerate(input_ids[:, -1].tolist()):
+                self._states[row] = self.automaton.advance(self._states[row], token_id)
+
+        masked = torch.full_like(scores, float("-inf"))
+        for row, state in enumerate(self._states):
+            ids = self._allowed_tensor(state, scores.device)
+            masked[row, ids] = scores[row, ids]
+        return masked
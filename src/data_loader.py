@@ -1,10 +1,56 @@
-from datasets import load_dataset, Dataset
+from datasets import load_dataset, Dataset, IterableDataset
+import glob
+from collections import Counter
 import logging
 from pathlib import Path
 from typing import Optional
 
 from src.config import DataConfig
 
+REQUIRED_KEYS = {'instruction', 'output'}
+
+
+class StreamingRecordValidator:
+    """
+    Validiert einen Datenstrom inkrementell (als filter()-Funktion):
+    Pflichtfelder bei jedem Datensatz, JSON-Validität des outputs bei jedem n-ten.
+    Datensätze ohne Pflichtfelder werden verworfen statt den Lauf abzubrechen.
+    """
+
+    def __init__(self, logger: logging.Logger, sample_every: int = 100, log_every: int = 100_000):
+        self.logger = logger
+        self.sample_every = max(1, sample_every)
+        self.log_every = log_every
+        self.seen = 0
+        self.dropped = 0
+        self.sampled = 0
+        self.invalid_json = 0
+
+    def __call__(self, example) -> bool:
+        from src.utils import is_valid_json
+
+        self.seen += 1
+        if not REQUIRED_KEYS.issubset(example.keys()) or not all(
+            isinstance(example[key], str) for key in REQUIRED_KEYS
+        ):
+            self.dropped += 1
+            if self.dropped <= 10:
+                self.logger.warning(f"⚠️ Datensatz {self.seen} ohne Pflichtfelder {REQUIRED_KEYS} verworfen")
+            return False
+
+        if self.seen % self.sample_every == 0:
+            self.sampled += 1
+            if not is_valid_json(example['output']):
+                self.invalid_json += 1
+                self.logger.warning(f"⚠️ Datensatz {self.seen} hat invalides JSON im output-Feld")
+
+        if self.seen % self.log_every == 0:
+            self.logger.info(
+                f"📊 Stream-Validierung: {self.seen} gelesen, {self.dropped} verworfen, "
+                f"{self.invalid_json}/{self.sampled} Stichproben mit invalidem JSON"
+            )
+        return True
+
 
 class DatasetLoader:
     """Lädt und validiert Datasets"""
@@ -12,6 +58,7 @@ class DatasetLoader:
     def __init__(self, config: DataConfig, logger: logging.Logger):
         self.config = config
         self.logger = logger
+        self.stream_validator: Optional[StreamingRecordValidator] = None
 
     def load_train_data(self) -> Dataset:
         """Lädt Trainingsdaten"""
@@ -30,6 +77,25 @@ class DatasetLoader:
 
         return dataset
 
+    def load_train_stream(self) -> IterableDataset:
+        """
+        Lädt Trainingsdaten lazy aus JSONL-Shards (z.B. train-*.jsonl, train-*.jsonl.gz,
+        train-*.jsonl.zst). Der Speicherbedarf bleibt durch den Shuffle-Puffer begrenzt.
+        """
+        pattern = self.config.train_shards or str(self.config.train_path)
+        files = sorted(glob.glob(pattern))
+        if not files:
+            raise FileNotFoundError(f"Keine Shards gefunden: {pattern}")
+
+        self.logger.info(f"📥 Streame Training aus {len(files)} Shard(s): {pattern}")
+        dataset = load_dataset("json", data_files=files, split="train", streaming=True)
+
+        self.stream_validator = StreamingRecordValidator(self.logger, self.config.validation_sample_every)
+        dataset = dataset.filter(self.stream_validator)
+
+        self.logger.info(f"✓ Shuffle-Puffer: {self.config.shuffle_buffer_size} Beispiele")
+        return dataset.shuffle(seed=self.config.shuffle_seed, buffer_size=self.config.shuffle_buffer_size)
+
     def load_eval_data(self) -> Optional[Dataset]:
         """Lädt optionale Evaluationsdaten"""
 
@@ -53,17 +119,26 @@ class DatasetLoader:
 
     def _validate_dataset(self, dataset: Dataset):
         """Validiert Datenstruktur"""
-        required_keys = {'instruction', 'output'}
         sample_keys = set(dataset[0].keys())
 
-        if not required_keys.issubset(sample_keys):
+        if not REQUIRED_KEYS.issubset(sample_keys):
             raise ValueError(
-                f"Dataset benötigt Keys: {required_keys}, "
+                f"Dataset benötigt Keys: {REQUIRED_KEYS}, "
                 f"gefunden: {sample_keys}"
             )
 
-        # Prüfe ob output valides JSON ist
-        from src.utils import is_valid_json
-        if not is_valid_json(dataset[0]['output']):
-            self.logger.warning("⚠️ Erstes Beispiel hat invalides JSON im output-Feld")
+        # Alle outputs gegen die H5P-Regeln prüfen (alle Verstöße, als Histogramm geloggt)
+        from src.bulk_validation import error_kind, record_violations
+        histogram = Counter()
+        invalid = 0
+        for output in dataset['output']:
+            errors = record_violations(output)
+            if errors:
+                invalid += 1
+                histogram.update(error_kind(error) for error in errors)
+
+        if invalid:
+            self.logger.warning(f"⚠️ {invalid}/{len(dataset)} Beispiele verletzen die H5P-Regeln im output-Feld")
+            for kind, count in histogram.most_common(5):
+                self.logger.warning(f"   {count:>6}× {kind}")
 
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import logging
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from datasets import Dataset, load_from_disk
+
+from src.preprocessing import DataPreprocessor
+
+
+class TokenizedDatasetCache:
+    """
+    Persistenter Cache für tokenisierte Datasets (Arrow, per mmap geladen).
+
+    Der Schlüssel hasht Trainingsdatei, Tokenizer, Prompt-Template, max_length
+    sowie Padding-/Packing-Modus. Ändert sich eines davon, entsteht ein neuer
+    Eintrag; der Cache invalidiert sich dadurch automatisch.
+    """
+
+    def __init__(self, cache_dir: Path, logger: logging.Logger, num_proc: int = 1):
+        self.cache_dir = Path(cache_dir)
+        self.logger = logger
+        self.num_proc = num_proc
+
+    @staticmethod
+    def _hash_file(path: Path, digest) -> None:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+
+    @staticmethod
+    def _tokenizer_fingerprint(tokenizer) -> str:
+        """Hash über Vokabular/Regeln und Spezial-Tokens des Tokenizers"""
+        if hasattr(tokenizer, "backend_tokenizer"):
+            content = tokenizer.backend_tokenizer.to_str()
+        else:
+            content = json.dumps(sorted(tokenizer.get_vocab().items()))
+        settings = json.dumps({
+            "special_tokens": tokenizer.special_tokens_map,
+            "padding_side": tokenizer.padding_side,
+            "add_bos_token": getattr(tokenizer, "add_bos_token", None),
+            "add_eos_token": getattr(tokenizer, "add_eos_token", None),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256((content + settings).encode("utf-8")).hexdigest()
+
+    def cache_key(self, preprocessor: DataPreprocessor, data_path: Path) -> str:
+        digest = hashlib.sha256()
+        self._hash_file(data_path, digest)
+        digest.update(self._tokenizer_fingerprint(preprocessor.tokenizer).encode())
+        # Template-Text inkl. System-Nachricht, mit Platzhaltern formatiert
+        digest.update(preprocessor.format_h5p_example("{instruction}", "{output}").encode("utf-8"))
+        digest.update(json.dumps({
+            "max_length": preprocessor.max_length,
+            "dynamic_padding": preprocessor.dynamic_padding,
+            "packing": preprocessor.packing,
+        }, sort_keys=True).encode())
+        return digest.hexdigest()[:16]
+
+    def load_or_build(self, preprocessor: DataPreprocessor, dataset: Dataset, data_path: Path) -> Dataset:
+        """Lädt das tokenisierte Dataset aus dem Cache oder baut es (parallel) neu"""
+        key = self.cache_key(preprocessor, data_path)
+        entry_dir = self.cache_dir / f"{Path(data_path).stem}-{key}"
+        meta_path = entry_dir / "cache_meta.json"
+
+        if meta_path.exists():
+            self.logger.info(f"♻️ Tokenisierter Cache gefunden: {entry_dir}")
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            preprocessor.packing_efficiency = meta.get("packing_efficiency")
+            return load_from_disk(str(entry_dir / "dataset"))
+
+        self.logger.info(f"🧹 Cache-Miss → tokenisiere mit {self.num_proc} Prozess(en)")
+        tokenized = preprocessor.process_dataset(dataset, num_proc=self.num_proc)
+
+        # Erst in eigenes temporäres Verzeichnis schreiben, dann umbenennen (kein halber Cache;
+        # gleichzeitige Cache-Misse mehrerer Prozesse überschreiben sich nicht gegenseitig)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f"{entry_dir.name}.", suffix=".tmp", dir=self.cache_dir))
+        tokenized.save_to_disk(str(tmp_dir / "dataset"))
+        (tmp_dir / "cache_meta.json").write_text(json.dumps({
+            "source": str(data_path),
+            "num_examples": len(tokenized),
+            "packing_efficiency": preprocessor.packing_efficiency,
+        }, indent=2), encoding="utf-8")
+        try:
+            tmp_dir.rename(entry_dir)
+            self.logger.info(f"✓ Tokenisierter Cache gespeichert: {entry_dir}")
+        except OSError:
+            if not entry_dir.exists():
+                raise
+            # Ein anderer Prozess war schneller: dessen (identischen) Eintrag verwenden
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            self.logger.info(f"♻️ Cache-Eintrag inzwischen von anderem Prozess erstellt: {entry_dir}")
+
+        # Aus dem Cache laden, damit auch der erste Lauf die mmap-Variante nutzt
+        return load_from_disk(str(entry_dir / "dataset"))
+
+
+def cached_process_dataset(
+    preprocessor: DataPreprocessor,
+    dataset: Dataset,
+    data_path: Path,
+    cache_dir: Optional[Path],
+    logger: logging.Logger,
+    num_proc: int = 1
+) -> Dataset:
+    """Wie DataPreprocessor.process_dataset, aber mit persistentem Cache (cache_dir=None → ohne Cache)"""
+    if cache_dir is None:
+        return preprocessor.process_dataset(dataset, num_proc=num_proc)
+    return TokenizedDatasetCache(cache_dir, logger, num_proc).load_or_build(preprocessor, dataset, data_path)
@@ -0,0 +1,146 @@
+"""
+Datenparalleles CPU-Training mit torch.distributed (gloo).
+
+Pro NUMA-Knoten läuft ein Rank mit eigenem Thread-Budget; der Trainer
+umhüllt das PEFT-Modell mit DDP, sodass nur die LoRA-Gradienten
+(die einzigen Parameter mit requires_grad) per all-reduce synchronisiert werden.
+
+Start (Config.training.distributed = True):
+    python -m src.train
+oder manuell:
+    python -m torch.distributed.run --standalone --nproc_per_node=2 -m src.train
+"""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional
+
+import torch
+
+NUMA_SYSFS = Path("/sys/devices/system/node")
+
+
+def _parse_cpulist(text: str) -> List[int]:
+    """'0-3,8-11' → [0, 1, 2, 3, 8, 9, 10, 11]"""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def numa_node_cpus() -> List[List[int]]:
+    """CPU-Listen pro NUMA-Knoten (Fallback: ein Knoten mit allen verfügbaren CPUs)"""
+    available = set(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else set(range(os.cpu_count() or 1))
+    nodes = []
+    for node_dir in sorted(NUMA_SYSFS.glob("node[0-9]*"), key=lambda p: int(p.name[4:])):
+        cpus = [cpu for cpu in _parse_cpulist((node_dir / "cpulist").read_text()) if cpu in available]
+        if cpus:
+            nodes.append(cpus)
+    return nodes or [sorted(available)]
+
+
+def is_distributed_child() -> bool:
+    """True innerhalb eines von torchrun gestarteten Rank-Prozesses"""
+    # Auch bei WORLD_SIZE=1 gesetzt – sonst würde ein einzelner Rank erneut launch() aufrufen
+    return "LOCAL_RANK" in os.environ
+
+
+def is_main_process() -> bool:
+    return int(os.environ.get("RANK", "0")) == 0
+
+
+def all_reduce_sum(values: List[int]) -> List[int]:
+    """Summiert Zähler über alle Ranks (ohne initialisierte Prozessgruppe: unverändert)"""
+    if not (torch.distributed.is_available() and torch.distributed.is_initialized()):
+        return values
+    tensor = torch.tensor(values, dtype=torch.int64)
+    torch.distributed.all_reduce(tensor, op=torch.distributed.ReduceOp.SUM)
+    return tensor.tolist()
+
+
+def launch(module: str, num_ranks: Optional[int], logger: logging.Logger) -> Optional[int]:
+    """
+    Startet das Training über torch.distributed.run mit einem Rank pro NUMA-Knoten.
+    Liefert den Exit-Code der Ranks oder None, wenn nur ein Rank nötig ist
+    (dann trainiert der aufrufende Prozess selbst).
+    """
+    num_ranks = num_ranks or len(numa_node_cpus())
+    if num_ranks <= 1:
+        logger.info("🌐 Nur ein NUMA-Knoten/Rank – trainiere ohne torchrun im aktuellen Prozess")
+        return None
+    logger.info(f"🌐 Starte verteiltes CPU-Training (gloo) mit {num_ranks} Rank(s)")
+    command = [
+        sys.executable, "-m", "torch.distributed.run",
+        "--standalone",
+        f"--nproc_per_node={num_ranks}",
+        "-m", module,
+    ]
+    return subprocess.call(command)
+
+
+def setup_rank(threads_per_rank: Optional[int], logger: logging.Logger):
+    """Pinnt den aktuellen Rank auf die CPUs seines NUMA-Knotens und setzt das Thread-Budget"""
+    local_rank = int(os.environ.get("LOCAL_RANK", "0"))
+    nodes = numa_node_cpus()
+    cpus = nodes[local_rank % len(nodes)]
+
+    if len(nodes) == 1 and int(os.environ.get("LOCAL_WORLD_SIZE", "1")) > 1:
+        # Kein NUMA: verfügbare CPUs gleichmäßig auf die Ranks aufteilen
+        world = int(os.environ["LOCAL_WORLD_SIZE"])
+        share = max(1, len(cpus) // world)
+        cpus = cpus[local_rank * share:(local_rank + 1) * share] or cpus
+
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    threads = threads_per_rank or len(cpus)
+    torch.set_num_threads(threads)
+    logger.info(f"✓ Rank {local_rank}: {threads} Threads auf CPUs {cpus[0]}–{cpus[-1]}")
+
+    # Prozessgruppe früh initialisieren (Trainer/accelerate übernimmt sie),
+    # damit schon die Tokenisierung per Barriere koordiniert werden kann
+    if not torch.distributed.is_initialized():
+        torch.distributed.init_process_group(backend="gloo")
+
+
+@contextmanager
+def main_process_first():
+    """Rank 0 führt den Block zuerst aus (z.B. Cache bauen), die übrigen danach"""
+    initialized = torch.distributed.is_available() and torch.distributed.is_initialized()
+    if initialized and not is_main_process():
+        torch.distributed.barrier()
+    yield
+    if initialized and is_main_process():
+        torch.distributed.barrier()
+
+
+def record_scaling(output_dir: Path, world_size: int, samples_per_second: float, logger: logging.Logger):
+    """
+    Speichert den Durchsatz pro Weltgröße in scaling.json und loggt die
+    Skalierungseffizienz gegenüber dem Einzelprozess-Lauf (falls vorhanden):
+    Effizienz = Durchsatz(N) / (N × Durchsatz(1)).
+    """
+    path = Path(output_dir) / "scaling.json"
+    runs = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    runs[str(world_size)] = samples_per_second
+    path.write_text(json.dumps(runs, indent=2), encoding="utf-8")
+
+    baseline = runs.get("1")
+    if baseline and world_size > 1:
+        efficiency = samples_per_second / (world_size * baseline)
+        logger.info(
+            f"📈 Skalierung: {samples_per_second:.3f} Samples/s mit {world_size} Ranks "
+            f"vs. {baseline:.3f} mit 1 → Effizienz {efficiency:.0%}"
+        )
+    else:
+        logger.info(f"📈 Durchsatz ({world_size} Rank(s)): {samples_per_second:.3f} Samples/s")
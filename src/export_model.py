@@ -0,0 +1,167 @@
+"""
+Export des fine-getunten Modells als einzelner, gemergter safetensors-Checkpoint
+und Loader, der die Gewichte per mmap einbindet.
+
+Mehrere Worker-Prozesse (siehe worker_pool.py) teilen sich dadurch die Seiten
+im Page-Cache, statt jeweils eine private Kopie der Gewichte zu halten.
+
+Export:
+    python -m src.export_model --adapter outputs/final_model_cpu --output outputs/merged_model --bf16
+Cold-Start (Zeit bis zum ersten Token nach Prozessstart):
+    python -m src.export_model --ttft outputs/merged_model
+"""
+
+import argparse
+import json
+import mmap
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+import torch
+from accelerate import init_empty_weights
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
+
+from src.quantization import merge_adapter
+
+WEIGHTS_FILENAME = "model.safetensors"
+EXPORT_INFO_FILENAME = "export_info.json"
+
+_SAFETENSORS_DTYPES = {
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def export_merged(adapter_path: Path, output_dir: Path, bf16: bool = False) -> Path:
+    """Mergt den LoRA-Adapter und schreibt einen einzelnen safetensors-Checkpoint"""
+    adapter_path, output_dir = Path(adapter_path), Path(output_dir)
+    print(f"🔧 Merge Adapter aus {adapter_path}")
+    model = merge_adapter(adapter_path)
+    if bf16:
+        model = model.to(torch.bfloat16)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # Großes max_shard_size → genau eine Datei (model.safetensors)
+    model.save_pretrained(str(output_dir), safe_serialization=True, max_shard_size="100GB")
+    AutoTokenizer.from_pretrained(str(adapter_path)).save_pretrained(str(output_dir))
+
+    info = {"source": str(adapter_path), "dtype": str(model.dtype), "weights": WEIGHTS_FILENAME}
+    (output_dir / EXPORT_INFO_FILENAME).write_text(json.dumps(info, indent=2), encoding="utf-8")
+
+    size_mb = (output_dir / WEIGHTS_FILENAME).stat().st_size / 1024 ** 2
+    print(f"✓ Exportiert: {output_dir / WEIGHTS_FILENAME} ({size_mb:.0f} MB, {model.dtype})")
+    return output_dir
+
+
+def is_merged_export(model_path: Path) -> bool:
+    return (Path(model_path) / EXPORT_INFO_FILENAME).exists()
+
+
+def mmap_safetensors(path: Path) -> Dict[str, torch.Tensor]:
+    """
+    Bindet eine safetensors-Datei per mmap ein, ohne die Daten zu kopieren.
+    MAP_PRIVATE (ACCESS_COPY): Seiten werden zwischen Prozessen geteilt,
+    solange niemand schreibt.
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    data_start = 8 + header_size
+    tensors = {}
+    for name, meta in header.items():
+        if name == "__metadata__":
+            continue
+        begin, end = meta["data_offsets"]
+        dtype = _SAFETENSORS_DTYPES[meta["dtype"]]
+        if end == begin:
+            tensors[name] = torch.empty(meta["shape"], dtype=dtype)
+            continue
+        tensor = torch.frombuffer(buffer, dtype=dtype, count=(end - begin) // dtype.itemsize, offset=data_start + begin)
+        tensors[name] = tensor.reshape(meta["shape"])
+    return tensors
+
+
+def load_merged_mmap(model_path: Path):
+    """Erzeugt das Modellgerüst ohne Gewichte und hängt die mmap-Tensoren direkt ein"""
+    model_path = Path(model_path)
+    config = AutoConfig.from_pretrained(str(model_path))
+    state_dict = mmap_safetensors(model_path / WEIGHTS_FILENAME)
+    dtype = next(iter(state_dict.values())).dtype
+
+    with init_empty_weights():
+        model = AutoModelForCausalLM.from_config(config, dtype=dtype)
+    result = model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+
+    # Fehlende Gewichte blieben sonst unbemerkt auf "meta" und scheitern erst in generate().
+    # Erlaubt sind nur Schlüssel, die durch tie_weights() belegt wurden.
+    still_meta = [name for name, param in model.named_parameters() if param.is_meta]
+    if still_meta or result.unexpected_keys:
+        raise ValueError(
+            f"Export {model_path} passt nicht zum Modell: "
+            f"fehlend {still_meta[:5]}, unerwartet {result.unexpected_keys[:5]}"
+        )
+    model.eval()
+    return model
+
+
+_TTFT_SCRIPT = """
+import time
+from src import inference
+inference.load_model({path!r})
+inputs = inference.tokenizer(inference.build_prompt("Test"), return_tensors="pt")
+inference.model.generate(**inputs, max_new_tokens=1, do_sample=False)
+print("FIRST_TOKEN", flush=True)
+"""
+
+
+def measure_time_to_first_token(model_path: Path) -> float:
+    """Startet einen frischen Prozess und misst die Zeit bis zum ersten generierten Token"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", _TTFT_SCRIPT.format(path=str(model_path))],
+        stdout=subprocess.PIPE,
+        text=True
+    )
+    for line in process.stdout:
+        if line.startswith("FIRST_TOKEN"):
+            break
+    elapsed = time.perf_counter() - start
+    process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"TTFT-Messung fehlgeschlagen (Exit-Code {process.returncode})")
+    print(f"⏱️ Time-to-first-token ({model_path}): {elapsed:.2f}s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export als gemergter safetensors-Checkpoint")
+    parser.add_argument("--adapter", type=Path, default=Path("outputs/final_model_cpu"))
+    parser.add_argument("--output", type=Path, default=Path("outputs/merged_model"))
+    parser.add_argument("--bf16", action="store_true", help="Gewichte in bfloat16 speichern")
+    parser.add_argument("--ttft", type=Path, nargs="*", default=None,
+                        help="Nur Time-to-first-token für die angegebenen Modellpfade messen")
+    args = parser.parse_args()
+
+    if args.ttft is not None:
+        for path in args.ttft or [args.adapter, args.output]:
+            measure_time_to_first_token(path)
+        return
+
+    export_merged(args.adapter, args.output, args.bf16)
+
+
+if __name__ == "__main__":
+    main()
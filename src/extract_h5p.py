@@ -1,5 +1,8 @@
 import zipfile
 import json
+import hashlib
+import time
+import multiprocessing
 from pathlib import Path
 import os
 
@@ -9,11 +12,20 @@ OUTPUT_DIR = Path("data/processed")       # Zielordner
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "train_data.jsonl")
 
+# H5P-Pakete sind ZIP-Archive; manche liegen als .zip vor
+H5P_EXTENSIONS = (".h5p", ".zip")
+CONTENT_JSON = "content/content.json"
+
 
 def extract_h5p_content_json(h5p_path):
     """Extrahiert content.json aus einer H5P-Datei (ZIP)."""
     with zipfile.ZipFile(h5p_path, 'r') as z:
-        # Suchen nach content/content.json
+        # Direkter Zugriff auf den Standardpfad, nur sonst alle Einträge durchsuchen
+        try:
+            with z.open(CONTENT_JSON) as f:
+                return json.load(f)
+        except KeyError:
+            pass
         for name in z.namelist():
             if name.endswith("content.json"):
                 with z.open(name) as f:
@@ -41,35 +53,149 @@ def generate_instruction(data):
     )
 
 
-def convert_h5p_folder_to_instruction_pairs(input_dir, output_file):
-    all_pairs = 0
-
-    with open(output_file, "w", encoding="utf-8") as outfile:
-
-        for filename in os.listdir(input_dir):
-            if not filename.endswith(".h5p"):
-                continue
-
-            path = os.path.join(input_dir, filename)
-            print(f"Verarbeite: {filename}")
-
-            content_json = extract_h5p_content_json(path)
-            if content_json is None:
-                print(f"content.json nicht gefunden in {filename}")
-                continue
-
-            instruction = generate_instruction(content_json)
-
-            # OUTPUT MUSS EIN STRING SEIN (für Finetuning!)
-            output_json_string = json.dumps(content_json, ensure_ascii=False)
-
-            record = {
-                "instruction": instruction,
-                "output": output_json_string
-            }
-
-            outfile.write(json.dumps(record, ensure_ascii=False) + "\n")
-            all_pairs += 1
+def _record_for_content(content_json) -> str:
+    """Baut die JSONL-Zeile (Instruction + Output-String) für eine content.json."""
+    instruction = generate_instruction(content_json)
+
+    # OUTPUT MUSS EIN STRING SEIN (für Finetuning!)
+    output_json_string = json.dumps(content_json, ensure_ascii=False)
+
+    record = {
+        "instruction": instruction,
+        "output": output_json_string
+    }
+    return json.dumps(record, ensure_ascii=False)
+
+
+def _process_package(path):
+    """
+    Worker: hasht und extrahiert ein Paket.
+    Liefert (sha256, JSONL-Zeile oder None, Fehlermeldung oder None).
+    """
+    try:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        content_json = extract_h5p_content_json(path)
+        if content_json is None:
+            return digest, None, "content.json nicht gefunden"
+        return digest, _record_for_content(content_json), None
+    except Exception as e:
+        return None, None, str(e)
+
+
+def _load_manifest(manifest_path):
+    if manifest_path is not None and os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def _save_manifest(manifest, manifest_path):
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+class _PreviousOutput:
+    """Liest Zeilen der vorherigen Ausgabe vorwärts (Zeilennummern aufsteigend abgefragt)"""
+
+    def __init__(self, path):
+        self._file = open(path, "r", encoding="utf-8") if os.path.exists(path) else None
+        self._position = -1
+        self._line = None
+
+    def line(self, number):
+        while self._file is not None and self._position < number:
+            self._line = self._file.readline()
+            self._position += 1
+        return self._line.rstrip("\n") if self._line else None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def convert_h5p_folder_to_instruction_pairs(input_dir, output_file, workers=None, manifest_path=None):
+    """
+    Extrahiert alle H5P-Pakete (.h5p/.zip) aus input_dir parallel in output_file.
+
+    Ein Manifest (Standard: <output_file>.manifest.json) speichert pro Paket
+    mtime, Größe, SHA-256, Fehler und die Zeilennummer in der Ausgabe. Bei
+    erneutem Lauf werden nur neue oder geänderte Pakete entpackt, unveränderte
+    Zeilen kommen aus der vorherigen Ausgabe. Die Ausgabe wird in sortierter
+    Dateinamen-Reihenfolge (deterministisch) gestreamt.
+    """
+    start = time.perf_counter()
+    manifest_path = manifest_path or f"{output_file}.manifest.json"
+    old_manifest = _load_manifest(manifest_path) if os.path.exists(output_file) else {}
+    new_manifest = {}
+
+    filenames = sorted(f for f in os.listdir(input_dir) if f.lower().endswith(H5P_EXTENSIONS))
+
+    # Unveränderte Pakete (gleiche mtime + Größe) aus der vorherigen Ausgabe übernehmen
+    to_process = []
+    for filename in filenames:
+        stat = os.stat(os.path.join(input_dir, filename))
+        entry = old_manifest.get(filename)
+        if entry and "line" in entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            new_manifest[filename] = dict(entry)
+        else:
+            new_manifest[filename] = {"mtime": stat.st_mtime, "size": stat.st_size}
+            to_process.append(filename)
 
+    all_pairs = 0
+    unchanged = len(filenames) - len(to_process)
+    touched = 0  # neu gehasht, Inhalt identisch (nur mtime geändert)
+    failures = []
+    tmp_output = f"{output_file}.tmp"
+    previous = _PreviousOutput(output_file)
+    to_process_set = set(to_process)
+
+    try:
+        with multiprocessing.Pool(workers) as pool, open(tmp_output, "w", encoding="utf-8") as outfile:
+            paths = [os.path.join(input_dir, f) for f in to_process]
+            # imap liefert in Eingabereihenfolge, sobald das jeweilige Paket fertig ist
+            results = pool.imap(_process_package, paths, chunksize=16)
+
+            for filename in filenames:
+                entry = new_manifest[filename]
+                if filename in to_process_set:
+                    digest, line, error = next(results)
+                    old_entry = old_manifest.get(filename)
+                    if digest is not None and old_entry and old_entry.get("sha256") == digest:
+                        touched += 1  # nur mtime geändert, Inhalt identisch
+                    entry.update(sha256=digest, error=error)
+                    if error is not None:
+                        print(f"⚠️ {filename}: {error}")
+                        failures.append(filename)
+                        if digest is None:
+                            # Lesefehler: beim nächsten Lauf erneut versuchen
+                            del new_manifest[filename]
+                            continue
+                else:
+                    line = previous.line(entry["line"]) if entry["line"] is not None else None
+
+                if line is None:
+                    entry["line"] = None
+                    continue
+                outfile.write(line + "\n")
+                entry["line"] = all_pairs
+                all_pairs += 1
+    finally:
+        previous.close()
+
+    os.replace(tmp_output, output_file)
+    _save_manifest(new_manifest, manifest_path)
+
+    elapsed = time.perf_counter() - start
+    removed = len(set(old_manifest) - set(new_manifest))
     print(f"\nFertig! {all_pairs} Instruction-Paare wurden erzeugt.")
     print(f"Gespeichert in: {output_file}")
+    print(
+        f"📊 {len(filenames)} Pakete in {elapsed:.2f}s "
+        f"({len(filenames) / elapsed if elapsed > 0 else 0.0:.1f} Dateien/s): "
+        f"{len(to_process)} verarbeitet (davon {touched} nur mtime geändert), "
+        f"{unchanged} unverändert übersprungen, "
+        f"{removed} entfernt, {len(failures)} Fehler"
+    )
@@ -1,5 +1,10 @@
 import json
-from typing import Optional, Dict
+import re
+from typing import Optional, Dict, List
+
+from src import validator_registry
+
+_MULTICHOICE = validator_registry.get_validator("H5P.MultiChoice")
 
 
 class H5PValidator:
@@ -14,69 +19,331 @@ class H5PValidator:
         except json.JSONDecodeError as e:
             return False, f"Invalides JSON: {str(e)}", None
 
-        # 2. Basisstruktur prüfen
-        if not isinstance(data, dict):
-            return False, "H5P muss ein JSON-Objekt sein", None
+        # 2. Regeln prüfen (erster Verstoß wird gemeldet)
+        errors = H5PValidator.multiple_choice_violations(data)
+        if errors:
+            return False, errors[0], None
 
-        # 3. Pflichtfelder prüfen
-        required_fields = ["question", "answers"]
-        for field in required_fields:
-            if field not in data:
-                return False, f"Fehlendes Pflichtfeld: {field}", None
+        # Wenn alles gültig ist
+        return True, None, data
 
-        # 4. Frage prüfen
-        if not isinstance(data["question"], str) or not data["question"].strip():
-            return False, "Feld 'question' muss ein nicht-leerer String sein", None
+    @staticmethod
+    def multiple_choice_violations(data) -> List[str]:
+        """
+        Sammelt ALLE Verstöße eines geparsten Objekts statt nur des ersten.
+        Reihenfolge wie bei validate_multiple_choice (erster Eintrag = dessen Fehler).
+        Die Regeln stehen kompiliert in validator_registry (H5P.MultiChoice).
+        """
+        return _MULTICHOICE.violations(data)
 
-        # 5. Antworten prüfen
-        if not isinstance(data["answers"], list):
-            return False, "Feld 'answers' muss eine Liste sein", None
+    @staticmethod
+    def violations(data, main_library: Optional[str] = None) -> List[str]:
+        """Alle Verstöße für beliebige registrierte Content-Typen (Schlüssel: mainLibrary)"""
+        return validator_registry.validate(data, main_library)
 
-        if len(data["answers"]) < 2:
-            return False, "Mindestens 2 Antwortmöglichkeiten erforderlich", None
 
-        # 6. Jede Antwort prüfen
-        correct_count = 0
-        for i, answer in enumerate(data["answers"]):
-            if not isinstance(answer, dict):
-                return False, f"Antwort {i+1} muss ein Objekt sein", None
+class H5PValidationError(ValueError):
+    """Verstoß gegen die STRICT-MODE-Regeln, erkannt während des Streamings"""
 
-            if "text" not in answer:
-                return False, f"Antwort {i+1}: Fehlendes Feld 'text'", None
 
-            if not isinstance(answer["text"], str) or not answer["text"].strip():
-                return False, f"Antwort {i+1}: 'text' muss ein nicht-leerer String sein", None
+# Erwartete JSON-Typen pro Pfad ("*" = beliebiger Listenindex)
+_STREAM_TYPES = {
+    (): "object",
+    ("question",): "string",
+    ("answers",): "array",
+    ("answers", "*"): "object",
+    ("answers", "*", "text"): "string",
+    ("answers", "*", "correct"): "bool",
+    ("behaviour",): "object",
+    ("behaviour", "singleAnswer"): "bool",
+    ("overallFeedback",): "array",
+}
 
-            if "correct" not in answer:
-                return False, f"Antwort {i+1}: Fehlendes Feld 'correct'", None
+# Pflichtfelder, geprüft beim Schließen des jeweiligen Objekts
+_STREAM_REQUIRED = {
+    (): ["question", "answers"],
+    ("answers", "*"): ["text", "correct"],
+}
 
-            if not isinstance(answer["correct"], bool):
-                return False, f"Antwort {i+1}: 'correct' muss true oder false sein", None
+# Strings, die nach strip() nicht leer sein dürfen
+_STREAM_NON_EMPTY = {("question",), ("answers", "*", "text")}
 
-            if answer["correct"]:
-                correct_count += 1
+_NUMBER_RE = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?")
+_LITERALS = {"t": ("true", True), "f": ("false", False), "n": ("null", None)}
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
 
-        if correct_count == 0:
-            return False, "Mindestens eine Antwort muss als 'correct': true markiert sein", None
 
-        # 7. Optional: behaviour prüfen
-        if "behaviour" in data:
-            if not isinstance(data["behaviour"], dict):
-                return False, "Feld 'behaviour' muss ein Objekt sein", None
+class StreamingH5PValidator:
+    """
+    Inkrementeller (push-basierter) Validator für H5P-MultipleChoice im STRICT MODE.
 
-            if "singleAnswer" in data["behaviour"]:
-                if not isinstance(data["behaviour"]["singleAnswer"], bool):
-                    return False, "'singleAnswer' muss true oder false sein", None
+    feed() nimmt beliebige Textstücke (z.B. einzelne Tokens) entgegen und wirft
+    H5PValidationError, sobald das Dokument die Regeln von
+    H5PValidator.validate_multiple_choice nicht mehr erfüllen kann:
+    falscher Typ beim Wertbeginn, fehlende Pflichtfelder beim Schließen eines
+    Objekts, zu wenige bzw. keine richtigen Antworten beim Schließen von 'answers'.
+    Text vor dem ersten '{' und nach dem schließenden '}' wird ignoriert
+    (die Generierung stoppt dort ohnehin, siehe stopping.py).
+    """
 
-                # Wenn singleAnswer=true → nur 1 richtige Antwort erlaubt
-                if data["behaviour"]["singleAnswer"] and correct_count != 1:
-                    return False, f"Bei 'singleAnswer': true ist genau 1 richtige Antwort erlaubt, gefunden: {correct_count}", None
+    def __init__(self):
+        self.started = False
+        self.done = False
+        self._stack = []          # offene Container: dict(kind, path, keys, expect, key, count)
+        self._scalar = None       # aktueller Skalar: dict(kind, path, buf, ...)
+        self._correct_count = 0
+        self._answers_closed = False
+        self._single_answer = None
 
-        # 8. Optional: overallFeedback prüfen
-        if "overallFeedback" in data:
-            if not isinstance(data["overallFeedback"], list):
-                return False, "Feld 'overallFeedback' muss eine Liste sein", None
+    # ------------------------------
+    # Öffentliche API
+    # ------------------------------
 
-        # Wenn alles gültig ist
-        return True, None, data
+    def feed(self, text: str):
+        for ch in text:
+            if self.done:
+                return
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self._begin_value(ch, ())
+                continue
+            self._step(ch)
+
+    def close(self):
+        """Signalisiert das Textende; wirft, wenn das Dokument unvollständig ist"""
+        if not self.done:
+            raise H5PValidationError("Unvollständiges JSON")
+
+    # ------------------------------
+    # Parser
+    # ------------------------------
+
+    @staticmethod
+    def _rule_path(path: tuple) -> tuple:
+        return tuple("*" if isinstance(p, int) else p for p in path)
+
+    def _child_path(self) -> tuple:
+        frame = self._stack[-1]
+        if frame["kind"] == "object":
+            return frame["path"] + (frame["key"],)
+        return frame["path"] + (frame["count"],)
+
+    def _step(self, ch: str):
+        if self._scalar is not None:
+            self._step_scalar(ch)
+            return
+
+        frame = self._stack[-1]
+        if ch in " \t\n\r":
+            return
+
+        expect = frame["expect"]
+        if frame["kind"] == "object":
+            if expect in ("key", "key_or_end"):
+                if ch == '"':
+                    self._scalar = {"kind": "key", "path": frame["path"], "buf": [], "escape": None}
+                elif ch == "}" and expect == "key_or_end":
+                    self._close_container()
+                else:
+                    raise H5PValidationError(f"Invalides JSON: Schlüssel erwartet, gefunden {ch!r}")
+            elif expect == "colon":
+                if ch != ":":
+                    raise H5PValidationError(f"Invalides JSON: ':' erwartet, gefunden {ch!r}")
+                frame["expect"] = "value"
+            elif expect == "value":
+                self._begin_value(ch, self._child_path())
+            elif expect == "comma_or_end":
+                if ch == ",":
+                    frame["expect"] = "key"
+                elif ch == "}":
+                    self._close_container()
+                else:
+                    raise H5PValidationError(f"Invalides JSON: ',' oder '}}' erwartet, gefunden {ch!r}")
+        else:
+            if expect in ("value", "value_or_end"):
+                if ch == "]" and expect == "value_or_end":
+                    self._close_container()
+                else:
+                    self._begin_value(ch, self._child_path())
+            elif expect == "comma_or_end":
+                if ch == ",":
+                    frame["count"] += 1
+                    frame["expect"] = "value"
+                elif ch == "]":
+                    frame["count"] += 1
+                    self._close_container()
+                else:
+                    raise H5PValidationError(f"Invalides JSON: ',' oder ']' erwartet, gefunden {ch!r}")
+
+    def _begin_value(self, ch: str, path: tuple):
+        if ch == "{":
+            kind = "object"
+        elif ch == "[":
+            kind = "array"
+        elif ch == '"':
+            kind = "string"
+        elif ch in _LITERALS:
+            kind = "null" if ch == "n" else "bool"
+        elif ch == "-" or ch.isdigit():
+            kind = "number"
+        else:
+            raise H5PValidationError(f"Invalides JSON: Wert erwartet, gefunden {ch!r}")
+
+        expected = _STREAM_TYPES.get(self._rule_path(path))
+        if expected is not None and expected != kind:
+            raise H5PValidationError(self._type_error(path, expected))
 
+        if kind == "object":
+            self._stack.append({"kind": "object", "path": path, "keys": set(), "expect": "key_or_end", "key": None})
+        elif kind == "array":
+            self._stack.append({"kind": "array", "path": path, "expect": "value_or_end", "count": 0})
+        elif kind == "string":
+            self._scalar = {"kind": "string", "path": path, "buf": [], "escape": None, "non_empty": False}
+        elif kind == "number":
+            self._scalar = {"kind": "number", "path": path, "buf": [ch]}
+        else:
+            self._scalar = {"kind": "literal", "path": path, "buf": [ch], "literal": _LITERALS[ch]}
+
+    def _step_scalar(self, ch: str):
+        scalar = self._scalar
+        kind = scalar["kind"]
+
+        if kind in ("string", "key"):
+            escape = scalar["escape"]
+            if escape is not None:
+                if escape == "":
+                    if ch == "u":
+                        scalar["escape"] = "u"
+                        return
+                    if ch not in _JSON_ESCAPES:
+                        raise H5PValidationError(f"Invalides JSON: ungültiges Escape \\{ch}")
+                    self._append_char(_JSON_ESCAPES[ch])
+                    scalar["escape"] = None
+                    return
+                if ch not in "0123456789abcdefABCDEF":
+                    raise H5PValidationError("Invalides JSON: ungültiges \\u-Escape")
+                escape += ch
+                if len(escape) == 5:
+                    self._append_char(chr(int(escape[1:], 16)))
+                    scalar["escape"] = None
+                else:
+                    scalar["escape"] = escape
+                return
+            if ch == "\\":
+                scalar["escape"] = ""
+            elif ch == '"':
+                self._finish_string()
+            elif ch < " ":
+                raise H5PValidationError("Invalides JSON: Steuerzeichen in String")
+            else:
+                self._append_char(ch)
+            return
+
+        if kind == "literal":
+            text, value = scalar["literal"]
+            if text[len(scalar["buf"])] != ch:
+                raise H5PValidationError(f"Invalides JSON: '{text}' erwartet")
+            scalar["buf"].append(ch)
+            if len(scalar["buf"]) == len(text):
+                self._scalar = None
+                self._finish_value(scalar["path"], value)
+            return
+
+        # number: endet am ersten Zeichen, das nicht zur Zahl gehört
+        if ch in "0123456789+-.eE":
+            scalar["buf"].append(ch)
+            return
+        self._finish_number()
+        self._step(ch)
+
+    def _append_char(self, ch: str):
+        scalar = self._scalar
+        if scalar["kind"] == "key":
+            scalar["buf"].append(ch)
+        elif not ch.isspace():
+            scalar["non_empty"] = True
+
+    def _finish_string(self):
+        scalar = self._scalar
+        self._scalar = None
+        frame = self._stack[-1]
+
+        if scalar["kind"] == "key":
+            key = "".join(scalar["buf"])
+            frame["key"] = key
+            frame["keys"].add(key)
+            frame["expect"] = "colon"
+            return
+
+        path = scalar["path"]
+        rule_path = self._rule_path(path)
+        if rule_path in _STREAM_NON_EMPTY and not scalar["non_empty"]:
+            if rule_path == ("question",):
+                raise H5PValidationError("Feld 'question' muss ein nicht-leerer String sein")
+            raise H5PValidationError(f"Antwort {path[1] + 1}: 'text' muss ein nicht-leerer String sein")
+        self._finish_value(path, None)
+
+    def _finish_number(self):
+        scalar = self._scalar
+        self._scalar = None
+        if not _NUMBER_RE.fullmatch("".join(scalar["buf"])):
+            raise H5PValidationError("Invalides JSON: ungültige Zahl")
+        self._finish_value(scalar["path"], None)
+
+    def _finish_value(self, path: tuple, value):
+        rule_path = self._rule_path(path)
+        if rule_path == ("answers", "*", "correct") and value:
+            self._correct_count += 1
+        elif rule_path == ("behaviour", "singleAnswer"):
+            self._single_answer = value
+            if self._answers_closed:
+                self._check_single_answer()
+
+        if not self._stack:
+            self.done = True
+            return
+        self._stack[-1]["expect"] = "comma_or_end"
+
+    def _close_container(self):
+        frame = self._stack.pop()
+        path = frame["path"]
+        rule_path = self._rule_path(path)
+
+        if frame["kind"] == "object":
+            for field in _STREAM_REQUIRED.get(rule_path, []):
+                if field not in frame["keys"]:
+                    if rule_path == ():
+                        raise H5PValidationError(f"Fehlendes Pflichtfeld: {field}")
+                    raise H5PValidationError(f"Antwort {path[1] + 1}: Fehlendes Feld '{field}'")
+        elif rule_path == ("answers",):
+            if frame["count"] < 2:
+                raise H5PValidationError("Mindestens 2 Antwortmöglichkeiten erforderlich")
+            if self._correct_count == 0:
+                raise H5PValidationError("Mindestens eine Antwort muss als 'correct': true markiert sein")
+            self._answers_closed = True
+            self._check_single_answer()
+
+        self._finish_value(path, None)
+
+    def _check_single_answer(self):
+        if self._single_answer and self._correct_count != 1:
+            raise H5PValidationError(
+                f"Bei 'singleAnswer': true ist genau 1 richtige Antwort erlaubt, gefunden: {self._correct_count}"
+            )
+
+    @staticmethod
+    def _type_error(path: tuple, expected: str) -> str:
+        rule_path = StreamingH5PValidator._rule_path(path)
+        if rule_path == ():
+            return "H5P muss ein JSON-Objekt sein"
+        if rule_path == ("answers", "*"):
+            return f"Antwort {path[1] + 1} muss ein Objekt sein"
+        if rule_path == ("answers", "*", "correct"):
+            return f"Antwort {path[1] + 1}: 'correct' muss true oder false sein"
+        if rule_path == ("answers", "*", "text"):
+            return f"Antwort {path[1] + 1}: 'text' muss ein nicht-leerer String sein"
+        if rule_path == ("behaviour", "singleAnswer"):
+            return "'singleAnswer' muss true oder false sein"
+        names = {"object": "ein Objekt", "array": "eine Liste", "string": "ein String", "bool": "true oder false"}
+        return f"Feld '{path[-1]}' muss {names[expected]} sein"
@@ -1,41 +1,195 @@
 import json
+import os
+import time
 import torch
+from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from typing import Iterable, List, Optional
+from transformers import AutoTokenizer, AutoModelForCausalLM, DynamicCache, LogitsProcessorList, StoppingCriteriaList
+from src.config import DataConfig, ModelConfig, ProfilingConfig, ResultCacheConfig
+from src.constrained_decoding import TokenAutomaton, H5PJsonLogitsProcessor
 from src.h5p_validator import H5PValidator
+from src.prefix_cache import PrefixKVCache
+from src.result_cache import ResultCache, cache_key, model_checksum
+from src.speculative import NgramDrafter, SpeculativeStats, speculative_generate
+from src.stopping import FirstValidStoppingCriteria, JsonObjectStoppingCriteria, StreamingValidationStoppingCriteria
 
 # --------------------------------------
-# Modellpfad
+# Modellpfad (überschreibbar per Umgebungsvariable H5P_MODEL_PATH)
 # --------------------------------------
-MODEL_PATH = r"C:\Users\dawin\OneDrive\Documents\Semester_1\Projekt2\scale_c\outputs\final_model_cpu"
+MODEL_PATH = Path(os.environ.get("H5P_MODEL_PATH", "outputs/final_model_cpu"))
 
-print(f"🧠 Lade Modell aus: {MODEL_PATH}")
-tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-model = AutoModelForCausalLM.from_pretrained(MODEL_PATH, dtype=torch.float32).to("cpu")
-model.eval()
+# Werden beim ersten Aufruf von load_model() gesetzt (nicht beim Import)
+tokenizer = None
+model = None
+# Prüfsumme der geladenen Gewichte (None = unbekannt, z.B. per set_model übergeben → kein Ergebnis-Cache)
+_model_checksum: Optional[str] = None
 
 # Speicherordner für erzeugte H5P-Dateien
 OUTPUT_DIR = Path("data/h5p")
 OUTPUT_DIR.mkdir(exist_ok=True, parents=True)
 
+# Decoding-Parameter (STRICT MODE: greedy)
+GENERATION_KWARGS = dict(
+    max_new_tokens=500,
+    do_sample=False,
+    temperature=0.0
+)
+
+# Decoding für Wiederholungsversuche (greedy würde denselben Fehler erneut erzeugen)
+RETRY_SAMPLING_KWARGS = dict(
+    do_sample=True,
+    temperature=0.7,
+    top_p=0.9
+)
+
+
+@dataclass
+class GenerationStats:
+    """Durchsatz-Statistik einer Batch-Generierung"""
+    num_questions: int = 0
+    generated_tokens: int = 0
+    tokens_saved: int = 0  # durch frühen Stopp nach schließender Klammer
+    seconds: float = 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.generated_tokens / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def questions_per_second(self) -> float:
+        return self.num_questions / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class BestOfNStats:
+    """Statistik einer Best-of-N-Anfrage (siehe model_answer_best_of_n)"""
+    num_candidates: int = 0
+    candidates_needed: int = 0  # abgeschlossene Kandidaten bis einschließlich des ersten validen
+    cancelled: int = 0  # beim ersten validen Kandidaten noch laufende Sequenzen
+    winner: Optional[int] = None
+    generated_tokens: int = 0
+    seconds: float = 0.0
+
+    @property
+    def valid(self) -> bool:
+        return self.winner is not None
+
+
+# --------------------------------------
+# Modell laden
+# --------------------------------------
+
+def load_model(model_path: Optional[Path] = None, quantized: bool = False):
+    """
+    Lädt Tokenizer und Modell einmal pro Prozess (z.B. beim Start des Inferenz-Service).
+    quantized=True lädt das gemergte, dynamisch INT8-quantisierte Modell (siehe quantization.py).
+    Gemergte Exporte (siehe export_model.py) werden per mmap eingebunden.
+    """
+    global _model_checksum
+    model_path = Path(model_path or MODEL_PATH)
+
+    print(f"🧠 Lade Modell aus: {model_path}")
+    start = time.perf_counter()
+    loaded_tokenizer = AutoTokenizer.from_pretrained(model_path)
+    from src.export_model import is_merged_export, load_merged_mmap
+    if quantized:
+        from src.quantization import load_quantized_model
+        loaded_model = load_quantized_model(model_path)
+    elif is_merged_export(model_path):
+        loaded_model = load_merged_mmap(model_path)
+    else:
+        loaded_model = AutoModelForCausalLM.from_pretrained(model_path, dtype=torch.float32).to("cpu")
+    print(f"✓ Modell geladen in {time.perf_counter() - start:.1f}s")
+
+    loaded = set_model(loaded_model, loaded_tokenizer)
+    _model_checksum = model_checksum(model_path, quantized)
+    return loaded
+
+
+def set_model(new_model, new_tokenizer):
+    """Verwendet ein bereits geladenes Modell (z.B. frisch trainierter Adapter im Sweep)"""
+    global tokenizer, model, _json_automaton, _model_checksum, _drafter
+    tokenizer = new_tokenizer
+    # Für Batch-Generierung: links auffüllen, damit alle Prompts bündig enden
+    tokenizer.padding_side = ModelConfig().padding_side
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.unk_token or tokenizer.eos_token
+    model = new_model
+    model.eval()
+    _model_checksum = None
+
+    _json_automaton = None
+    _drafter = None
+    _prefix_cache.clear()
+    return model, tokenizer
+
+
+def _ensure_loaded():
+    if model is None:
+        load_model()
+
+
+# --------------------------------------
+# Ergebnis-Cache (validierte content.json)
+# --------------------------------------
+
+_result_cache: Optional[ResultCache] = None
+
+
+def get_result_cache(config: Optional[ResultCacheConfig] = None) -> Optional[ResultCache]:
+    """Prozessweiter Ergebnis-Cache (None, wenn deaktiviert)"""
+    global _result_cache
+    config = config or ResultCacheConfig()
+    if _result_cache is None and config.enabled:
+        _result_cache = ResultCache(config)
+    return _result_cache
+
+
+def result_cache_key(
+    question: str,
+    constrained: bool = False,
+    max_attempts: int = 1,
+    num_candidates: int = 1
+) -> Optional[str]:
+    """
+    Cache-Schlüssel für eine Anfrage mit dem aktuell geladenen Modell
+    (None, solange die Gewichte keine bekannte Prüfsumme haben).
+    """
+    if _model_checksum is None:
+        return None
+    decoding = dict(GENERATION_KWARGS, constrained=constrained)
+    if num_candidates > 1:
+        decoding.update(RETRY_SAMPLING_KWARGS, num_candidates=num_candidates)
+    elif max_attempts > 1:
+        decoding.update(max_attempts=max_attempts, retry=RETRY_SAMPLING_KWARGS)
+    return cache_key(question, _model_checksum, build_prompt("{question}"), decoding)
+
 
 # --------------------------------------
 # Hilfsfunktionen
 # --------------------------------------
 
+SYSTEM_MESSAGE = (
+    "Du bist ein H5P-Content-Generator. "
+    "Erstelle IMMER eine vollständig valide H5P content.json für Multiple-Choice. "
+    "Antworte ausschließlich mit JSON ohne Erklärungen."
+)
+
+
+def build_prompt_prefix() -> str:
+    """ Statischer Teil des Prompts (für alle Fragen gleich, siehe PrefixKVCache). """
+    return f"<|system|>\n{SYSTEM_MESSAGE}</s>\n"
+
+
 def build_prompt(question: str) -> str:
     """
     Baut das Chat-Prompt so, wie es im Training genutzt wurde.
     STRICT MODE: Das Modell MUSS valides JSON schreiben.
     """
-    system_message = (
-        "Du bist ein H5P-Content-Generator. "
-        "Erstelle IMMER eine vollständig valide H5P content.json für Multiple-Choice. "
-        "Antworte ausschließlich mit JSON ohne Erklärungen."
-    )
-
     prompt = (
-        f"<|system|>\n{system_message}</s>\n"
+        f"{build_prompt_prefix()}"
         f"<|user|>\n{question}</s>\n"
         f"<|assistant|>\n"
     )
@@ -43,22 +197,370 @@ def build_prompt(question: str) -> str:
     return prompt
 
 
-def model_answer(question: str) -> str:
-    """ Ruft das Modell im STRICT MODE auf. """
+# KV-Cache des System-Präfixes (einmal pro geladenem Modell berechnet)
+_prefix_cache = PrefixKVCache(max_entries=4)
+
+
+def _encode_prompts(prompts: List[str], use_prefix_cache: bool = True) -> tuple[dict, Optional[object]]:
+    """
+    Tokenisiert Prompts (links aufgefüllt). Mit use_prefix_cache wird der
+    gecachte KV-Cache des System-Präfixes mitgeliefert und nur der User-Teil
+    muss im Prefill berechnet werden.
+    """
+    if use_prefix_cache:
+        prepared = _prefix_cache.prepare_inputs(model, tokenizer, build_prompt_prefix(), prompts)
+        if prepared is not None:
+            return prepared
+    return tokenizer(prompts, return_tensors="pt", padding=True), None
+
+
+_json_automaton: Optional[TokenAutomaton] = None
+
+
+def _get_json_automaton() -> TokenAutomaton:
+    """ Kompiliert den Token-Automaten für das MultiChoice-Schema einmal pro Prozess. """
+    global _json_automaton
+    if _json_automaton is None:
+        _json_automaton = TokenAutomaton(tokenizer)
+    return _json_automaton
+
+
+def _constrained_setup() -> tuple[str, LogitsProcessorList]:
+    """
+    Liefert den erzwungenen JSON-Anfang (wird direkt ans Prompt gehängt und
+    damit im Prefill statt Token für Token berechnet) und den LogitsProcessor.
+    """
+    automaton = _get_json_automaton()
+    grammar = automaton.grammar
+    forced_text, start_state = grammar.forced_text(grammar.initial_state())
+    processor = H5PJsonLogitsProcessor(automaton, start_state)
+    return forced_text, LogitsProcessorList([processor])
+
+
+def model_answer(
+    question: str,
+    constrained: bool = False,
+    early_stop: bool = True,
+    use_prefix_cache: bool = True
+) -> str:
+    """
+    Ruft das Modell im STRICT MODE auf.
+    constrained=True erzwingt schema-konformes JSON (siehe constrained_decoding.py).
+    early_stop=True beendet die Generierung, sobald das JSON-Objekt geschlossen ist.
+    use_prefix_cache=True verwendet den KV-Cache des System-Präfixes wieder.
+    """
+    _ensure_loaded()
     prompt = build_prompt(question)
 
-    inputs = tokenizer(prompt, return_tensors="pt")
+    forced_text = ""
+    logits_processor = None
+    if constrained:
+        forced_text, logits_processor = _constrained_setup()
+        prompt += forced_text
+
+    inputs, past_key_values = _encode_prompts([prompt], use_prefix_cache)
+    stopping = JsonObjectStoppingCriteria(tokenizer, inputs["input_ids"].shape[1], forced_text)
     with torch.no_grad():
         output = model.generate(
             **inputs,
-            max_new_tokens=500,
-            do_sample=False,
-            temperature=0.0
+            past_key_values=past_key_values,
+            logits_processor=logits_processor,
+            stopping_criteria=StoppingCriteriaList([stopping]) if early_stop else None,
+            **GENERATION_KWARGS
         )
 
+    if early_stop:
+        saved = stopping.tokens_saved(GENERATION_KWARGS["max_new_tokens"])[0]
+        print(f"⏱️ Früher Stopp: {saved} Tokens gespart")
+
     return tokenizer.decode(output[0], skip_special_tokens=True)
 
 
+def model_answer_validated(
+    question: str,
+    max_attempts: int = 3,
+    constrained: bool = False,
+    use_prefix_cache: bool = True
+) -> tuple[str, Optional[str]]:
+    """
+    Generiert mit Streaming-Validierung: Ein Regelverstoß bricht die Generierung
+    sofort ab und startet einen neuen (gesampelten) Versuch.
+    Liefert die letzte Antwort und ggf. den letzten Fehler (None = valide).
+    """
+    _ensure_loaded()
+    prompt = build_prompt(question)
+    raw, error = "", None
+
+    for attempt in range(1, max_attempts + 1):
+        forced_text = ""
+        logits_processor = None
+        attempt_prompt = prompt
+        if constrained:
+            forced_text, logits_processor = _constrained_setup()
+            attempt_prompt += forced_text
+
+        inputs, past_key_values = _encode_prompts([attempt_prompt], use_prefix_cache)
+        stopping = StreamingValidationStoppingCriteria(tokenizer, inputs["input_ids"].shape[1], forced_text)
+        decoding = dict(GENERATION_KWARGS, **(RETRY_SAMPLING_KWARGS if attempt > 1 else {}))
+        with torch.no_grad():
+            output = model.generate(
+                **inputs,
+                past_key_values=past_key_values,
+                logits_processor=logits_processor,
+                stopping_criteria=StoppingCriteriaList([stopping]),
+                **decoding
+            )
+
+        raw = tokenizer.decode(output[0], skip_special_tokens=True)
+        error = stopping.errors[0]
+        if error is None:
+            # Kein Streaming-Verstoß heißt noch nicht valide (max_new_tokens/EOS vor
+            # dem schließenden '}' oder gar kein JSON) → vollständig prüfen
+            extracted = extract_json(raw)
+            if extracted is None:
+                error = "Konnte kein JSON extrahieren"
+            else:
+                ok, validation_error, _ = H5PValidator.validate_multiple_choice(extracted)
+                error = None if ok else validation_error
+        if error is None:
+            return raw, None
+
+        generated = output.shape[1] - inputs["input_ids"].shape[1]
+        print(f"↻ Versuch {attempt}/{max_attempts} nach {generated} Tokens abgebrochen: {error}")
+
+    return raw, error
+
+
+def _shared_prefill(prompt: str, num_copies: int, use_prefix_cache: bool = True) -> tuple[dict, DynamicCache]:
+    """
+    Berechnet den Prefill eines Prompts einmal und vervielfältigt den KV-Cache
+    auf num_copies Zeilen. Das letzte Prompt-Token bleibt ungecacht, damit
+    generate() mit ihm den ersten Decoding-Schritt aller Kandidaten startet.
+    """
+    inputs, cache = _encode_prompts([prompt], use_prefix_cache)
+    cache = cache if cache is not None else DynamicCache()
+    cached = cache.get_seq_length()
+    if inputs["input_ids"].shape[1] - 1 > cached:
+        with torch.no_grad():
+            cache = model(
+                input_ids=inputs["input_ids"][:, cached:-1],
+                attention_mask=inputs["attention_mask"][:, :-1],
+                past_key_values=cache,
+                use_cache=True
+            ).past_key_values
+
+    if num_copies > 1:
+        cache.batch_repeat_interleave(num_copies)
+    inputs = {name: tensor.repeat(num_copies, 1) for name, tensor in inputs.items()}
+    return inputs, cache
+
+
+def model_answer_best_of_n(
+    question: str,
+    num_candidates: int = 4,
+    constrained: bool = False,
+    use_prefix_cache: bool = True,
+    temperature: float = RETRY_SAMPLING_KWARGS["temperature"],
+    top_p: float = RETRY_SAMPLING_KWARGS["top_p"]
+) -> tuple[str, Optional[str], BestOfNStats]:
+    """
+    Best-of-N statt serieller Neuversuche: num_candidates Antworten werden in
+    EINEM generate()-Aufruf gesampelt (gemeinsamer Prefill, siehe _shared_prefill).
+    Jeder Kandidat wird geprüft, sobald sein JSON-Objekt geschlossen ist; der
+    erste valide beendet die Generierung, die übrigen werden abgebrochen.
+    Liefert die gewählte Antwort, ggf. den Fehler (None = valide) und die Statistik.
+    """
+    _ensure_loaded()
+    start = time.perf_counter()
+    prompt = build_prompt(question)
+
+    forced_text = ""
+    logits_processor = None
+    if constrained:
+        forced_text, logits_processor = _constrained_setup()
+        prompt += forced_text
+
+    inputs, past_key_values = _shared_prefill(prompt, num_candidates, use_prefix_cache)
+    prompt_length = inputs["input_ids"].shape[1]
+    stopping = FirstValidStoppingCriteria(tokenizer, prompt_length, forced_text)
+    decoding = dict(GENERATION_KWARGS, do_sample=True, temperature=temperature, top_p=top_p)
+    with torch.no_grad():
+        output = model.generate(
+            **inputs,
+            past_key_values=past_key_values,
+            pad_token_id=tokenizer.pad_token_id,
+            logits_processor=logits_processor,
+            stopping_criteria=StoppingCriteriaList([stopping]),
+            **decoding
+        )
+
+    new_tokens = output[:, prompt_length:]
+    winner = stopping.winner
+    stats = BestOfNStats(num_candidates=num_candidates, winner=winner)
+    stats.generated_tokens = sum(
+        stopping.stop_positions[row] or _count_generated_tokens(new_tokens[row]) for row in range(num_candidates)
+    )
+    if winner is not None:
+        stats.candidates_needed = stopping.finish_order.index(winner) + 1
+        stats.cancelled = num_candidates - len(stopping.finish_order)
+        chosen, error = winner, None
+    else:
+        stats.candidates_needed = num_candidates
+        chosen = stopping.finish_order[0] if stopping.finish_order else 0
+        error = stopping.errors[chosen] or "JSON-Objekt nicht abgeschlossen"
+    stats.seconds = time.perf_counter() - start
+
+    print(
+        f"🎲 Best-of-{num_candidates}: "
+        + (f"Kandidat {stats.candidates_needed} valide, {stats.cancelled} abgebrochen"
+           if stats.valid else "kein valider Kandidat")
+        + f" ({stats.generated_tokens} Tokens in {stats.seconds:.1f}s)"
+    )
+    raw = forced_text + tokenizer.decode(new_tokens[chosen], skip_special_tokens=True)
+    return raw, error, stats
+
+
+_drafter: Optional[NgramDrafter] = None
+
+
+def get_drafter(corpus_paths: Optional[List[Path]] = None) -> NgramDrafter:
+    """ n-Gramm-Drafter aus dem Trainingskorpus (einmal pro geladenem Tokenizer). """
+    global _drafter
+    if _drafter is None:
+        _drafter = NgramDrafter.from_corpus(tokenizer, corpus_paths or [DataConfig().train_path])
+    return _drafter
+
+
+def model_answer_speculative(
+    question: str,
+    num_draft_tokens: int = 8,
+    use_prefix_cache: bool = True
+) -> tuple[str, SpeculativeStats]:
+    """
+    Wie model_answer() (greedy, früher Stopp), aber mit spekulativem Decoding:
+    der n-Gramm-Drafter schlägt Tokens vor, das Modell prüft sie blockweise
+    (siehe speculative.py). Liefert Antwort und Akzeptanz-Statistik.
+    """
+    _ensure_loaded()
+    drafter = get_drafter()
+    inputs, past_key_values = _encode_prompts([build_prompt(question)], use_prefix_cache)
+    output, stats = speculative_generate(
+        model,
+        inputs["input_ids"],
+        drafter,
+        max_new_tokens=GENERATION_KWARGS["max_new_tokens"],
+        num_draft_tokens=num_draft_tokens,
+        past_key_values=past_key_values,
+        eos_token_id=tokenizer.eos_token_id,
+        tokenizer=tokenizer
+    )
+    print(
+        f"🚀 Spekulativ: {stats.generated_tokens} Tokens in {stats.forward_passes} Forward-Pässen "
+        f"(Akzeptanzrate {stats.acceptance_rate:.0%}, {stats.seconds:.1f}s)"
+    )
+    return tokenizer.decode(output[0], skip_special_tokens=True), stats
+
+
+def _count_generated_tokens(sequence: torch.Tensor) -> int:
+    """ Zählt erzeugte Tokens bis einschließlich EOS (Padding danach zählt nicht). """
+    eos_positions = (sequence == tokenizer.eos_token_id).nonzero()
+    if len(eos_positions) > 0:
+        return int(eos_positions[0]) + 1
+    return len(sequence)
+
+
+def _generate_micro_batch(
+    prompts: List[str],
+    constrained: bool = False,
+    early_stop: bool = True,
+    use_prefix_cache: bool = True
+) -> tuple[List[str], int, int]:
+    """
+    Generiert eine links aufgefüllte Micro-Batch.
+    Liefert Antworten, Anzahl erzeugter Tokens und durch frühen Stopp gesparte Tokens.
+    """
+    forced_text = ""
+    logits_processor = None
+    if constrained:
+        forced_text, logits_processor = _constrained_setup()
+        prompts = [prompt + forced_text for prompt in prompts]
+
+    inputs, past_key_values = _encode_prompts(prompts, use_prefix_cache)
+    prompt_length = inputs["input_ids"].shape[1]
+    stopping = JsonObjectStoppingCriteria(tokenizer, prompt_length, forced_text)
+
+    with torch.no_grad():
+        output = model.generate(
+            **inputs,
+            past_key_values=past_key_values,
+            pad_token_id=tokenizer.pad_token_id,
+            logits_processor=logits_processor,
+            stopping_criteria=StoppingCriteriaList([stopping]) if early_stop else None,
+            **GENERATION_KWARGS
+        )
+
+    new_tokens = output[:, prompt_length:]
+    answers = [forced_text + answer for answer in tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+    token_count = sum(_count_generated_tokens(seq) for seq in new_tokens)
+    tokens_saved = sum(stopping.tokens_saved(GENERATION_KWARGS["max_new_tokens"])) if early_stop else 0
+    return answers, token_count, tokens_saved
+
+
+def model_answers_batch(
+    questions: Iterable[str],
+    batch_size: int = 8,
+    bucket_window: int = 64,
+    constrained: bool = False,
+    early_stop: bool = True,
+    use_prefix_cache: bool = True
+) -> tuple[List[str], GenerationStats]:
+    """
+    Batch-Variante von model_answer().
+
+    Fragen werden fensterweise (bucket_window) nach Prompt-Länge sortiert und
+    in Micro-Batches der Größe batch_size generiert, damit möglichst wenig
+    Padding entsteht. Die Antworten kommen in der Originalreihenfolge zurück.
+    Akzeptiert Listen und Iteratoren (z. B. zeilenweise gelesene Dateien).
+    """
+    _ensure_loaded()
+    bucket_window = max(bucket_window, batch_size)
+    question_iter = iter(questions)
+    answers: List[str] = []
+    stats = GenerationStats()
+    start = time.perf_counter()
+
+    while True:
+        window = list(islice(question_iter, bucket_window))
+        if not window:
+            break
+
+        prompts = [build_prompt(q) for q in window]
+        lengths = [len(ids) for ids in tokenizer(prompts)["input_ids"]]
+        order = sorted(range(len(prompts)), key=lambda i: lengths[i])
+
+        window_answers: List[str] = [""] * len(prompts)
+        for offset in range(0, len(order), batch_size):
+            indices = order[offset:offset + batch_size]
+            batch_answers, token_count, tokens_saved = _generate_micro_batch(
+                [prompts[i] for i in indices], constrained, early_stop, use_prefix_cache
+            )
+            for i, answer in zip(indices, batch_answers):
+                window_answers[i] = answer
+            stats.generated_tokens += token_count
+            stats.tokens_saved += tokens_saved
+
+        answers.extend(window_answers)
+        stats.num_questions += len(window)
+
+    stats.seconds = time.perf_counter() - start
+    print(
+        f"⚡ {stats.num_questions} Fragen in {stats.seconds:.1f}s "
+        f"({stats.tokens_per_second:.1f} Tokens/s, {stats.questions_per_second:.2f} Fragen/s, "
+        f"{stats.tokens_saved} Tokens durch frühen Stopp gespart)"
+    )
+    return answers, stats
+
+
 def extract_json(raw_text: str) -> str | None:
     """ Extrahiert den JSON-Teil aus der Modellantwort. """
     try:
@@ -69,6 +571,12 @@ def extract_json(raw_text: str) -> str | None:
         return None
 
 
+def is_valid_answer(raw_text: str) -> bool:
+    """ True, wenn die Modellantwort im STRICT MODE valide ist. """
+    extracted = extract_json(raw_text)
+    return extracted is not None and H5PValidator.validate_multiple_choice(extracted)[0]
+
+
 def save_h5p(json_text: str, filename: str):
     """ Speichert valides JSON als content.json in einer H5P-Datei. """
     import zipfile
@@ -96,17 +604,54 @@ def save_h5p(json_text: str, filename: str):
 # Hauptfunktion
 # --------------------------------------
 
-def generate_h5p(question: str):
+def generate_h5p(
+    question: str,
+    constrained: bool = False,
+    max_attempts: int = 1,
+    num_candidates: int = 1,
+    use_cache: bool = True,
+    speculative: bool = False
+) -> Optional[str]:
+    """
+    Generiert, validiert (STRICT MODE) und speichert eine content.json.
+    Liefert das valide JSON oder None. use_cache=True beantwortet gleiche
+    Anfragen aus dem Ergebnis-Cache und legt neue valide Ergebnisse dort ab.
+    speculative=True nutzt spekulatives Decoding (gleiche Ausgabe wie greedy;
+    nicht kombinierbar mit constrained, max_attempts > 1 oder num_candidates > 1).
+    """
+    if speculative and (constrained or max_attempts > 1 or num_candidates > 1):
+        raise ValueError(
+            "speculative=True ist nur für greedy Decoding ohne constrained, "
+            "max_attempts > 1 oder num_candidates > 1 verfügbar"
+        )
     print(f"\n🔹 Frage: {question}")
 
-    # Modellantwort
-    raw = model_answer(question)
+    _ensure_loaded()
+    cache = get_result_cache() if use_cache else None
+    key = result_cache_key(question, constrained, max_attempts, num_candidates) if cache else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            print(f"⚡ Cache-Treffer (Trefferquote {cache.stats.hit_rate:.0%})")
+            save_h5p(cached, "generated_mc.h5p")
+            return cached
+
+    # Modellantwort: Best-of-N (num_candidates > 1) bzw. Streaming-Validierung
+    # mit seriellen Neuversuchen (max_attempts > 1)
+    if num_candidates > 1:
+        raw, _, _ = model_answer_best_of_n(question, num_candidates=num_candidates, constrained=constrained)
+    elif max_attempts > 1:
+        raw, _ = model_answer_validated(question, max_attempts=max_attempts, constrained=constrained)
+    elif speculative:
+        raw, _ = model_answer_speculative(question)
+    else:
+        raw = model_answer(question, constrained=constrained)
     extracted = extract_json(raw)
 
     if extracted is None:
         print("❌ Konnte kein JSON extrahieren.")
         print("Antwort:", raw)
-        return
+        return None
 
     # STRICT MODE VALIDIERUNG
     ok, error, data = H5PValidator.validate_multiple_choice(extracted)
@@ -114,10 +659,30 @@ def generate_h5p(question: str):
     if not ok:
         print("❌ Ungültiges JSON:", error)
         print("Antwort:", extracted)
-        return
+        return None
 
     print("✓ JSON valide")
+    if key is not None:
+        cache.put(key, extracted)
     save_h5p(extracted, "generated_mc.h5p")
+    return extracted
+
+
+def profile_inference(questions: List[str], profiling: Optional[ProfilingConfig] = None, constrained: bool = False):
+    """
+    Profiliert ein Fenster von Anfragen (wait + warmup + active, siehe ProfilingConfig).
+    Fragen werden bei Bedarf wiederholt, bis das Fenster gefüllt ist.
+    """
+    from src.profiling import HotPathProfiler
+
+    _ensure_loaded()
+    profiler = HotPathProfiler(profiling or ProfilingConfig(enabled=True), "generate")
+    with profiler:
+        profiler.start(model)
+        for i in range(profiler.window):
+            model_answer(questions[i % len(questions)], constrained=constrained)
+            profiler.step()
+    return profiler.run_dirs
 
 
 # --------------------------------------
@@ -125,4 +690,8 @@ def generate_h5p(question: str):
 # --------------------------------------
 if __name__ == "__main__":
     frage = "Erstelle eine Multiple-Choice-Frage über Phishing."
-    generate_h5p(frage)
+    # H5P_PROFILE=1 → torch.profiler-Mitschnitt statt normaler Generierung
+    if os.environ.get("H5P_PROFILE") == "1":
+        profile_inference([frage])
+    else:
+        generate_h5p(frage)
@@ -0,0 +1,294 @@
+"""
+Lokaler Inferenz-Service: lädt das Modell einmal und beantwortet Anfragen per HTTP
+(TCP oder Unix-Socket). Gleichzeitige Anfragen werden zu dynamischen Batches
+zusammengefasst (max. Batch-Größe / max. Wartezeit).
+
+Start:
+    python -m src.inference_server --port 8080
+    python -m src.inference_server --socket /tmp/h5p.sock
+
+Endpunkte:
+    POST /generate   {"question": "...", "save": false}
+    GET  /health
+    GET  /metrics
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional
+
+from src import inference
+from src.h5p_validator import H5PValidator
+
+
+@dataclass
+class GenerationRequest:
+    question: str
+    save: bool = False
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    cache_key: Optional[str] = None
+
+
+class ServiceMetrics:
+    """Zähler und Latenzen des Service (threadsicher)"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._latencies: List[float] = []
+        self._window = window
+        self.requests = 0
+        self.valid = 0
+        self.invalid = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.generated_tokens = 0
+        self.generation_seconds = 0.0
+        self.started_at = time.time()
+
+    def record_batch(self, size: int, stats: "inference.GenerationStats"):
+        with self._lock:
+            self.batches += 1
+            self.batched_requests += size
+            self.generated_tokens += stats.generated_tokens
+            self.generation_seconds += stats.seconds
+
+    def record_request(self, latency: float, valid: bool):
+        with self._lock:
+            self.requests += 1
+            if valid:
+                self.valid += 1
+            else:
+                self.invalid += 1
+            self._latencies.append(latency)
+            if len(self._latencies) > self._window:
+                self._latencies = self._latencies[-self._window:]
+
+    def snapshot(self, queue_depth: int) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+            def percentile(p: float) -> float:
+                return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+            return {
+                "uptime_seconds": time.time() - self.started_at,
+                "requests": self.requests,
+                "valid": self.valid,
+                "invalid": self.invalid,
+                "queue_depth": queue_depth,
+                "batches": self.batches,
+                "avg_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+                "tokens_per_second": (
+                    self.generated_tokens / self.generation_seconds if self.generation_seconds else 0.0
+                ),
+                "latency_p50": percentile(0.50),
+                "latency_p95": percentile(0.95),
+                "latency_p99": percentile(0.99),
+            }
+
+
+class DynamicBatcher:
+    """Sammelt Anfragen aus einer Queue und generiert sie als gemeinsamen Batch"""
+
+    def __init__(self, max_batch_size: int = 8, max_wait_ms: float = 50.0, constrained: bool = False):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.constrained = constrained
+        self.queue: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self.metrics = ServiceMetrics()
+        self.cache = inference.get_result_cache()
+        self._thread = threading.Thread(target=self._run, name="dynamic-batcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, question: str, save: bool = False) -> Future:
+        request = GenerationRequest(question=question, save=save)
+        if self.cache is not None:
+            request.cache_key = inference.result_cache_key(question, self.constrained)
+        cached = self.cache.get(request.cache_key) if request.cache_key is not None else None
+        if cached is not None:
+            # Cache-Treffer: ohne Queue und Modell sofort beantworten
+            result = self._finish(request, cached, store=False)
+            result["cached"] = True
+            self.metrics.record_request(time.perf_counter() - request.enqueued_at, result["valid"])
+            request.future.set_result(result)
+            return request.future
+        self.queue.put(request)
+        return request.future
+
+    def _collect_batch(self) -> List[GenerationRequest]:
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                answers, stats = inference.model_answers_batch(
+                    [r.question for r in batch],
+                    batch_size=len(batch),
+                    constrained=self.constrained
+                )
+                self.metrics.record_batch(len(batch), stats)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            for request, raw in zip(batch, answers):
+                try:
+                    result = self._finish(request, raw)
+                except Exception as e:
+                    request.future.set_exception(e)
+                    continue
+                self.metrics.record_request(time.perf_counter() - request.enqueued_at, result["valid"])
+                request.future.set_result(result)
+
+    def _finish(self, request: GenerationRequest, raw: str, store: bool = True) -> dict:
+        """Extrahiert und validiert (STRICT MODE); valide Ergebnisse kommen in den Cache, optional als .h5p"""
+        extracted = inference.extract_json(raw)
+        if extracted is None:
+            return {"valid": False, "error": "Konnte kein JSON extrahieren", "raw": raw}
+
+        ok, error, data = H5PValidator.validate_multiple_choice(extracted)
+        if not ok:
+            return {"valid": False, "error": error, "raw": extracted}
+
+        if store and request.cache_key is not None:
+            self.cache.put(request.cache_key, extracted)
+        result = {"valid": True, "content": data}
+        if request.save:
+            filename = f"generated_{uuid.uuid4().hex[:12]}.h5p"
+            inference.save_h5p(extracted, filename)
+            result["h5p_path"] = str((inference.OUTPUT_DIR / filename).resolve())
+        return result
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    batcher: DynamicBatcher = None
+    request_timeout: float = 600.0
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "model": str(inference.MODEL_PATH)})
+        elif self.path == "/metrics":
+            metrics = self.batcher.metrics.snapshot(self.batcher.queue.qsize())
+            if self.batcher.cache is not None:
+                metrics["result_cache"] = self.batcher.cache.snapshot()
+            self._send_json(200, metrics)
+        else:
+            self._send_json(404, {"error": "Unbekannter Endpunkt"})
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self._send_json(404, {"error": "Unbekannter Endpunkt"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            payload = None
+        question = payload.get("question") if isinstance(payload, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            # Ungültige Anfragen nie in die Queue: sie würden die ganze Batch scheitern lassen
+            self._send_json(400, {"error": "Erwartet JSON-Objekt mit nicht-leerem String-Feld 'question'"})
+            return
+
+        future = self.batcher.submit(question, save=bool(payload.get("save", False)))
+        try:
+            result = future.result(timeout=self.request_timeout)
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200 if result["valid"] else 422, result)
+
+    def address_string(self):
+        # Bei Unix-Sockets ist client_address ein leerer String
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    socket_path: Optional[Path] = None,
+    max_batch_size: int = 8,
+    max_wait_ms: float = 50.0,
+    constrained: bool = False
+):
+    inference.load_model()
+
+    batcher = DynamicBatcher(max_batch_size, max_wait_ms, constrained)
+    batcher.start()
+    InferenceRequestHandler.batcher = batcher
+
+    if socket_path is not None:
+        server = UnixHTTPServer(str(socket_path), InferenceRequestHandler)
+        print(f"🚀 Inferenz-Service läuft auf unix:{socket_path}")
+    else:
+        server = ThreadingHTTPServer((host, port), InferenceRequestHandler)
+        print(f"🚀 Inferenz-Service läuft auf http://{host}:{port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("⏹️ Service beendet")
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokaler H5P-Inferenz-Service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--socket", type=Path, default=None, help="Unix-Socket statt TCP")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=50.0)
+    parser.add_argument("--constrained", action="store_true", help="Grammar-Constrained Decoding")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.socket, args.max_batch_size, args.max_wait_ms, args.constrained)
+
+
+if __name__ == "__main__":
+    main()
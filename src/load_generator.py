@@ -0,0 +1,121 @@
+"""
+Lastgenerator für den lokalen Inferenz-Service (src/inference_server.py).
+
+Beispiel:
+    python -m src.load_generator --requests 64 --concurrency 16
+    python -m src.load_generator --socket /tmp/h5p.sock --requests 32
+"""
+
+import argparse
+import http.client
+import json
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+DEFAULT_QUESTIONS = [
+    "Erstelle eine Multiple-Choice-Frage über Phishing.",
+    "Erstelle eine Multiple-Choice-Frage über sichere Passwörter.",
+    "Erstelle eine Multiple-Choice-Frage über Zwei-Faktor-Authentifizierung.",
+    "Erstelle eine Multiple-Choice-Frage über Ransomware.",
+]
+
+
+TRANSPORT_ERROR = 0  # Status für Verbindungsabbruch, Timeout, Reset (keine HTTP-Antwort)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP über einen Unix-Socket"""
+
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def _connection(host: str, port: int, socket_path: Optional[Path], timeout: float) -> http.client.HTTPConnection:
+    if socket_path is not None:
+        return UnixHTTPConnection(str(socket_path), timeout)
+    return http.client.HTTPConnection(host, port, timeout=timeout)
+
+
+def send_request(question: str, host: str, port: int, socket_path: Optional[Path], timeout: float) -> tuple[float, int]:
+    """Sendet eine Anfrage; liefert (Latenz in s, HTTP-Status bzw. TRANSPORT_ERROR)"""
+    conn = _connection(host, port, socket_path, timeout)
+    body = json.dumps({"question": question}, ensure_ascii=False).encode("utf-8")
+    start = time.perf_counter()
+    try:
+        conn.request("POST", "/generate", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        return time.perf_counter() - start, response.status
+    except (OSError, http.client.HTTPException):
+        # Nicht abbrechen: Transportfehler sind genau das, was ein Lasttest zeigen soll
+        return time.perf_counter() - start, TRANSPORT_ERROR
+    finally:
+        conn.close()
+
+
+def run_load(
+    questions: List[str],
+    num_requests: int,
+    concurrency: int,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    socket_path: Optional[Path] = None,
+    timeout: float = 600.0
+) -> dict:
+    workload = [questions[i % len(questions)] for i in range(num_requests)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda q: send_request(q, host, port, socket_path, timeout), workload))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    statuses = [status for _, status in results]
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    return {
+        "requests": num_requests,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests_per_second": num_requests / elapsed if elapsed > 0 else 0.0,
+        "valid": statuses.count(200),
+        "invalid": statuses.count(422),
+        "errors": len(statuses) - statuses.count(200) - statuses.count(422),
+        "transport_errors": statuses.count(TRANSPORT_ERROR),
+        "latency_p50": percentile(0.50),
+        "latency_p95": percentile(0.95),
+        "latency_max": latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lastgenerator für den H5P-Inferenz-Service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--socket", type=Path, default=None)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--questions", type=Path, default=None, help="Textdatei mit einer Frage pro Zeile")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions is not None:
+        questions = [line.strip() for line in args.questions.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+    report = run_load(questions, args.requests, args.concurrency, args.host, args.port, args.socket)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
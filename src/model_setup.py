@@ -9,10 +9,18 @@ from src.config import ModelConfig, LoRAConfig
 class ModelSetup:
     """Kümmert sich um Modell- und Tokenizer-Setup"""
 
-    def __init__(self, model_config: ModelConfig, lora_config: LoRAConfig, logger: logging.Logger):
+    def __init__(
+        self,
+        model_config: ModelConfig,
+        lora_config: LoRAConfig,
+        logger: logging.Logger,
+        low_memory: bool = False
+    ):
         self.model_config = model_config
         self.lora_config = lora_config
         self.logger = logger
+        # bf16-Basisgewichte + Gradient Checkpointing (siehe TrainingConfig.low_memory)
+        self.low_memory = low_memory
 
     def load_tokenizer(self):
         """Lädt und konfiguriert Tokenizer"""
@@ -50,15 +58,22 @@ class ModelSetup:
 
         model = AutoModelForCausalLM.from_pretrained(
             self.model_config.base_model,
-            torch_dtype=torch.float32,
+            torch_dtype=torch.bfloat16 if self.low_memory else torch.float32,
             device_map=None if self.model_config.device_map == "cpu" else self.model_config.device_map,
-            low_cpu_mem_usage=False,
+            # Gewichte direkt laden statt zuerst zufällig initialisieren (halbiert den Lade-Peak)
+            low_cpu_mem_usage=self.low_memory,
             trust_remote_code=self.model_config.trust_remote_code
         )
 
         # Wichtig für Training
         model.config.use_cache = False
 
+        if self.low_memory:
+            # Gradient Checkpointing (aktiviert der Trainer): Embedding-Ausgaben müssen
+            # Gradienten verlangen, sonst liefern die checkpointeten Blöcke bei
+            # eingefrorenen Embeddings keine LoRA-Gradienten
+            model.enable_input_require_grads()
+
         self.logger.info(f"✓ Modell geladen auf: {self.model_config.device_map}")
         self.logger.info(f"✓ Model dtype: {model.dtype}")
 
@@ -80,6 +95,12 @@ class ModelSetup:
         # Model für Training vorbereiten
         model = get_peft_model(model, lora_config)
 
+        if self.low_memory:
+            # Basis bleibt bf16, LoRA-Gewichte (und damit Gradienten + Optimizer-State) in fp32
+            for param in model.parameters():
+                if param.requires_grad:
+                    param.data = param.data.float()
+
         # Parameter-Statistik
         from src.utils import print_trainable_params
         stats = print_trainable_params(model)
@@ -1,9 +1,13 @@
 import json
+from pathlib import Path
+
 import pandas as pd
 import matplotlib.pyplot as plt
 
 
-with open("outputs/final_model_cpu/training_stats.json", "r") as f:
+OUTPUT_DIR = Path("outputs/final_model_cpu")
+
+with open(OUTPUT_DIR / "training_stats.json", "r") as f:
     raw = json.load(f)
 
 df = pd.DataFrame(raw)
@@ -26,4 +30,31 @@ plt.xlabel("steps")
 plt.ylabel("loss")
 plt.legend()
 plt.title("learning curve")
+
+# throughput & memory (TrainingMetricsCallback, one line per logging step and run)
+metrics_path = OUTPUT_DIR / "training_metrics.jsonl"
+if metrics_path.exists():
+    metrics = pd.read_json(metrics_path, lines=True)
+    phases = ["data_seconds", "forward_seconds", "backward_seconds", "optimizer_seconds"]
+
+    fig, axes = plt.subplots(2, 2, figsize=(12, 8))
+    for run, run_rows in metrics.groupby("run"):
+        axes[0, 0].plot(run_rows["step"], run_rows["tokens_per_second"], label=run)
+        axes[1, 0].plot(run_rows["step"], run_rows["peak_rss_mb"], label=run)
+        axes[1, 1].plot(run_rows["step"], run_rows["pad_ratio"], label=run)
+
+    # step time breakdown of the latest run
+    latest = metrics[metrics["run"] == metrics["run"].iloc[-1]]
+    axes[0, 1].stackplot(latest["step"], *[latest[phase] for phase in phases],
+                         labels=[phase.replace("_seconds", "") for phase in phases])
+
+    axes[0, 0].set_title("real tokens/s")
+    axes[0, 1].set_title(f"step time breakdown (s, run {latest['run'].iloc[0]})")
+    axes[1, 0].set_title("peak RSS (MB)")
+    axes[1, 1].set_title("pad ratio")
+    for ax in axes.flat:
+        ax.set_xlabel("steps")
+        ax.legend(fontsize="small")
+    fig.tight_layout()
+
 plt.show()
@@ -0,0 +1,102 @@
+"""
+KV-Cache für statische Prompt-Präfixe (System-Nachricht + Chat-Gerüst).
+
+Der Prefill des Präfixes wird einmal pro geladenem Modell berechnet und für
+jede Anfrage kopiert (bzw. auf die Batch-Größe erweitert). generate() muss
+dann nur noch den User-Teil vorberechnen.
+"""
+
+import copy
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from transformers import DynamicCache
+
+
+class PrefixKVCache:
+    """LRU-Cache: (Modell, Präfix-Text) → (Präfix-Token-IDs, past_key_values)"""
+
+    def __init__(self, max_entries: int = 4, max_bytes: Optional[int] = 256 * 1024 ** 2):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[List[int], DynamicCache, int]]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _cache_bytes(cache: DynamicCache) -> int:
+        return sum(k.nbytes + v.nbytes for k, v in cache.to_legacy_cache())
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self._total_bytes > self.max_bytes)
+        ):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+
+    def get(self, model, tokenizer, prefix_text: str) -> Tuple[List[int], DynamicCache]:
+        """Liefert Präfix-IDs und den (geteilten, nicht zu verändernden) KV-Cache"""
+        key = (id(model), prefix_text)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+        self.misses += 1
+        prefix_ids = tokenizer(prefix_text)["input_ids"]
+        with torch.no_grad():
+            output = model(
+                input_ids=torch.tensor([prefix_ids], device=model.device),
+                past_key_values=DynamicCache(),
+                use_cache=True
+            )
+        cache = output.past_key_values
+        size = self._cache_bytes(cache)
+
+        self._entries[key] = (prefix_ids, cache, size)
+        self._total_bytes += size
+        self._evict()
+        return prefix_ids, cache
+
+    def prepare_inputs(self, model, tokenizer, prefix_text: str, prompts: List[str]) -> Optional[Tuple[Dict, DynamicCache]]:
+        """
+        Baut generate()-Eingaben, deren erste Tokens exakt dem gecachten Präfix
+        entsprechen. Aufgefüllt wird zwischen Präfix und User-Teil (Attention-Maske 0),
+        damit alle Zeilen denselben Präfix-Cache teilen können.
+        Liefert None, wenn ein Prompt anders tokenisiert wird als das Präfix.
+        """
+        prefix_ids, shared_cache = self.get(model, tokenizer, prefix_text)
+        prompt_ids = tokenizer(prompts)["input_ids"]
+        if any(ids[:len(prefix_ids)] != prefix_ids for ids in prompt_ids):
+            return None
+
+        suffixes = [ids[len(prefix_ids):] for ids in prompt_ids]
+        width = max(len(suffix) for suffix in suffixes)
+        input_ids, attention_mask = [], []
+        for suffix in suffixes:
+            padding = width - len(suffix)
+            input_ids.append(prefix_ids + [tokenizer.pad_token_id] * padding + suffix)
+            attention_mask.append([1] * len(prefix_ids) + [0] * padding + [1] * len(suffix))
+
+        cache = copy.deepcopy(shared_cache)
+        if len(prompts) > 1:
+            cache.batch_repeat_interleave(len(prompts))
+
+        inputs = {
+            "input_ids": torch.tensor(input_ids, device=model.device),
+            "attention_mask": torch.tensor(attention_mask, device=model.device),
+        }
+        return inputs, cache
+
+    def clear(self):
+        self._entries.clear()
+        self._total_bytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
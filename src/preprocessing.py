@@ -1,13 +1,26 @@
-from datasets import Dataset
+from typing import Dict, List
+
+import torch
+from datasets import Dataset, IterableDataset
 from transformers import PreTrainedTokenizer
 
 
 class DataPreprocessor:
     """Verantwortlich für Formatierung und Tokenisierung"""
 
-    def __init__(self, tokenizer: PreTrainedTokenizer, max_length: int):
+    def __init__(
+        self,
+        tokenizer: PreTrainedTokenizer,
+        max_length: int,
+        dynamic_padding: bool = False,
+        packing: bool = False
+    ):
         self.tokenizer = tokenizer
         self.max_length = max_length
+        # Packing braucht ungepaddete Beispiele
+        self.dynamic_padding = dynamic_padding or packing
+        self.packing = packing
+        self.packing_efficiency = None
 
     def format_h5p_example(self, instruction: str, output: str) -> str:
 
@@ -34,6 +47,18 @@ class DataPreprocessor:
             for inst, out in zip(examples['instruction'], examples['output'])
         ]
 
+        # Dynamisches Padding: ungepaddet tokenisieren, Länge für Bucketing speichern
+        if self.dynamic_padding:
+            tokenized = self.tokenizer(
+                texts,
+                truncation=True,
+                max_length=self.max_length,
+                padding=False,
+                return_tensors=None
+            )
+            tokenized["length"] = [len(ids) for ids in tokenized["input_ids"]]
+            return tokenized
+
         # Tokenisieren
         tokenized = self.tokenizer(
             texts,
@@ -48,11 +73,149 @@ class DataPreprocessor:
 
         return tokenized
 
-    def process_dataset(self, dataset: Dataset) -> Dataset:
+    def process_dataset(self, dataset: Dataset, num_proc: int = 1) -> Dataset:
         """Verarbeitet komplettes Dataset"""
-        return dataset.map(
+        tokenized = dataset.map(
             self.tokenize_function,
             batched=True,
+            num_proc=num_proc if num_proc > 1 else None,
             remove_columns=dataset.column_names,
             desc="Tokenisierung"
         )
+        if self.packing:
+            return self.pack_dataset(tokenized)
+        return tokenized
+
+    def process_stream(self, dataset: IterableDataset) -> IterableDataset:
+        """Tokenisiert einen Datenstrom on-the-fly (immer ohne Padding)"""
+        if self.packing:
+            raise ValueError("Packing wird im Streaming-Modus nicht unterstützt")
+        self.dynamic_padding = True
+        return dataset.map(
+            self.tokenize_function,
+            batched=True,
+            remove_columns=["instruction", "output"]
+        )
+
+    def pack_dataset(self, tokenized: Dataset) -> Dataset:
+        """
+        Packt ungepaddete Beispiele per Best-Fit-Decreasing in Blöcke von max_length.
+        Beispiele werden nicht zerschnitten; seq_lens hält die Dokumentgrenzen
+        fest (für Attention-Maske, Positions-Reset und Labels im Collator).
+        """
+        lengths = tokenized["length"]
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+
+        blocks: List[List[int]] = []
+        # blocks_by_space[n] = Blöcke mit genau n freien Tokens
+        blocks_by_space: List[List[int]] = [[] for _ in range(self.max_length + 1)]
+        for index in order:
+            length = lengths[index]
+            space = next((n for n in range(length, self.max_length + 1) if blocks_by_space[n]), None)
+            if space is None:
+                block_id, space = len(blocks), self.max_length
+                blocks.append([])
+            else:
+                block_id = blocks_by_space[space].pop()
+            blocks[block_id].append(index)
+            blocks_by_space[space - length].append(block_id)
+
+        all_input_ids = tokenized["input_ids"]
+        packed = {"input_ids": [], "seq_lens": []}
+        for block in blocks:
+            packed["input_ids"].append([t for i in block for t in all_input_ids[i]])
+            packed["seq_lens"].append([lengths[i] for i in block])
+
+        real_tokens = sum(lengths)
+        self.packing_efficiency = real_tokens / (len(blocks) * self.max_length) if blocks else 0.0
+        return Dataset.from_dict(packed)
+
+
+class DynamicPaddingCollator:
+    """
+    Füllt jeden Batch nur bis zu seinem längsten Beispiel auf (rechts).
+    Labels = input_ids, Padding-Positionen werden über die Attention-Maske auf -100 gesetzt.
+    Zählt echte und aufgefüllte Tokens für die Durchsatz-Statistik.
+    """
+
+    def __init__(self, tokenizer: PreTrainedTokenizer, pad_to_multiple_of: int = 8):
+        self.pad_token_id = tokenizer.pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
+    def __call__(self, features: List[Dict]) -> Dict[str, torch.Tensor]:
+        width = max(len(f["input_ids"]) for f in features)
+        if self.pad_to_multiple_of:
+            width = -(-width // self.pad_to_multiple_of) * self.pad_to_multiple_of
+
+        input_ids = torch.full((len(features), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), width), dtype=torch.long)
+        for row, feature in enumerate(features):
+            length = len(feature["input_ids"])
+            input_ids[row, :length] = torch.tensor(feature["input_ids"], dtype=torch.long)
+            attention_mask[row, :length] = 1
+
+        labels = input_ids.masked_fill(attention_mask == 0, -100)
+
+        self.real_tokens += int(attention_mask.sum())
+        self.padded_tokens += input_ids.numel()
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+class PackedSequenceCollator(DynamicPaddingCollator):
+    """
+    Collator für gepackte Blöcke (siehe DataPreprocessor.pack_dataset).
+
+    Erzeugt pro Block eine block-diagonale, kausale 4D-Attention-Maske
+    (Beispiele sehen sich gegenseitig nicht), setzt position_ids an jeder
+    Dokumentgrenze auf 0 zurück und maskiert das Label am Dokumentanfang.
+    """
+
+    def __init__(self, tokenizer: PreTrainedTokenizer, max_length: int, mask_dtype: torch.dtype = torch.float32):
+        super().__init__(tokenizer, pad_to_multiple_of=0)
+        self.max_length = max_length
+        # Additive Maske muss den dtype der Attention-Scores haben (bf16 im Low-Memory-Profil)
+        self.mask_dtype = mask_dtype
+
+    def __call__(self, features: List[Dict]) -> Dict[str, torch.Tensor]:
+        width = self.max_length
+        batch_size = len(features)
+
+        input_ids = torch.full((batch_size, width), self.pad_token_id, dtype=torch.long)
+        position_ids = torch.zeros((batch_size, width), dtype=torch.long)
+        labels = torch.full((batch_size, width), -100, dtype=torch.long)
+        allowed = torch.zeros((batch_size, 1, width, width), dtype=torch.bool)
+        causal = torch.tril(torch.ones((width, width), dtype=torch.bool))
+
+        for row, feature in enumerate(features):
+            ids = torch.tensor(feature["input_ids"], dtype=torch.long)
+            input_ids[row, :len(ids)] = ids
+            labels[row, :len(ids)] = ids
+
+            start = 0
+            for length in feature["seq_lens"]:
+                end = start + length
+                position_ids[row, start:end] = torch.arange(length)
+                allowed[row, 0, start:end, start:end] = causal[:length, :length]
+                labels[row, start] = -100
+                start = end
+
+            # Padding-Positionen sehen nur sich selbst (vermeidet leere Softmax-Zeilen)
+            pad_positions = torch.arange(start, width)
+            allowed[row, 0, pad_positions, pad_positions] = True
+
+            self.real_tokens += start
+
+        self.padded_tokens += input_ids.numel()
+
+        # Additive Maske: 0 = erlaubt, minimaler float-Wert = gesperrt
+        attention_mask = torch.zeros(allowed.shape, dtype=self.mask_dtype)
+        attention_mask.masked_fill_(~allowed, torch.finfo(self.mask_dtype).min)
+
+        return {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "position_ids": position_ids,
+            "labels": labels,
+        }
@@ -0,0 +1,188 @@
+"""
+Opt-in torch.profiler-Mitschnitt für Training und Generierung.
+
+Über ein Fenster von Schritten (Training) bzw. Anfragen (Inferenz) wird
+profiliert; pro Lauf entstehen in ProfilingConfig.output_dir ein Chrome-Trace
+(trace.json, ansehbar unter chrome://tracing oder ui.perfetto.dev) und eine
+Top-Ops-Tabelle (top_ops.txt).
+
+Lineare Schichten werden per record_function markiert: "lora::<modul>" für
+die LoRA-Adapter-Matmuls (lora_A/lora_B), "base::<modul>" für die
+Basismodell-Matmuls. So lassen sich beide Anteile getrennt ablesen
+(Forward-Pass; Backward-Ops tragen keine Marker).
+
+Training: Config.profiling.enabled = True
+Inferenz: H5P_PROFILE=1 python -m src.inference
+"""
+
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import torch
+from torch.profiler import ProfilerActivity, profile, record_function, schedule
+from transformers import TrainerCallback
+
+from src.config import ProfilingConfig
+
+LORA_PREFIX = "lora::"
+BASE_PREFIX = "base::"
+
+
+def _label_hooks(module: torch.nn.Module, label: str) -> List:
+    """Umschließt den Forward eines Moduls mit record_function(label)"""
+    open_ranges = []
+
+    def pre_hook(mod, args):
+        scope = record_function(label)
+        scope.__enter__()
+        open_ranges.append(scope)
+
+    def post_hook(mod, args, output):
+        if open_ranges:
+            open_ranges.pop().__exit__(None, None, None)
+
+    return [module.register_forward_pre_hook(pre_hook), module.register_forward_hook(post_hook)]
+
+
+def label_linear_layers(model: torch.nn.Module) -> List:
+    """
+    Markiert LoRA-Adapter und Basismodell-Linears getrennt.
+    PEFT-LoRA-Schichten erkennt man an base_layer + lora_A/lora_B.
+    Liefert die Hook-Handles (zum Entfernen nach dem Profiling).
+    """
+    handles = []
+    covered = set()
+    for name, module in model.named_modules():
+        if hasattr(module, "base_layer") and hasattr(module, "lora_A"):
+            leaf = name.rsplit(".", 1)[-1]
+            handles += _label_hooks(module.base_layer, BASE_PREFIX + leaf)
+            covered.add(id(module.base_layer))
+            for adapters in (module.lora_A, module.lora_B):
+                for adapter in adapters.values():
+                    handles += _label_hooks(adapter, LORA_PREFIX + leaf)
+                    covered.add(id(adapter))
+
+    for name, module in model.named_modules():
+        if isinstance(module, torch.nn.Linear) and id(module) not in covered:
+            handles += _label_hooks(module, BASE_PREFIX + name.rsplit(".", 1)[-1])
+    return handles
+
+
+def attribution_table(prof) -> str:
+    """CPU-Zeit der markierten Bereiche, gruppiert nach LoRA vs. Basismodell"""
+    totals: Dict[str, float] = {LORA_PREFIX: 0.0, BASE_PREFIX: 0.0}
+    rows = []
+    for event in prof.key_averages():
+        for prefix in totals:
+            if event.key.startswith(prefix):
+                totals[prefix] += event.cpu_time_total
+                rows.append((event.cpu_time_total, event.key, event.count))
+
+    marked = sum(totals.values())
+    lines = ["Linear-Zuordnung (Forward, CPU-Zeit inkl. Kind-Ops)"]
+    for prefix, title in ((LORA_PREFIX, "LoRA-Adapter"), (BASE_PREFIX, "Basismodell")):
+        share = totals[prefix] / marked if marked else 0.0
+        lines.append(f"  {title:<14} {totals[prefix] / 1000:>10.1f} ms  ({share:.1%})")
+    lines.append("")
+    for cpu_time, key, count in sorted(rows, reverse=True):
+        lines.append(f"  {key:<24} {cpu_time / 1000:>10.1f} ms  {count:>7} Aufrufe")
+    return "\n".join(lines)
+
+
+class HotPathProfiler:
+    """
+    torch.profiler über ein Fenster aus wait/warmup/active Schritten.
+    step() nach jedem Trainingsschritt bzw. jeder Anfrage aufrufen.
+    """
+
+    def __init__(self, config: ProfilingConfig, run_name: str, logger: Optional[logging.Logger] = None):
+        self.config = config
+        self.run_name = run_name
+        self.logger = logger
+        self.run_dirs: List[Path] = []
+        self._profiler = None
+        self._handles = []
+
+    @property
+    def window(self) -> int:
+        return self.config.wait_steps + self.config.warmup_steps + self.config.active_steps
+
+    def _log(self, message: str):
+        if self.logger:
+            self.logger.info(message)
+        else:
+            print(message)
+
+    def _on_trace_ready(self, prof):
+        run_dir = Path(self.config.output_dir) / f"{self.run_name}-{datetime.now():%Y%m%d-%H%M%S}"
+        run_dir.mkdir(parents=True, exist_ok=True)
+        prof.export_chrome_trace(str(run_dir / "trace.json"))
+
+        table = prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=self.config.row_limit)
+        (run_dir / "top_ops.txt").write_text(
+            f"{table}\n\n{attribution_table(prof)}\n", encoding="utf-8"
+        )
+        self.run_dirs.append(run_dir)
+        self._log(f"🔬 Profil gespeichert: {run_dir}")
+
+    def start(self, model: Optional[torch.nn.Module] = None):
+        if model is not None:
+            self._handles = label_linear_layers(model)
+        self._profiler = profile(
+            activities=[ProfilerActivity.CPU],
+            schedule=schedule(
+                wait=self.config.wait_steps,
+                warmup=self.config.warmup_steps,
+                active=self.config.active_steps,
+                repeat=1
+            ),
+            on_trace_ready=self._on_trace_ready,
+            record_shapes=self.config.record_shapes,
+        )
+        self._profiler.__enter__()
+        self._log(
+            f"🔬 Profiling aktiv: {self.config.active_steps} Schritte "
+            f"(nach {self.config.wait_steps} + {self.config.warmup_steps} Warmup)"
+        )
+
+    def step(self):
+        if self._profiler is not None:
+            self._profiler.step()
+
+    def stop(self):
+        if self._profiler is not None:
+            self._profiler.__exit__(None, None, None)
+            self._profiler = None
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class ProfilerCallback(TrainerCallback):
+    """Profiliert ein Fenster von Trainingsschritten (nur Rank 0)"""
+
+    def __init__(self, config: ProfilingConfig, logger: logging.Logger):
+        self.profiler = HotPathProfiler(config, "train", logger)
+        self._steps = 0
+
+    def on_train_begin(self, args, state, control, model=None, **kwargs):
+        if state.is_world_process_zero:
+            self.profiler.start(model)
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self.profiler.step()
+        self._steps += 1
+        # Fenster vorbei → Hooks und Profiler-Overhead sofort loswerden
+        if self._steps >= self.profiler.window:
+            self.profiler.stop()
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self.profiler.stop()
@@ -0,0 +1,173 @@
+"""
+Dynamisch INT8-quantisierte Inferenz (nur CPU).
+
+Der LoRA-Adapter wird in die Basisgewichte gemergt, danach werden die
+Linear-Layer aus LoRAConfig.target_modules (q_proj … down_proj) dynamisch
+nach INT8 quantisiert. Der quantisierte state_dict wird auf der Platte gecacht (kein gepickeltes
+Modellobjekt) und nur neu erzeugt, wenn sich Adapter, Zielmodule oder die
+torch-Version ändern.
+
+Vergleich fp32 vs. INT8 (Größe, Latenz, Strict-Mode-Validität):
+    python -m src.quantization --compare --num-questions 10
+"""
+
+import argparse
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import torch
+from peft import PeftConfig, PeftModel
+from transformers import AutoConfig, AutoModelForCausalLM
+
+from src.config import LoRAConfig, ModelConfig
+
+QUANTIZED_DIRNAME = "quantized_int8"
+ADAPTER_WEIGHT_FILES = ("adapter_model.safetensors", "adapter_model.bin", "adapter_config.json")
+CACHE_FORMAT = "state_dict-v2"  # nur Gewichte, kein gepickeltes Modellobjekt
+
+
+def _base_model_name(adapter_path: Path) -> str:
+    peft_config = PeftConfig.from_pretrained(str(adapter_path))
+    return peft_config.base_model_name_or_path or ModelConfig().base_model
+
+
+def merge_adapter(adapter_path: Path, dtype: torch.dtype = torch.float32):
+    """Lädt Basismodell + LoRA-Adapter und mergt den Adapter in die Basisgewichte"""
+    base_model_name = _base_model_name(adapter_path)
+
+    base_model = AutoModelForCausalLM.from_pretrained(base_model_name, dtype=dtype)
+    model = PeftModel.from_pretrained(base_model, str(adapter_path))
+    return model.merge_and_unload()
+
+
+def quantize_dynamic_int8(model, target_modules: Optional[List[str]] = None):
+    """Quantisiert die Ziel-Linear-Layer dynamisch nach INT8"""
+    target_modules = target_modules or LoRAConfig().target_modules
+    layer_names = {
+        name for name, module in model.named_modules()
+        if isinstance(module, torch.nn.Linear) and name.split(".")[-1] in target_modules
+    }
+    return torch.ao.quantization.quantize_dynamic(model, layer_names, dtype=torch.qint8)
+
+
+def _cache_key(adapter_path: Path, target_modules: List[str]) -> str:
+    digest = hashlib.sha256()
+    for filename in ADAPTER_WEIGHT_FILES:
+        path = adapter_path / filename
+        if path.exists():
+            digest.update(filename.encode())
+            digest.update(path.read_bytes())
+    digest.update(json.dumps(sorted(target_modules)).encode())
+    digest.update(torch.__version__.encode())
+    digest.update(CACHE_FORMAT.encode())
+    return digest.hexdigest()
+
+
+def _quantized_skeleton(adapter_path: Path, target_modules: List[str]):
+    """Gleiche Modulstruktur wie merge + quantize, aber ohne Basisgewichte zu laden"""
+    config = AutoConfig.from_pretrained(_base_model_name(adapter_path))
+    model = AutoModelForCausalLM.from_config(config, dtype=torch.float32)
+    return quantize_dynamic_int8(model, target_modules)
+
+
+def load_quantized_model(adapter_path: Path, target_modules: Optional[List[str]] = None, rebuild: bool = False):
+    """Lädt das INT8-Modell aus dem Cache oder erzeugt es (merge + quantize) einmalig"""
+    adapter_path = Path(adapter_path)
+    target_modules = target_modules or LoRAConfig().target_modules
+    cache_dir = adapter_path / QUANTIZED_DIRNAME
+    model_file = cache_dir / "model_state.pt"
+    meta_file = cache_dir / "meta.json"
+    key = _cache_key(adapter_path, target_modules)
+
+    if not rebuild and model_file.exists() and meta_file.exists():
+        meta = json.loads(meta_file.read_text(encoding="utf-8"))
+        if meta.get("key") == key:
+            print(f"✓ INT8-Modell aus Cache: {model_file}")
+            model = _quantized_skeleton(adapter_path, target_modules)
+            # weights_only=True: der Cache enthält nur Tensoren, keinen ausführbaren Pickle-Code
+            model.load_state_dict(torch.load(model_file, weights_only=True))
+            model.eval()
+            return model
+
+    print("🔧 Merge LoRA-Adapter und quantisiere nach INT8 (einmalig)")
+    model = quantize_dynamic_int8(merge_adapter(adapter_path), target_modules)
+    model.eval()
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_file = model_file.with_suffix(".tmp")
+    torch.save(model.state_dict(), tmp_file)
+    tmp_file.replace(model_file)
+    (cache_dir / "model.pt").unlink(missing_ok=True)  # alter, gepickelter Cache (vor state_dict-Format)
+    meta_file.write_text(json.dumps({"key": key, "target_modules": target_modules}, indent=2), encoding="utf-8")
+    print(f"✓ INT8-Modell gespeichert: {model_file}")
+    return model
+
+
+def model_size_bytes(model) -> int:
+    """Speichergröße aller Gewichte (inkl. gepackter INT8-Parameter)"""
+    total = 0
+    for value in model.state_dict().values():
+        values = value if isinstance(value, tuple) else (value,)
+        for tensor in values:
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def _measure(questions: List[str]) -> Dict[str, float]:
+    from src import inference
+
+    valid = 0
+    start = time.perf_counter()
+    for question in questions:
+        if inference.is_valid_answer(inference.model_answer(question)):
+            valid += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "size_mb": model_size_bytes(inference.model) / 1024 ** 2,
+        "latency_s": elapsed / len(questions),
+        "validity_rate": valid / len(questions),
+    }
+
+
+def compare_fp32_int8(questions: List[str], model_path: Optional[Path] = None) -> Dict[str, Dict[str, float]]:
+    """Vergleicht Größe, Latenz pro Frage und Strict-Mode-Validitätsrate"""
+    from src import inference
+
+    report = {}
+    for label, quantized in (("fp32", False), ("int8", True)):
+        inference.load_model(model_path, quantized=quantized)
+        report[label] = _measure(questions)
+        print(
+            f"📊 {label}: {report[label]['size_mb']:.0f} MB, "
+            f"{report[label]['latency_s']:.2f} s/Frage, "
+            f"Validität {report[label]['validity_rate']:.0%}"
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8-Quantisierung des fine-getunten Modells")
+    parser.add_argument("--model-path", type=Path, default=Path("outputs/final_model_cpu"))
+    parser.add_argument("--rebuild", action="store_true", help="Cache ignorieren und neu quantisieren")
+    parser.add_argument("--compare", action="store_true", help="fp32 vs. INT8 vergleichen")
+    parser.add_argument("--num-questions", type=int, default=10)
+    args = parser.parse_args()
+
+    load_quantized_model(args.model_path, rebuild=args.rebuild)
+
+    if args.compare:
+        topics = ["Phishing", "Passwörter", "Malware", "VPN", "Firewalls", "Backups"]
+        questions = [
+            f"Erstelle eine Multiple-Choice-Frage über {topics[i % len(topics)]}."
+            for i in range(args.num_questions)
+        ]
+        report = compare_fp32_int8(questions, args.model_path)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Inhaltsadressierter Ergebnis-Cache für generierte content.json.
+
+Schlüssel = SHA-256 über normalisierte Frage, Prüfsumme der Modellgewichte
+(Adapter), Prompt-Template und Decoding-Parameter. Ändert sich eines davon,
+entsteht automatisch ein neuer Schlüssel; alte Einträge laufen per TTL bzw.
+Größenlimit aus.
+
+Zwei Stufen:
+  - LRU im Arbeitsspeicher (Treffer im Mikrosekundenbereich)
+  - SQLite auf der Platte (überlebt Neustarts, von mehreren Prozessen nutzbar)
+
+Gespeichert wird ausschließlich content.json, die den Strict-Mode-Validator besteht.
+
+Einträge anzeigen bzw. leeren:
+    python -m src.result_cache [--clear]
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+from src import validator_registry
+from src.config import ResultCacheConfig
+
+# Nur Dateien, die die Ausgabe bestimmen (keine Checkpoints, Statistiken, Profile)
+MODEL_FILE_PATTERNS = (
+    "adapter_model.*", "adapter_config.json",
+    "model*.safetensors", "pytorch_model*.bin", "config.json", "generation_config.json",
+    "tokenizer*", "special_tokens_map.json", "*.model",
+)
+FULL_HASH_LIMIT = 64 * 1024 ** 2  # größere Dateien (gemergte Basismodelle) nur über Größe + mtime
+_WHITESPACE = re.compile(r"\s+")
+
+_checksums: dict = {}
+
+
+def normalize_question(question: str) -> str:
+    """Unicode-NFKC, Groß-/Kleinschreibung, Leerraum und Satzzeichen am Ende vereinheitlichen"""
+    question = unicodedata.normalize("NFKC", question).casefold()
+    return _WHITESPACE.sub(" ", question).strip().rstrip(".?!").strip()
+
+
+def model_checksum(model_path: Path, quantized: bool = False) -> str:
+    """
+    Prüfsumme eines Modellordners: Adapter-Gewichte, Konfigurationen und Tokenizer
+    der obersten Ebene; das INT8-Artefakt nur mit quantized=True.
+    Einmal pro Prozess und Dateistand berechnet.
+    """
+    model_path = Path(model_path)
+    files = [
+        p for p in model_path.glob("*")
+        if p.is_file() and any(fnmatch.fnmatch(p.name, pattern) for pattern in MODEL_FILE_PATTERNS)
+    ]
+    if quantized:
+        from src.quantization import QUANTIZED_DIRNAME
+        files += [p for p in (model_path / QUANTIZED_DIRNAME).glob("*") if p.is_file()]
+    files.sort()
+    fingerprint = tuple((str(p.relative_to(model_path)), p.stat().st_size, p.stat().st_mtime_ns) for p in files)
+    cache_key = (str(model_path.resolve()), quantized, fingerprint)
+    if cache_key in _checksums:
+        return _checksums[cache_key]
+
+    digest = hashlib.sha256(f"quantized={quantized}".encode())
+    for path, (name, size, mtime) in zip(files, fingerprint):
+        digest.update(f"{name}:{size}".encode())
+        if size > FULL_HASH_LIMIT:
+            digest.update(str(mtime).encode())
+            continue
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 ** 2), b""):
+                digest.update(block)
+
+    _checksums[cache_key] = digest.hexdigest()
+    return _checksums[cache_key]
+
+
+def cache_key(question: str, checksum: str, prompt_template: str, decoding: dict) -> str:
+    """Inhaltsadresse eines Ergebnisses"""
+    payload = json.dumps(
+        {
+            "question": normalize_question(question),
+            "model": checksum,
+            "template": prompt_template,
+            "decoding": decoding,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Trefferquoten und Verdrängungen"""
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    rejected: int = 0  # nicht valide → nicht gespeichert
+    expired: int = 0
+    evicted: int = 0
+    lookup_seconds: float = 0.0
+
+    @property
+    def lookups(self) -> int:
+        return self.memory_hits + self.disk_hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return (self.memory_hits + self.disk_hits) / self.lookups if self.lookups else 0.0
+
+    def as_dict(self) -> dict:
+        stats = asdict(self)
+        stats.pop("lookup_seconds")
+        stats["hit_rate"] = self.hit_rate
+        stats["avg_lookup_us"] = self.lookup_seconds / self.lookups * 1e6 if self.lookups else 0.0
+        return stats
+
+
+class ResultCache:
+    """Zweistufiger Cache (LRU + SQLite) für validierte content.json (threadsicher)"""
+
+    def __init__(self, config: Optional[ResultCacheConfig] = None):
+        self.config = config or ResultCacheConfig()
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if self.config.path is not None:
+            self._open_db(Path(self.config.path))
+
+    def _open_db(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.config.ttl_seconds is not None and now - created_at > self.config.ttl_seconds
+
+    def _remember(self, key: str, content: str, created_at: float):
+        self._memory[key] = (content, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.config.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        """Gecachte content.json (JSON-Text) oder None"""
+        start = time.perf_counter()
+        now = time.time()
+        with self._lock:
+            try:
+                entry = self._memory.get(key)
+                if entry is not None:
+                    if not self._expired(entry[1], now):
+                        self._memory.move_to_end(key)
+                        self.stats.memory_hits += 1
+                        return entry[0]
+                    del self._memory[key]
+
+                if self._db is not None:
+                    row = self._db.execute("SELECT content, created_at FROM results WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        content, created_at = row
+                        if not self._expired(created_at, now):
+                            self._db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+                            self._remember(key, content, created_at)
+                            self.stats.disk_hits += 1
+                            return content
+                        self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                        self.stats.expired += 1
+
+                self.stats.misses += 1
+                return None
+            finally:
+                self.stats.lookup_seconds += time.perf_counter() - start
+
+    def put(self, key: str, content_json: str, main_library: str = "H5P.MultiChoice") -> bool:
+        """Speichert content.json nur, wenn sie valide ist; True = gespeichert"""
+        try:
+            errors = validator_registry.validate(json.loads(content_json), main_library)
+        except json.JSONDecodeError:
+            errors = ["Invalides JSON"]
+        if errors:
+            with self._lock:
+                self.stats.rejected += 1
+            return False
+
+        now = time.time()
+        with self._lock:
+            self._remember(key, content_json, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, content, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, content_json, len(content_json.encode("utf-8")), now, now)
+                )
+                self._evict(now)
+            self.stats.stores += 1
+        return True
+
+    def _evict(self, now: float):
+        """Abgelaufene Einträge löschen, danach die am längsten ungenutzten bis zum Größenlimit"""
+        if self.config.ttl_seconds is not None:
+            cursor = self._db.execute("DELETE FROM results WHERE created_at < ?", (now - self.config.ttl_seconds,))
+            self.stats.expired += max(cursor.rowcount, 0)
+
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.config.max_disk_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY accessed_at").fetchall():
+            if total <= self.config.max_disk_bytes:
+                break
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+            self.stats.evicted += 1
+
+    def disk_usage(self) -> Tuple[int, int]:
+        """(Einträge, Bytes) der SQLite-Stufe"""
+        if self._db is None:
+            return 0, 0
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+
+    def snapshot(self) -> dict:
+        entries, size = self.disk_usage()
+        with self._lock:
+            stats = self.stats.as_dict()
+            stats["memory_entries"] = len(self._memory)
+        stats["disk_entries"] = entries
+        stats["disk_bytes"] = size
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ergebnis-Cache verwalten")
+    parser.add_argument("--path", type=Path, default=ResultCacheConfig.path)
+    parser.add_argument("--clear", action="store_true", help="Alle Einträge löschen")
+    args = parser.parse_args()
+
+    cache = ResultCache(ResultCacheConfig(path=args.path))
+    if args.clear:
+        cache.clear()
+        print(f"🗑️ Cache geleert: {args.path}")
+    entries, size = cache.disk_usage()
+    print(f"📦 {entries} Einträge, {size / 1024 ** 2:.2f} MB in {args.path}")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
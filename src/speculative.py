@@ -0,0 +1,254 @@
+"""
+Spekulatives Decoding für die greedy Generierung auf CPU.
+
+Ein günstiger Drafter schlägt die nächsten k Tokens vor; das feinabgestimmte
+Modell prüft alle Vorschläge in EINEM Forward-Pass. Übernommen wird das
+längste Präfix, das mit dem greedy-Argmax übereinstimmt, plus das erste
+abweichende (korrigierte) Token. Das Ergebnis entspricht damit der normalen
+greedy-Generierung, braucht aber für vorhersehbares JSON-Gerüst
+("answers": [{"text": ..., "correct": ...}]) deutlich weniger Forward-Pässe.
+
+Drafter (NgramDrafter), ohne zweites Modell:
+  1. Prompt-Lookup: Wiederholung aus der eigenen Sequenz (z.B. die Frage im Feld "question")
+  2. n-Gramm-Tabelle aus den "output"-Feldern des Trainingskorpus (data/processed)
+
+Benchmark (Akzeptanzrate und Speedup gegenüber model_answer):
+    python -m src.speculative --num-questions 8 --draft-tokens 8
+"""
+
+import argparse
+import json
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import torch
+from transformers import DynamicCache
+
+from src.stopping import JsonDepthTracker
+
+
+@dataclass
+class SpeculativeStats:
+    """Akzeptanz und Kosten einer spekulativen Generierung"""
+    drafted_tokens: int = 0
+    accepted_tokens: int = 0
+    forward_passes: int = 0
+    generated_tokens: int = 0
+    seconds: float = 0.0
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted_tokens / self.drafted_tokens if self.drafted_tokens else 0.0
+
+    @property
+    def tokens_per_forward(self) -> float:
+        return self.generated_tokens / self.forward_passes if self.forward_passes else 0.0
+
+    def add(self, other: "SpeculativeStats"):
+        self.drafted_tokens += other.drafted_tokens
+        self.accepted_tokens += other.accepted_tokens
+        self.forward_passes += other.forward_passes
+        self.generated_tokens += other.generated_tokens
+        self.seconds += other.seconds
+
+
+class NgramDrafter:
+    """
+    Schlägt Fortsetzungen aus n-Gramm-Statistiken vor (Backoff von max_order bis min_order).
+    Pro Kontext wird nur die häufigste Fortsetzung gespeichert.
+    """
+
+    def __init__(self, max_order: int = 4, min_order: int = 2, lookup_order: int = 3):
+        self.max_order = max_order
+        self.min_order = min_order
+        self.lookup_order = lookup_order
+        self._counts: Dict[Tuple[int, ...], Counter] = defaultdict(Counter)
+        self._table: Dict[Tuple[int, ...], int] = {}
+
+    @classmethod
+    def from_corpus(
+        cls,
+        tokenizer,
+        paths: Iterable[Path],
+        max_records: Optional[int] = 10_000,
+        **kwargs
+    ) -> "NgramDrafter":
+        """Baut die Tabelle aus den "output"-Feldern von JSONL-Dateien (Trainingspaare)"""
+        drafter = cls(**kwargs)
+        records = 0
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if max_records is not None and records >= max_records:
+                        break
+                    try:
+                        output = json.loads(line).get("output")
+                    except (json.JSONDecodeError, AttributeError):
+                        continue
+                    if isinstance(output, str):
+                        drafter.add(tokenizer(output, add_special_tokens=False)["input_ids"])
+                        records += 1
+        drafter.finalize()
+        print(f"📚 n-Gramm-Drafter: {records} Beispiele, {len(drafter)} Kontexte")
+        return drafter
+
+    def add(self, ids: List[int]):
+        for order in range(self.min_order, self.max_order + 1):
+            for i in range(len(ids) - order):
+                self._counts[tuple(ids[i:i + order])][ids[i + order]] += 1
+
+    def finalize(self):
+        """Reduziert die Zähler auf die häufigste Fortsetzung pro Kontext"""
+        self._table.update({context: counts.most_common(1)[0][0] for context, counts in self._counts.items()})
+        self._counts.clear()
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def _lookup(self, ids: List[int]) -> Optional[int]:
+        for order in range(self.max_order, self.min_order - 1, -1):
+            if len(ids) >= order:
+                token = self._table.get(tuple(ids[-order:]))
+                if token is not None:
+                    return token
+        return None
+
+    def _prompt_lookup(self, ids: List[int], k: int) -> List[int]:
+        """Letztes Vorkommen der jüngsten lookup_order Tokens in der Sequenz → deren Fortsetzung"""
+        n = self.lookup_order
+        if len(ids) <= n:
+            return []
+        pattern = ids[-n:]
+        for start in range(len(ids) - n - 1, -1, -1):
+            if ids[start:start + n] == pattern:
+                return ids[start + n:start + n + k]
+        return []
+
+    def draft(self, ids: List[int], k: int) -> List[int]:
+        """Bis zu k vorgeschlagene Tokens für die Fortsetzung von ids"""
+        proposal = self._prompt_lookup(ids, k)
+        if proposal:
+            return proposal
+        context = list(ids)
+        while len(proposal) < k:
+            token = self._lookup(context)
+            if token is None:
+                break
+            proposal.append(token)
+            context.append(token)
+        return proposal
+
+
+def speculative_generate(
+    model,
+    input_ids: torch.LongTensor,
+    drafter: NgramDrafter,
+    max_new_tokens: int,
+    num_draft_tokens: int = 8,
+    past_key_values: Optional[DynamicCache] = None,
+    eos_token_id: Optional[int] = None,
+    tokenizer=None,
+    initial_text: str = ""
+) -> Tuple[torch.LongTensor, SpeculativeStats]:
+    """
+    Greedy-Generierung für eine einzelne Sequenz (Batch-Größe 1, ohne Padding).
+
+    past_key_values darf einen gecachten Präfix enthalten (siehe PrefixKVCache).
+    Mit tokenizer wird wie bei JsonObjectStoppingCriteria gestoppt, sobald das
+    äußerste JSON-Objekt geschlossen ist (initial_text = JSON-Anfang im Prompt).
+    Liefert Prompt + erzeugte Tokens und die Statistik.
+    """
+    stats = SpeculativeStats()
+    start = time.perf_counter()
+    cache = past_key_values if past_key_values is not None else DynamicCache()
+    sequence = input_ids[0].tolist()
+    prompt_length = len(sequence)
+    tracker = JsonDepthTracker() if tokenizer is not None else None
+    if tracker is not None:
+        tracker.feed(initial_text)
+
+    with torch.no_grad():
+        # Prefill bis auf das letzte Prompt-Token (Invariante: Cache = Sequenz ohne letztes Token)
+        cached = cache.get_seq_length()
+        if prompt_length - 1 > cached:
+            model(input_ids=input_ids[:, cached:-1], past_key_values=cache, use_cache=True)
+            stats.forward_passes += 1
+
+        finished = False
+        while not finished and len(sequence) - prompt_length < max_new_tokens:
+            budget = max_new_tokens - (len(sequence) - prompt_length)
+            draft = drafter.draft(sequence, min(num_draft_tokens, budget - 1))
+            block = torch.tensor([sequence[-1:] + draft], device=input_ids.device)
+            logits = model(input_ids=block, past_key_values=cache, use_cache=True).logits
+            predicted = logits[0].argmax(dim=-1).tolist()
+            stats.forward_passes += 1
+
+            accepted = 0
+            while accepted < len(draft) and predicted[accepted] == draft[accepted]:
+                accepted += 1
+            stats.drafted_tokens += len(draft)
+            stats.accepted_tokens += accepted
+            # Verworfene Vorschläge aus dem Cache entfernen; das Korrektur-Token bleibt ungecacht
+            cache.crop(len(sequence) + accepted)
+
+            for token in draft[:accepted] + [predicted[accepted]]:
+                sequence.append(token)
+                if token == eos_token_id:
+                    finished = True
+                elif tracker is not None:
+                    finished = tracker.feed(tokenizer.decode([token], skip_special_tokens=True))
+                if finished:
+                    break
+
+    stats.generated_tokens = len(sequence) - prompt_length
+    stats.seconds = time.perf_counter() - start
+    return torch.tensor([sequence], device=input_ids.device), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark: spekulatives vs. normales greedy Decoding")
+    parser.add_argument("--model-path", type=Path, default=None)
+    parser.add_argument("--num-questions", type=int, default=8)
+    parser.add_argument("--draft-tokens", type=int, default=8, help="Vorgeschlagene Tokens pro Forward-Pass")
+    args = parser.parse_args()
+
+    from src import inference
+    from src.config import DataConfig
+
+    inference.load_model(args.model_path)
+    questions = []
+    with open(DataConfig().train_path, "r", encoding="utf-8") as f:
+        for line in f:
+            questions.append(json.loads(line)["instruction"])
+            if len(questions) >= args.num_questions:
+                break
+
+    # Aufwärmen (Präfix-Cache, Drafter)
+    inference.model_answer(questions[0])
+    inference.model_answer_speculative(questions[0], num_draft_tokens=args.draft_tokens)
+
+    baseline_seconds = 0.0
+    total = SpeculativeStats()
+    identical = 0
+    for question in questions:
+        start = time.perf_counter()
+        reference = inference.model_answer(question)
+        baseline_seconds += time.perf_counter() - start
+        answer, stats = inference.model_answer_speculative(question, num_draft_tokens=args.draft_tokens)
+        total.add(stats)
+        identical += inference.extract_json(answer) == inference.extract_json(reference)
+
+    speedup = baseline_seconds / total.seconds if total.seconds > 0 else 0.0
+    print(
+        f"📊 {len(questions)} Fragen: greedy {baseline_seconds:.1f}s, spekulativ {total.seconds:.1f}s "
+        f"(Speedup {speedup:.2f}x)\n"
+        f"   Akzeptanzrate {total.acceptance_rate:.0%}, {total.tokens_per_forward:.2f} Tokens/Forward-Pass, "
+        f"{identical}/{len(questions)} Ausgaben identisch"
+    )
+
+
+if __name__ == "__main__":
+    main()
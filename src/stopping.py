@@ -0,0 +1,168 @@
+"""
+Stopping-Kriterien für generate(): beendet die Generierung, sobald das
+äußerste JSON-Objekt geschlossen ist. Alles danach würde extract_json()
+ohnehin verwerfen.
+"""
+
+from typing import Dict, List, Optional
+
+import torch
+from transformers import StoppingCriteria
+
+from src.h5p_validator import H5PValidator, StreamingH5PValidator, H5PValidationError
+
+
+class JsonDepthTracker:
+    """Verfolgt inkrementell die Klammertiefe eines JSON-Textstroms (String-bewusst)"""
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.closed = False
+
+    def feed(self, text: str) -> bool:
+        """Verarbeitet neuen Text; True sobald das äußerste Objekt geschlossen ist"""
+        for ch in text:
+            if self.closed:
+                break
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == "{":
+                self.depth += 1
+            elif ch == "}" and self.depth > 0:
+                self.depth -= 1
+                self.closed = self.depth == 0
+            elif ch == '"' and self.depth > 0:
+                self.in_string = True
+
+        return self.closed
+
+
+class JsonObjectStoppingCriteria(StoppingCriteria):
+    """
+    Stoppt jede Sequenz, sobald ihr äußerstes JSON-Objekt geschlossen ist.
+
+    prompt_length: Länge der (gepaddeten) Eingabe, ab der generierte Tokens beginnen.
+    initial_text: bereits im Prompt stehender JSON-Anfang (z.B. bei Constrained Decoding).
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, initial_text: str = ""):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.initial_text = initial_text
+        self._trackers: Optional[List[JsonDepthTracker]] = None
+        self._consumed: List[int] = []
+        self.stop_positions: List[Optional[int]] = []
+        self._token_cache: Dict[int, str] = {}
+
+    def _token_text(self, token_id: int) -> str:
+        text = self._token_cache.get(token_id)
+        if text is None:
+            text = self.tokenizer.decode([token_id], skip_special_tokens=True)
+            self._token_cache[token_id] = text
+        return text
+
+    def _init_rows(self, batch_size: int):
+        self._trackers = [JsonDepthTracker() for _ in range(batch_size)]
+        self._consumed = [self.prompt_length] * batch_size
+        self.stop_positions = [None] * batch_size
+        for row in range(batch_size):
+            self._feed_row(row, self.initial_text)
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self._trackers is None:
+            self._init_rows(input_ids.shape[0])
+
+        done = []
+        for row, tracker in enumerate(self._trackers):
+            if not tracker.closed:
+                new_ids = input_ids[row, self._consumed[row]:].tolist()
+                self._consumed[row] = input_ids.shape[1]
+                self._feed_row(row, "".join(self._token_text(t) for t in new_ids))
+                if tracker.closed:
+                    self.stop_positions[row] = input_ids.shape[1] - self.prompt_length
+            done.append(tracker.closed)
+
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    def _feed_row(self, row: int, text: str):
+        self._trackers[row].feed(text)
+
+    def tokens_saved(self, max_new_tokens: int) -> List[int]:
+        """Pro Sequenz eingesparte Tokens gegenüber max_new_tokens (0 = kein früher Stopp)"""
+        return [max_new_tokens - pos if pos is not None else 0 for pos in self.stop_positions]
+
+
+class StreamingValidationStoppingCriteria(JsonObjectStoppingCriteria):
+    """
+    Wie JsonObjectStoppingCriteria, bricht aber zusätzlich ab, sobald der
+    StreamingH5PValidator einen Regelverstoß meldet. Der Fehler steht
+    danach in errors[row]; so kann sofort ein neuer Versuch starten.
+    """
+
+    def _init_rows(self, batch_size: int):
+        self._validators = [StreamingH5PValidator() for _ in range(batch_size)]
+        self.errors: List[Optional[str]] = [None] * batch_size
+        super()._init_rows(batch_size)
+
+    def _feed_row(self, row: int, text: str):
+        super()._feed_row(row, text)
+        try:
+            self._validators[row].feed(text)
+        except H5PValidationError as e:
+            self.errors[row] = str(e)
+            self._trackers[row].closed = True
+
+
+class FirstValidStoppingCriteria(StreamingValidationStoppingCriteria):
+    """
+    Best-of-N: Jede Kandidaten-Zeile wird vollständig mit dem H5PValidator
+    geprüft, sobald ihr JSON-Objekt geschlossen ist. Der erste valide Kandidat
+    beendet die Generierung für alle Zeilen, die übrigen werden abgebrochen.
+
+    winner: Zeilenindex des gewählten Kandidaten (None = keiner valide)
+    finish_order: Zeilen in der Reihenfolge, in der sie abgeschlossen wurden
+    """
+
+    def _init_rows(self, batch_size: int):
+        self._checked = [False] * batch_size
+        self.finish_order: List[int] = []
+        self.winner: Optional[int] = None
+        super()._init_rows(batch_size)
+
+    def _validate_row(self, input_ids: torch.LongTensor, row: int) -> Optional[str]:
+        # Am Stück dekodieren: pro Token dekodierter Text verliert führende Leerzeichen
+        # und wäre nicht der Text, den der Aufrufer zurückbekommt
+        generated = input_ids[row, self.prompt_length:].tolist()
+        text = self.initial_text + self.tokenizer.decode(generated, skip_special_tokens=True)
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end < start:
+            return "Kein JSON-Objekt gefunden"
+        ok, error, _ = H5PValidator.validate_multiple_choice(text[start:end + 1])
+        return None if ok else error
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        done = super().__call__(input_ids, scores, **kwargs)
+        for row, finished in enumerate(done.tolist()):
+            if not finished or self._checked[row]:
+                continue
+            self._checked[row] = True
+            self.finish_order.append(row)
+            # Streaming-Verstöße stehen schon in errors; sonst jetzt vollständig prüfen
+            if self.errors[row] is None:
+                self.errors[row] = self._validate_row(input_ids, row)
+            if self.errors[row] is None and self.winner is None:
+                self.winner = row
+
+        if self.winner is not None:
+            done[:] = True
+        return done
@@ -0,0 +1,309 @@
+"""
+Paralleler Hyperparameter-Sweep über LoRAConfig und TrainingConfig.
+
+Trials (Grid oder Zufallsstichprobe aus dem Suchraum) laufen in eigenen
+Prozessen mit festem Thread-Budget. Successive Halving: alle Trials starten
+mit min_steps Schritten, pro Runde überlebt das beste 1/eta und trainiert
+vom eigenen (asynchronen) Checkpoint aus mit eta-fachem Budget weiter.
+
+Rangfolge: Strict-Mode-Validitätsrate auf Holdout-Fragen (absteigend),
+bei Gleichstand Eval-Loss (aufsteigend).
+
+Der tokenisierte Datensatz wird einmal im Hauptprozess in den Cache
+(DataConfig.cache_dir) geschrieben; alle Trials laden ihn per mmap.
+
+Start:
+    python -m src.sweep --search grid --parallel 2 --threads-per-trial 4
+    python -m src.sweep --search random --trials 12 --min-steps 20 --eta 3 --rungs 3
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.config import Config
+from src.utils import setup_logging
+
+DEFAULT_SEARCH_SPACE: Dict[str, List[Any]] = {
+    "lora.r": [8, 16, 32],
+    "lora.alpha": [16, 32, 64],
+    "lora.dropout": [0.05, 0.1],
+    "lora.target_modules": [
+        ["q_proj", "v_proj"],
+        ["q_proj", "k_proj", "v_proj", "o_proj"],
+        ["q_proj", "k_proj", "v_proj", "o_proj", "gate_proj", "up_proj", "down_proj"],
+    ],
+    "training.learning_rate": [5e-5, 1e-4, 2e-4],
+    "training.warmup_steps": [0, 30],
+}
+
+
+@dataclass
+class TrialResult:
+    """Ergebnis eines Trials nach einer Runde"""
+    trial_id: int
+    overrides: Dict[str, Any]
+    rung: int
+    max_steps: int
+    eval_loss: Optional[float] = None
+    validity_rate: float = 0.0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def sort_key(self):
+        # Fehlgeschlagene zuletzt, dann höchste Validität, dann niedrigster Eval-Loss
+        loss = self.eval_loss if self.eval_loss is not None else float("inf")
+        return (self.error is not None, -self.validity_rate, loss)
+
+
+def grid_trials(space: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+
+
+def random_trials(space: Dict[str, List[Any]], num_trials: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Zufallsstichprobe ohne Duplikate (höchstens so viele wie das Grid hat)"""
+    rng = random.Random(seed)
+    total = 1
+    for values in space.values():
+        total *= len(values)
+
+    trials, seen = [], set()
+    while len(trials) < min(num_trials, total):
+        trial = {key: rng.choice(values) for key, values in space.items()}
+        fingerprint = json.dumps(trial, sort_keys=True)
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            trials.append(trial)
+    return trials
+
+
+def build_trial_config(overrides: Dict[str, Any], output_dir: Path, max_steps: int, save_steps: int) -> Config:
+    """Config mit Overrides ("abschnitt.feld") und Sweep-Einstellungen"""
+    config = Config()
+    for path, value in overrides.items():
+        section, name = path.split(".")
+        setattr(getattr(config, section), name, value)
+
+    config.training.output_dir = output_dir
+    config.training.max_steps = max_steps
+    config.training.save_steps = save_steps  # Rundenbudgets sind Vielfache → Checkpoint am Rundenende
+    config.training.save_total_limit = 1
+    config.training.async_checkpointing = True
+    config.training.resume = True  # Nächste Runde setzt am eigenen Checkpoint fort
+    config.training.distributed = False
+    # Kurze Trials: Durchsatz zählt, alle Trials nutzen dieselbe Einstellung (vergleichbar)
+    config.data.dynamic_padding = True
+    # Holdout-Auswahl braucht eine Zeile pro Beispiel → kein Packing, kein Streaming
+    config.data.packing = False
+    config.data.streaming = False
+    config.profiling.enabled = False
+    return config
+
+
+def _trial_logger(output_dir: Path, name: str) -> logging.Logger:
+    """Eigene Log-Datei pro Trial (mehrere Trials teilen sich ggf. einen Worker-Prozess)"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = logging.FileHandler(output_dir / "training.log", encoding="utf-8")
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+
+def _holdout_indices(num_examples: int, holdout_every: int) -> List[int]:
+    """Deterministische Holdout-Auswahl (jedes n-te Beispiel), identisch für alle Trials"""
+    return list(range(0, num_examples, holdout_every))
+
+
+def prepare_shared_dataset(config: Config, logger: logging.Logger):
+    """Füllt den Tokenisierungs-Cache einmal, bevor die Trials starten"""
+    from src.data_loader import DatasetLoader
+    from src.dataset_cache import cached_process_dataset
+    from src.model_setup import ModelSetup
+    from src.preprocessing import DataPreprocessor
+
+    if config.data.cache_dir is None:
+        logger.warning("⚠️ DataConfig.cache_dir=None → jeder Trial tokenisiert selbst")
+        return
+    tokenizer = ModelSetup(config.model, config.lora, logger).load_tokenizer()
+    preprocessor = DataPreprocessor(tokenizer, config.data.max_length, config.data.dynamic_padding)
+    for path, dataset in ((config.data.train_path, DatasetLoader(config.data, logger).load_train_data()),
+                          (config.data.eval_path, DatasetLoader(config.data, logger).load_eval_data())):
+        if dataset is not None:
+            cached_process_dataset(preprocessor, dataset, path, config.data.cache_dir, logger, config.data.num_proc)
+
+
+def run_trial(
+    trial_id: int,
+    overrides: Dict[str, Any],
+    sweep_dir: Path,
+    rung: int,
+    max_steps: int,
+    save_steps: int,
+    threads: int,
+    holdout_every: int,
+    validity_samples: int
+) -> TrialResult:
+    """Trainiert einen Trial bis max_steps und bewertet ihn (läuft im Worker-Prozess)"""
+    import torch
+
+    from src import inference
+    from src.data_loader import DatasetLoader
+    from src.dataset_cache import cached_process_dataset
+    from src.model_setup import ModelSetup
+    from src.preprocessing import DataPreprocessor
+    from src.trainer import ModelTrainer
+
+    torch.set_num_threads(threads)
+    output_dir = sweep_dir / f"trial-{trial_id:03d}"
+    config = build_trial_config(overrides, output_dir, max_steps, save_steps)
+    logger = _trial_logger(output_dir, f"sweep.trial-{trial_id:03d}")
+    result = TrialResult(trial_id, overrides, rung, max_steps)
+    start = time.perf_counter()
+
+    try:
+        data_loader = DatasetLoader(config.data, logger)
+        train_raw = data_loader.load_train_data()
+        eval_raw = data_loader.load_eval_data()
+
+        model, tokenizer = ModelSetup(config.model, config.lora, logger, config.training.low_memory).setup()
+        preprocessor = DataPreprocessor(tokenizer, config.data.max_length, config.data.dynamic_padding)
+        train_tokenized = cached_process_dataset(
+            preprocessor, train_raw, config.data.train_path, config.data.cache_dir, logger
+        )
+
+        if eval_raw is not None:
+            eval_tokenized = cached_process_dataset(
+                preprocessor, eval_raw, config.data.eval_path, config.data.cache_dir, logger
+            )
+        else:
+            # Kein eval_path: jedes n-te Trainingsbeispiel zurückhalten
+            holdout = _holdout_indices(len(train_raw), holdout_every)
+            holdout_set = set(holdout)
+            keep = [i for i in range(len(train_raw)) if i not in holdout_set]
+            eval_raw = train_raw.select(holdout)
+            eval_tokenized = train_tokenized.select(holdout)
+            train_tokenized = train_tokenized.select(keep)
+
+        # Eval nicht an train() übergeben (EarlyStopping braucht load_best_model_at_end)
+        trainer = ModelTrainer(config.training, logger).train(model, tokenizer, train_tokenized)
+        result.eval_loss = trainer.evaluate(eval_dataset=eval_tokenized)["eval_loss"]
+
+        # Strict-Mode-Validität mit dem frisch trainierten Adapter
+        model.config.use_cache = True
+        inference.set_model(trainer.model, tokenizer)
+        questions = eval_raw["instruction"][:validity_samples]
+        answers, _ = inference.model_answers_batch(questions, batch_size=4)
+        result.validity_rate = sum(inference.is_valid_answer(answer) for answer in answers) / max(1, len(answers))
+    except Exception as e:
+        logger.error(f"❌ Trial {trial_id} fehlgeschlagen: {e}", exc_info=True)
+        result.error = str(e)
+
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def successive_halving(
+    trials: List[Dict[str, Any]],
+    sweep_dir: Path,
+    parallel: int,
+    threads_per_trial: int,
+    min_steps: int,
+    eta: int,
+    rungs: int,
+    holdout_every: int,
+    validity_samples: int,
+    logger: logging.Logger
+) -> List[TrialResult]:
+    """Führt alle Runden aus und liefert die Rangliste der letzten Runde"""
+    survivors = list(enumerate(trials))
+    results_path = sweep_dir / "results.jsonl"
+    ranked: List[TrialResult] = []
+
+    # spawn + ein Trial pro Worker-Prozess: Speicher wird nach jedem Trial freigegeben
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=parallel, mp_context=context, max_tasks_per_child=1) as pool:
+        for rung in range(rungs):
+            max_steps = min_steps * eta ** rung
+            logger.info(f"🏁 Runde {rung + 1}/{rungs}: {len(survivors)} Trial(s) bis Schritt {max_steps}")
+
+            futures = [
+                pool.submit(run_trial, trial_id, overrides, sweep_dir, rung, max_steps, min_steps,
+                            threads_per_trial, holdout_every, validity_samples)
+                for trial_id, overrides in survivors
+            ]
+            results = [future.result() for future in futures]
+
+            with open(results_path, "a", encoding="utf-8") as f:
+                for result in results:
+                    f.write(json.dumps(asdict(result)) + "\n")
+
+            ranked = sorted(results, key=lambda r: r.sort_key)
+            for position, result in enumerate(ranked, 1):
+                status = f"Fehler: {result.error}" if result.error else (
+                    f"Validität {result.validity_rate:.0%}, Eval-Loss {result.eval_loss:.4f}"
+                )
+                logger.info(f"  {position:>2}. trial-{result.trial_id:03d} {status} ({result.seconds:.0f}s)")
+
+            if rung < rungs - 1:
+                keep = max(1, len(ranked) // eta)
+                survivors = [(result.trial_id, result.overrides) for result in ranked[:keep] if result.error is None]
+                if not survivors:
+                    logger.error("❌ Alle Trials fehlgeschlagen – Sweep abgebrochen")
+                    break
+    return ranked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paralleler Hyperparameter-Sweep (Successive Halving)")
+    parser.add_argument("--search", choices=["grid", "random"], default="random")
+    parser.add_argument("--space", type=Path, default=None,
+                        help="JSON-Datei mit Suchraum {\"lora.r\": [8, 16], ...} (Standard: DEFAULT_SEARCH_SPACE)")
+    parser.add_argument("--trials", type=int, default=9, help="Anzahl Trials bei --search random")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--parallel", type=int, default=2, help="Gleichzeitige Trial-Prozesse")
+    parser.add_argument("--threads-per-trial", type=int, default=None, help="Standard: CPUs / parallel")
+    parser.add_argument("--min-steps", type=int, default=20, help="Schritte in der ersten Runde")
+    parser.add_argument("--eta", type=int, default=3, help="Pro Runde überlebt 1/eta, Budget ×eta")
+    parser.add_argument("--rungs", type=int, default=3)
+    parser.add_argument("--holdout-every", type=int, default=10, help="Ohne eval_path: jedes n-te Beispiel als Holdout")
+    parser.add_argument("--validity-samples", type=int, default=8, help="Holdout-Fragen für die Validitätsrate")
+    parser.add_argument("--output", type=Path, default=Path("outputs/sweep"))
+    args = parser.parse_args()
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    logger = setup_logging(args.output, "sweep")
+    space = json.loads(args.space.read_text(encoding="utf-8")) if args.space else DEFAULT_SEARCH_SPACE
+    trials = grid_trials(space) if args.search == "grid" else random_trials(space, args.trials, args.seed)
+    threads = args.threads_per_trial or max(1, (os.cpu_count() or 1) // args.parallel)
+    logger.info(f"🔍 Sweep: {len(trials)} Trial(s), {args.parallel} parallel × {threads} Threads")
+
+    prepare_shared_dataset(Config(), logger)
+    ranked = successive_halving(
+        trials, args.output, args.parallel, threads, args.min_steps, args.eta, args.rungs,
+        args.holdout_every, args.validity_samples, logger
+    )
+
+    leaderboard = [asdict(result) for result in ranked]
+    (args.output / "leaderboard.json").write_text(json.dumps(leaderboard, indent=2), encoding="utf-8")
+    if ranked and ranked[0].error is None:
+        best = ranked[0]
+        logger.info(f"🏆 Bester Trial: trial-{best.trial_id:03d} {best.overrides}")
+
+
+if __name__ == "__main__":
+    main()
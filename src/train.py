@@ -2,12 +2,17 @@
 Hauptskript - orchestriert alle Module für H5P-Generator Training
 """
 
+import logging
+import os
+
 from src.config import Config
 from src.utils import setup_logging, save_config
 from src.data_loader import DatasetLoader
 from src.model_setup import ModelSetup
 from src.preprocessing import DataPreprocessor
+from src.dataset_cache import cached_process_dataset
 from src.trainer import ModelTrainer
+from src.distributed import is_distributed_child, is_main_process, launch, main_process_first, setup_rank
 
 
 def main():
@@ -16,57 +21,107 @@ def main():
 
     # 2. Logging setup
     logger = setup_logging(config.training.output_dir)
+
+    # Verteiltes Training: Elternprozess startet die Ranks und beendet sich danach
+    # (bei nur einem Rank wird direkt hier trainiert)
+    if config.training.distributed and not is_distributed_child():
+        exit_code = launch("src.train", config.training.num_ranks, logger)
+        if exit_code is not None:
+            if exit_code != 0:
+                raise SystemExit(exit_code)
+            return
+    if is_distributed_child():
+        setup_rank(config.training.threads_per_rank, logger)
+        if not is_main_process():
+            # Nur Rank 0 loggt ausführlich
+            logger.setLevel(logging.WARNING)
+
     logger.info("=" * 60)
     logger.info("🎓 H5P-Generator Training")
     logger.info("=" * 60)
     logger.info(f"Modell: {config.model.base_model}")
     logger.info(f"Dataset: {config.data.train_path}")
     logger.info(f"Output: {config.training.output_dir}")
-    logger.info(f"Max Length: {config.data.max_length}")
+    # Low-Memory-Profil erlaubt längere Sequenzen
+    max_length = config.data.max_length_low_memory if config.training.low_memory else config.data.max_length
+    logger.info(f"Max Length: {max_length}")
+    logger.info(f"Low-Memory-Profil: {config.training.low_memory}")
+    logger.info(f"Dynamisches Padding: {config.data.dynamic_padding}")
+    logger.info(f"Packing: {config.data.packing}")
     logger.info(f"Batch Size: {config.training.batch_size}")
     logger.info(f"Gradient Accumulation: {config.training.gradient_accumulation_steps}")
-    logger.info(f"Effektive Batch Size: {config.training.batch_size * config.training.gradient_accumulation_steps}")
+    world_size = int(os.environ.get("WORLD_SIZE", "1"))
+    logger.info(f"Effektive Batch Size: {config.training.batch_size * config.training.gradient_accumulation_steps * world_size}")
+    if world_size > 1:
+        logger.info(f"Ranks (gloo): {world_size}")
     logger.info(f"Epochen: {config.training.num_epochs}")
     logger.info(f"Learning Rate: {config.training.learning_rate}")
     logger.info("=" * 60)
 
     try:
         # 3. Config speichern
-        save_config(config, config.training.output_dir)
-        logger.info("✓ Konfiguration gespeichert")
+        if is_main_process():
+            save_config(config, config.training.output_dir)
+            logger.info("✓ Konfiguration gespeichert")
 
         # 4. Daten laden
         data_loader = DatasetLoader(config.data, logger)
-        train_dataset = data_loader.load_train_data()
+        if config.data.streaming:
+            train_dataset = data_loader.load_train_stream()
+        else:
+            train_dataset = data_loader.load_train_data()
         eval_dataset = data_loader.load_eval_data()
 
         # 5. Modell setup
-        model_setup = ModelSetup(config.model, config.lora, logger)
+        model_setup = ModelSetup(config.model, config.lora, logger, config.training.low_memory)
         model, tokenizer = model_setup.setup()
 
         # 6. Daten preprocessen
-        preprocessor = DataPreprocessor(tokenizer, config.data.max_length)
+        preprocessor = DataPreprocessor(
+            tokenizer,
+            max_length,
+            config.data.dynamic_padding,
+            config.data.packing
+        )
 
-        logger.info("🧹 Tokenisiere Trainingsdaten...")
-        train_tokenized = preprocessor.process_dataset(train_dataset)
-        logger.info(f"✓ Training tokenisiert: {len(train_tokenized)} Beispiele")
+        if config.data.streaming:
+            logger.info("🧹 Tokenisierung on-the-fly (Streaming)")
+            train_tokenized = preprocessor.process_stream(train_dataset)
+        else:
+            logger.info("🧹 Tokenisiere Trainingsdaten...")
+            with main_process_first():
+                train_tokenized = cached_process_dataset(
+                    preprocessor, train_dataset, config.data.train_path,
+                    config.data.cache_dir, logger, config.data.num_proc
+                )
+            logger.info(f"✓ Training tokenisiert: {len(train_tokenized)} Beispiele")
+        if preprocessor.packing_efficiency is not None:
+            logger.info(f"📦 Packing-Effizienz: {preprocessor.packing_efficiency:.1%} echte Tokens pro Block")
 
         eval_tokenized = None
         if eval_dataset:
             logger.info("🧹 Tokenisiere Evaluationsdaten...")
-            eval_tokenized = preprocessor.process_dataset(eval_dataset)
+            with main_process_first():
+                eval_tokenized = cached_process_dataset(
+                    preprocessor, eval_dataset, config.data.eval_path,
+                    config.data.cache_dir, logger, config.data.num_proc
+                )
             logger.info(f"✓ Evaluation tokenisiert: {len(eval_tokenized)} Beispiele")
 
         # 7. Training
-        trainer_instance = ModelTrainer(config.training, logger)
-        trainer_instance.train(model, tokenizer, train_tokenized, eval_tokenized)
+        trainer_instance = ModelTrainer(config.training, logger, config.profiling)
+        trainer_instance.train(model, tokenizer, train_tokenized, eval_tokenized, max_length=max_length)
 
         # 8. Zusammenfassung
         logger.info("=" * 60)
         logger.info("🎉 Training erfolgreich abgeschlossen!")
         logger.info("=" * 60)
         logger.info(f"📁 Modell: {config.training.output_dir.resolve()}")
-        logger.info(f"📊 Trainingsdaten: {len(train_dataset)} Beispiele")
+        if config.data.streaming:
+            validator = data_loader.stream_validator
+            logger.info(f"📊 Trainingsdaten: {validator.seen} gestreamt, {validator.dropped} verworfen")
+        else:
+            logger.info(f"📊 Trainingsdaten: {len(train_dataset)} Beispiele")
         logger.info(f"🔧 LoRA Rank: {config.lora.r}")
         logger.info(f"📈 Epochen: {config.training.num_epochs}")
         logger.info("=" * 60)
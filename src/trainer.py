@@ -1,25 +1,37 @@
- from transformers import (
+from transformers import (
     Trainer,
     TrainingArguments,
     DataCollatorForLanguageModeling,
     EarlyStoppingCallback
 )
+from datasets import IterableDataset
+import torch
 from pathlib import Path
 import json
 import logging
+import os
+from typing import Optional
 
-from src.config import TrainingConfig
+from src.config import ProfilingConfig, TrainingConfig
+from src.preprocessing import DynamicPaddingCollator, PackedSequenceCollator
+from src.distributed import all_reduce_sum, is_main_process, record_scaling
+from src.checkpointing import AsyncCheckpointCallback, find_latest_checkpoint
+from src.training_metrics import METRICS_FILENAME, TrainingMetricsCallback, record_profile_summary
 
 
 class ModelTrainer:
     """Kapselt die komplette Training-Logik"""
 
-    def __init__(self, config: TrainingConfig, logger: logging.Logger):
+    def __init__(self, config: TrainingConfig, logger: logging.Logger, profiling: Optional[ProfilingConfig] = None):
         self.config = config
         self.logger = logger
+        self.profiling = profiling
 
-    def create_training_args(self, has_eval: bool):
+    def create_training_args(self, has_eval: bool, group_by_length: bool = False):
         """Erstellt TrainingArguments (vereinfachte Version, ohne Evaluation-Strategie)"""
+        # Von torchrun gestartet → DDP über gloo (CPU)
+        distributed = int(os.environ.get("WORLD_SIZE", "1")) > 1
+
         return TrainingArguments(
             output_dir=str(self.config.output_dir),
 
@@ -29,6 +41,7 @@ class ModelTrainer:
 
             # Training
             num_train_epochs=self.config.num_epochs,
+            max_steps=self.config.max_steps,
             learning_rate=self.config.learning_rate,
             weight_decay=0.01,
             max_grad_norm=self.config.max_grad_norm,
@@ -41,17 +54,24 @@ class ModelTrainer:
             # Logging & Saving
             logging_steps=self.config.logging_steps,
             logging_dir=str(self.config.output_dir / "logs"),
-            save_strategy="steps",
+            # Asynchrone Checkpoints übernimmt AsyncCheckpointCallback
+            save_strategy="no" if self.config.async_checkpointing else "steps",
             save_steps=self.config.save_steps,
             save_total_limit=self.config.save_total_limit,
 
             # Hardware
             fp16=self.config.use_fp16,
-            bf16=False,
+            bf16=self.config.low_memory,  # bf16-Autocast auf der CPU
             no_cuda=True,
+            ddp_backend="gloo" if distributed else None,
+            # Alle LoRA-Parameter sind an jedem Forward beteiligt → keine Suche nach ungenutzten
+            ddp_find_unused_parameters=False if distributed else None,
 
             # Optimierungen
-            gradient_checkpointing=False,
+            gradient_checkpointing=self.config.low_memory,
+            gradient_checkpointing_kwargs={"use_reentrant": False} if self.config.low_memory else None,
+            group_by_length=group_by_length,  # Ähnlich lange Beispiele im selben Batch
+            length_column_name="length",
 
             # Sonstiges
             report_to="none",
@@ -59,20 +79,50 @@ class ModelTrainer:
             dataloader_num_workers=0,
         )
 
-    def train(self, model, tokenizer, train_dataset, eval_dataset=None):
-        """Führt Training durch"""
+    def train(self, model, tokenizer, train_dataset, eval_dataset=None, max_length: Optional[int] = None):
+        """Führt Training durch (max_length: konfigurierte Sequenzlänge, für Streaming-Statistiken)"""
         self.logger.info("🚀 Starte Training")
 
-        # Setup
-        training_args = self.create_training_args(has_eval=eval_dataset is not None)
+        streaming = isinstance(train_dataset, IterableDataset)
+        if streaming and self.config.max_steps <= 0:
+            raise ValueError("Streaming-Training benötigt TrainingConfig.max_steps > 0")
 
-        # Data Collator (wichtig: setzt PAD in Labels auf -100)
-        data_collator = DataCollatorForLanguageModeling(
-            tokenizer=tokenizer,
-            mlm=False  # Causal LM, nicht Masked LM
+        # Dynamisches Padding: Preprocessor hat ungepaddet tokenisiert und Längen gespeichert
+        column_names = train_dataset.column_names or []
+        dynamic_padding = streaming or "length" in column_names
+        # Packing: Blöcke mit Dokumentgrenzen (seq_lens)
+        packed = "seq_lens" in column_names
+
+        # Setup
+        training_args = self.create_training_args(
+            has_eval=eval_dataset is not None,
+            # Längen-Gruppierung braucht wahlfreien Zugriff → nicht im Streaming-Modus
+            group_by_length=dynamic_padding and not streaming
         )
 
-        callbacks = []
+        if packed:
+            block_length = max(len(ids) for ids in train_dataset["input_ids"])
+            data_collator = PackedSequenceCollator(
+                tokenizer, block_length, torch.bfloat16 if self.config.low_memory else torch.float32
+            )
+        elif dynamic_padding:
+            data_collator = DynamicPaddingCollator(tokenizer)
+        else:
+            # Data Collator (wichtig: setzt PAD in Labels auf -100)
+            data_collator = DataCollatorForLanguageModeling(
+                tokenizer=tokenizer,
+                mlm=False  # Causal LM, nicht Masked LM
+            )
+
+        # Durchsatz/Schrittzeiten/RSS pro Logging-Schritt → training_metrics.jsonl
+        callbacks = [TrainingMetricsCallback(self.config.output_dir / METRICS_FILENAME, self.memory_profile)]
+        if self.profiling is not None and self.profiling.enabled:
+            from src.profiling import ProfilerCallback
+            callbacks.append(ProfilerCallback(self.profiling, self.logger))
+        if self.config.async_checkpointing:
+            callbacks.append(AsyncCheckpointCallback(
+                self.config.output_dir, self.config.save_steps, self.config.save_total_limit, self.logger
+            ))
         if eval_dataset:
             callbacks.append(EarlyStoppingCallback(early_stopping_patience=3))
 
@@ -88,25 +138,79 @@ class ModelTrainer:
         )
 
         # Training starten
+        checkpoint = find_latest_checkpoint(self.config.output_dir) if self.config.resume else None
+        if checkpoint is not None:
+            self.logger.info(f"↩️ Setze Training fort ab {checkpoint.name}")
+
         try:
-            trainer.train()
+            train_result = trainer.train(resume_from_checkpoint=str(checkpoint) if checkpoint else None)
             self.logger.info("✓ Training erfolgreich abgeschlossen")
         except Exception as e:
             self.logger.error(f"❌ Training-Fehler: {e}", exc_info=True)
             raise
 
-        # Speichern
+        self._log_token_throughput(train_result, train_dataset, data_collator)
+
+        # Speichern (save_model schreibt intern nur auf Rank 0)
         self.logger.info("💾 Speichere Modell")
         self.config.output_dir.mkdir(parents=True, exist_ok=True)
         trainer.save_model(str(self.config.output_dir))
-        tokenizer.save_pretrained(str(self.config.output_dir))
 
-        # Stats
-        self._save_training_stats(trainer)
+        if trainer.is_world_process_zero():
+            tokenizer.save_pretrained(str(self.config.output_dir))
+
+            # Stats
+            self._save_training_stats(trainer)
+            if trainer.state.global_step > 0:
+                record_profile_summary(
+                    self.config.output_dir,
+                    self.memory_profile,
+                    train_result.metrics.get("train_runtime", 0.0) / trainer.state.global_step,
+                    self._max_length(train_dataset, max_length),
+                    self.logger
+                )
+            samples_per_second = train_result.metrics.get("train_samples_per_second")
+            if samples_per_second:
+                record_scaling(self.config.output_dir, training_args.world_size, samples_per_second, self.logger)
 
         self.logger.info(f"🎉 Training fertig! → {self.config.output_dir}")
         return trainer
 
+    def _log_token_throughput(self, train_result, train_dataset, data_collator):
+        """Loggt echte Tokens/s und den Padding-Anteil (vergleichbar zwischen beiden Padding-Modi)"""
+        runtime = train_result.metrics.get("train_runtime", 0.0)
+        if runtime <= 0:
+            return
+
+        if isinstance(data_collator, DynamicPaddingCollator):
+            # Zähler sind pro Rank → über alle Ranks summieren
+            real_tokens, processed_tokens = all_reduce_sum(
+                [data_collator.real_tokens, data_collator.padded_tokens]
+            )
+        else:
+            epochs = train_result.metrics.get("epoch", self.config.num_epochs)
+            real_tokens = int(sum(sum(mask) for mask in train_dataset["attention_mask"]) * epochs)
+            processed_tokens = int(len(train_dataset) * len(train_dataset[0]["input_ids"]) * epochs)
+
+        pad_ratio = 1 - real_tokens / processed_tokens if processed_tokens else 0.0
+        if not is_main_process():
+            return
+        self.logger.info(
+            f"⚡ Durchsatz: {real_tokens / runtime:.1f} echte Tokens/s, "
+            f"{processed_tokens / runtime:.1f} verarbeitete Tokens/s, Padding-Anteil {pad_ratio:.1%}"
+        )
+
+    @property
+    def memory_profile(self) -> str:
+        return "low_memory" if self.config.low_memory else "default"
+
+    @staticmethod
+    def _max_length(train_dataset, configured: Optional[int]) -> Optional[int]:
+        """Längste Sequenz (Streaming: konfigurierte max_length, der Stream wird nicht erneut geöffnet)"""
+        if isinstance(train_dataset, IterableDataset):
+            return configured
+        return max(len(ids) for ids in train_dataset["input_ids"])
+
     def _save_training_stats(self, trainer):
         """Speichert Training-Statistiken"""
         stats_path = self.config.output_dir / "training_stats.json"
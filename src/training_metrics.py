@@ -0,0 +1,192 @@
+"""
+Durchsatz- und Speicher-Instrumentierung fürs Training.
+
+TrainingMetricsCallback misst pro Logging-Intervall echte/verarbeitete Tokens/s,
+die Aufteilung der Schrittzeit (Daten/Forward/Backward/Optimizer), den
+Spitzen-RSS und den Padding-Anteil und hängt je Intervall eine Zeile an
+training_metrics.jsonl (neben training_stats.json) an. Gezeichnet wird mit
+src/plotting.py.
+"""
+
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import psutil
+from transformers import TrainerCallback
+
+METRICS_FILENAME = "training_metrics.jsonl"
+PROFILES_FILENAME = "memory_profiles.json"
+
+
+def peak_rss_bytes() -> int:
+    """Spitzen-RSS des aktuellen Prozesses (Linux/macOS: ru_maxrss, Windows: peak_wset)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux meldet KiB, macOS Bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+
+
+class TrainingMetricsCallback(TrainerCallback):
+    """Schreibt pro Logging-Schritt eine Zeile Durchsatz-/Speichermetriken (nur Rank 0)"""
+
+    def __init__(self, output_path: Path, profile: str = "default"):
+        self.output_path = Path(output_path)
+        self.profile = profile
+        self.run_id = datetime.now().isoformat(timespec="seconds")
+        self._hooks = []
+        self._reset_interval()
+
+    def _reset_interval(self):
+        now = time.perf_counter()
+        self._interval_start = now
+        self._last_mark = now
+        self._forward_start = None
+        self._forward_end = None
+        self._optimizer_start = None
+        self.steps = 0
+        self.real_tokens = 0
+        self.processed_tokens = 0
+        self.times = {"data": 0.0, "forward": 0.0, "backward": 0.0, "optimizer": 0.0}
+
+    # --- Forward-Hooks am Modell ---
+
+    def _on_forward_start(self, module, args, kwargs):
+        if not module.training:
+            return
+        now = time.perf_counter()
+        # Zeit seit dem letzten Schritt-/Teilschritt-Ende: DataLoader + Collator
+        self.times["data"] += now - self._last_mark
+        self._forward_start = now
+
+        input_ids = kwargs.get("input_ids", args[0] if args else None)
+        if input_ids is None:
+            return
+        self.processed_tokens += input_ids.numel()
+        attention_mask = kwargs.get("attention_mask")
+        labels = kwargs.get("labels")
+        if attention_mask is not None and attention_mask.dim() == 2:
+            self.real_tokens += int(attention_mask.sum())
+        elif labels is not None:
+            # Gepackte Blöcke (4D-Maske): echte Tokens über die Labels zählen
+            self.real_tokens += int((labels != -100).sum())
+        else:
+            self.real_tokens += input_ids.numel()
+
+    def _on_forward_end(self, module, args, kwargs, output):
+        if not module.training or self._forward_start is None:
+            return
+        now = time.perf_counter()
+        self.times["forward"] += now - self._forward_start
+        self._forward_start = None
+        self._forward_end = now
+
+    def _end_backward(self) -> float:
+        now = time.perf_counter()
+        if self._forward_end is not None:
+            self.times["backward"] += now - self._forward_end
+            self._forward_end = None
+        return now
+
+    # --- Trainer-Callbacks ---
+
+    def on_train_begin(self, args, state, control, model=None, **kwargs):
+        if model is not None:
+            self._hooks = [
+                model.register_forward_pre_hook(self._on_forward_start, with_kwargs=True),
+                model.register_forward_hook(self._on_forward_end, with_kwargs=True),
+            ]
+        self._reset_interval()
+
+    def on_substep_end(self, args, state, control, **kwargs):
+        # Gradient Accumulation: Backward eines Micro-Batches ohne Optimizer-Schritt
+        self._last_mark = self._end_backward()
+
+    def on_pre_optimizer_step(self, args, state, control, **kwargs):
+        # Letzter Micro-Batch: Backward inkl. Gradient-Clipping
+        self._optimizer_start = self._end_backward()
+
+    def on_optimizer_step(self, args, state, control, **kwargs):
+        if self._optimizer_start is not None:
+            self.times["optimizer"] += time.perf_counter() - self._optimizer_start
+            self._optimizer_start = None
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self.steps += 1
+        self._last_mark = time.perf_counter()
+
+    def on_evaluate(self, args, state, control, **kwargs):
+        # Evaluationszeit nicht als Datenladezeit des nächsten Schritts zählen
+        self._last_mark = time.perf_counter()
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if self.steps == 0:
+            return
+        elapsed = time.perf_counter() - self._interval_start
+        if state.is_world_process_zero:
+            record = {
+                "run": self.run_id,
+                "profile": self.profile,
+                "step": state.global_step,
+                "epoch": state.epoch,
+                "world_size": args.world_size,
+                "interval_seconds": elapsed,
+                # Tokens dieses Ranks; bei world_size > 1 ist der Gesamtdurchsatz ≈ × world_size
+                "tokens_per_second": self.real_tokens / elapsed,
+                "processed_tokens_per_second": self.processed_tokens / elapsed,
+                "pad_ratio": 1 - self.real_tokens / self.processed_tokens if self.processed_tokens else 0.0,
+                "peak_rss_mb": peak_rss_bytes() / 1024 ** 2,
+                # Mittlere Zeit pro Optimizer-Schritt, aufgeteilt nach Phase
+                **{f"{phase}_seconds": total / self.steps for phase, total in self.times.items()},
+            }
+            self.output_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.output_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        self._reset_interval()
+
+    def on_train_end(self, args, state, control, **kwargs):
+        for hook in self._hooks:
+            hook.remove()
+        self._hooks = []
+
+
+def record_profile_summary(
+    output_dir: Path,
+    profile: str,
+    seconds_per_step: float,
+    max_length: int,
+    logger: logging.Logger
+):
+    """
+    Speichert Spitzen-RSS und Zeit pro Optimizer-Schritt des Laufs unter dem
+    Profilnamen in memory_profiles.json und vergleicht mit den übrigen Profilen.
+    """
+    path = Path(output_dir) / PROFILES_FILENAME
+    profiles = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    current = {
+        "peak_rss_mb": peak_rss_bytes() / 1024 ** 2,
+        "seconds_per_step": seconds_per_step,
+        "max_length": max_length,
+    }
+    profiles[profile] = current
+    path.write_text(json.dumps(profiles, indent=2), encoding="utf-8")
+
+    logger.info(
+        f"🧮 Profil '{profile}': Spitzen-RSS {current['peak_rss_mb']:.0f} MB, "
+        f"{seconds_per_step:.2f}s/Schritt (max_length {max_length})"
+    )
+    for name, other in profiles.items():
+        if name == profile:
+            continue
+        logger.info(
+            f"   vs. '{name}': RSS {current['peak_rss_mb'] / other['peak_rss_mb']:.2f}×, "
+            f"Schrittzeit {seconds_per_step / other['seconds_per_step']:.2f}× "
+            f"(max_length {other['max_length']})"
+        )
@@ -0,0 +1,408 @@
+"""
+Registry von Content-Type-Validatoren, Schlüssel = mainLibrary aus h5p.json
+(wie von inference.save_h5p geschrieben, z.B. "H5P.MultiChoice").
+
+Jeder Regelsatz wird deklarativ beschrieben und beim Registrieren einmal in
+verschachtelte Closures übersetzt (Meldungstexte vorformatiert, keine
+Schema-Interpretation pro Datensatz). Ein Aufruf liefert ALLE Verstöße.
+
+Dispatch: validate(data, main_library) ist ein Dict-Lookup; ohne
+mainLibrary (z.B. JSONL-Trainingspaare) wird der Typ an den Pflichtfeldern
+erkannt.
+
+Micro-Benchmark (Datensätze/s pro Typ):
+    python -m src.validator_registry --records 20000
+"""
+
+import argparse
+import json
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Checker: (Wert, Wurzelobjekt, Nummer des Listenelements, Fehlerliste) → None
+Checker = Callable[[Any, Any, int, List[str]], None]
+# Zusatzregel auf einem Feld: (Wert, Wurzelobjekt) → Meldung oder None
+FieldCheck = Callable[[Any, Any], Optional[str]]
+
+
+# --------------------------------------
+# Regel-Beschreibung
+# --------------------------------------
+# Meldungen dürfen {n} (1-basierte Position im umgebenden Array) und bei
+# fehlenden Feldern {field} enthalten.
+
+def obj(
+    type_error: str,
+    fields: Tuple = (),
+    required: Tuple[str, ...] = (),
+    missing: str = "",
+    checks: Tuple = (),
+    required_first: bool = True
+):
+    """required_first=False: fehlende Pflichtfelder in Feldreihenfolge statt vorab melden"""
+    return ("object", type_error, fields, required, missing, checks, required_first)
+
+
+def arr(type_error: str, items=None, min_items: int = 0, min_error: str = "", checks: Tuple = ()):
+    return ("array", type_error, items, min_items, min_error, checks)
+
+
+def string(type_error: str, non_empty: bool = True, pattern: Optional[str] = None, pattern_error: str = ""):
+    return ("string", type_error, non_empty, pattern, pattern_error)
+
+
+def boolean(type_error: str, checks: Tuple = ()):
+    return ("bool", type_error, checks)
+
+
+def enum(type_error: str, values: Tuple):
+    return ("enum", type_error, values)
+
+
+# --------------------------------------
+# Übersetzung in Closures
+# --------------------------------------
+
+def _message(template: str) -> Callable[[int], str]:
+    """Vorformatierte Meldung; {n} wird erst beim Verstoß eingesetzt"""
+    if "{n}" not in template:
+        return lambda n: template
+    return lambda n: template.replace("{n}", str(n))
+
+
+def _run_checks(checks, value, root, errors: List[str]):
+    for check in checks:
+        message = check(value, root)
+        if message:
+            errors.append(message)
+
+
+def compile_rules(spec) -> Checker:
+    kind = spec[0]
+
+    if kind == "object":
+        _, type_error, fields, required, missing, checks, required_first = spec
+        type_message = _message(type_error)
+        missing_messages = [(name, _message(missing.replace("{field}", name))) for name in required]
+        compiled_fields = [(name, compile_rules(field_spec)) for name, field_spec in fields]
+
+        if required_first:
+            def check_object(value, root, n, errors):
+                if not isinstance(value, dict):
+                    errors.append(type_message(n))
+                    return
+                for name, message in missing_messages:
+                    if name not in value:
+                        errors.append(message(n))
+                for name, checker in compiled_fields:
+                    if name in value:
+                        checker(value[name], root, n, errors)
+                _run_checks(checks, value, root, errors)
+            return check_object
+
+        # Pro Feld: erst "fehlt", sonst Feldregel
+        missing_by_name = dict(missing_messages)
+        ordered = [(name, missing_by_name.get(name), checker) for name, checker in compiled_fields]
+        ordered += [(name, message, None) for name, message in missing_messages if name not in dict(fields)]
+
+        def check_object_ordered(value, root, n, errors):
+            if not isinstance(value, dict):
+                errors.append(type_message(n))
+                return
+            for name, message, checker in ordered:
+                if name in value:
+                    if checker is not None:
+                        checker(value[name], root, n, errors)
+                elif message is not None:
+                    errors.append(message(n))
+            _run_checks(checks, value, root, errors)
+        return check_object_ordered
+
+    if kind == "array":
+        _, type_error, items, min_items, min_error, checks = spec
+        type_message = _message(type_error)
+        min_message = _message(min_error)
+        item_checker = compile_rules(items) if items is not None else None
+
+        def check_array(value, root, n, errors):
+            if not isinstance(value, list):
+                errors.append(type_message(n))
+                return
+            if len(value) < min_items:
+                errors.append(min_message(n))
+            if item_checker is not None:
+                for i, item in enumerate(value, 1):
+                    item_checker(item, root, i, errors)
+            _run_checks(checks, value, root, errors)
+        return check_array
+
+    if kind == "string":
+        _, type_error, non_empty, pattern, pattern_error = spec
+        type_message = _message(type_error)
+        search = re.compile(pattern).search if pattern else None
+        pattern_message = _message(pattern_error)
+
+        def check_string(value, root, n, errors):
+            if not isinstance(value, str) or (non_empty and not value.strip()):
+                errors.append(type_message(n))
+            elif search is not None and not search(value):
+                errors.append(pattern_message(n))
+        return check_string
+
+    if kind == "bool":
+        _, type_error, checks = spec
+        type_message = _message(type_error)
+
+        def check_bool(value, root, n, errors):
+            if not isinstance(value, bool):
+                errors.append(type_message(n))
+                return
+            _run_checks(checks, value, root, errors)
+        return check_bool
+
+    if kind == "enum":
+        _, type_error, values = spec
+        type_message = _message(type_error)
+        allowed = frozenset(values)
+
+        def check_enum(value, root, n, errors):
+            if not isinstance(value, str) or value not in allowed:
+                errors.append(type_message(n))
+        return check_enum
+
+    raise ValueError(f"Unbekannter Regeltyp: {kind}")
+
+
+# --------------------------------------
+# Registry
+# --------------------------------------
+
+class ContentTypeValidator:
+    """Kompilierter Regelsatz eines Content-Typs"""
+
+    def __init__(self, main_library: str, spec, signature: Tuple[str, ...], sample: Dict):
+        self.main_library = main_library
+        self.signature = signature  # Pflichtfelder zur Typ-Erkennung ohne mainLibrary
+        self.sample = sample  # gültiges Beispiel (Benchmark)
+        self._check = compile_rules(spec)
+
+    def violations(self, data) -> List[str]:
+        errors: List[str] = []
+        self._check(data, data, 0, errors)
+        return errors
+
+
+_REGISTRY: Dict[str, ContentTypeValidator] = {}
+
+
+def register(main_library: str, spec, signature: Tuple[str, ...], sample: Dict) -> ContentTypeValidator:
+    validator = ContentTypeValidator(main_library, spec, signature, sample)
+    _REGISTRY[main_library] = validator
+    return validator
+
+
+def get_validator(main_library: str) -> ContentTypeValidator:
+    return _REGISTRY[main_library]
+
+
+def registered_types() -> List[str]:
+    return list(_REGISTRY)
+
+
+def detect_type(data) -> Optional[str]:
+    """Erkennt den Content-Typ an den Pflichtfeldern (erster passender Eintrag)"""
+    if isinstance(data, dict):
+        for main_library, validator in _REGISTRY.items():
+            if all(name in data for name in validator.signature):
+                return main_library
+    return None
+
+
+def validate(data, main_library: Optional[str] = None, default: str = "H5P.MultiChoice") -> List[str]:
+    """Alle Verstöße; mainLibrary explizit, sonst erkannt, sonst default"""
+    main_library = main_library or detect_type(data) or default
+    validator = _REGISTRY.get(main_library)
+    if validator is None:
+        return [f"Unbekannter Content-Typ: {main_library}"]
+    return validator.violations(data)
+
+
+# --------------------------------------
+# Regelsätze
+# --------------------------------------
+
+def _count_correct(root) -> int:
+    answers = root.get("answers") if isinstance(root, dict) else None
+    if not isinstance(answers, list):
+        return 0
+    return sum(1 for answer in answers if isinstance(answer, dict) and answer.get("correct") is True)
+
+
+def _at_least_one_correct(answers, root) -> Optional[str]:
+    if _count_correct(root) == 0:
+        return "Mindestens eine Antwort muss als 'correct': true markiert sein"
+    return None
+
+
+def _single_answer_consistent(single_answer, root) -> Optional[str]:
+    # Wenn singleAnswer=true → nur 1 richtige Antwort erlaubt
+    correct_count = _count_correct(root)
+    if single_answer and correct_count != 1:
+        return f"Bei 'singleAnswer': true ist genau 1 richtige Antwort erlaubt, gefunden: {correct_count}"
+    return None
+
+
+# STRICT MODE wie H5PValidator.validate_multiple_choice (gleiche Meldungen, gleiche Reihenfolge)
+MULTICHOICE_RULES = obj(
+    "H5P muss ein JSON-Objekt sein",
+    required=("question", "answers"),
+    missing="Fehlendes Pflichtfeld: {field}",
+    fields=(
+        ("question", string("Feld 'question' muss ein nicht-leerer String sein")),
+        ("answers", arr(
+            "Feld 'answers' muss eine Liste sein",
+            min_items=2,
+            min_error="Mindestens 2 Antwortmöglichkeiten erforderlich",
+            items=obj(
+                "Antwort {n} muss ein Objekt sein",
+                required=("text", "correct"),
+                missing="Antwort {n}: Fehlendes Feld '{field}'",
+                required_first=False,
+                fields=(
+                    ("text", string("Antwort {n}: 'text' muss ein nicht-leerer String sein")),
+                    ("correct", boolean("Antwort {n}: 'correct' muss true oder false sein")),
+                ),
+            ),
+            checks=(_at_least_one_correct,),
+        )),
+        ("behaviour", obj(
+            "Feld 'behaviour' muss ein Objekt sein",
+            fields=(("singleAnswer", boolean(
+                "'singleAnswer' muss true oder false sein", checks=(_single_answer_consistent,)
+            )),),
+        )),
+        ("overallFeedback", arr("Feld 'overallFeedback' muss eine Liste sein")),
+    ),
+)
+
+TRUEFALSE_RULES = obj(
+    "H5P muss ein JSON-Objekt sein",
+    required=("question", "correct"),
+    missing="Fehlendes Pflichtfeld: {field}",
+    fields=(
+        ("question", string("Feld 'question' muss ein nicht-leerer String sein")),
+        # H5P.TrueFalse speichert die Lösung als String
+        ("correct", enum("Feld 'correct' muss \"true\" oder \"false\" sein", ("true", "false"))),
+        ("behaviour", obj(
+            "Feld 'behaviour' muss ein Objekt sein",
+            fields=(
+                ("enableRetry", boolean("'enableRetry' muss true oder false sein")),
+                ("enableSolutionsButton", boolean("'enableSolutionsButton' muss true oder false sein")),
+            ),
+        )),
+    ),
+)
+
+# Lücken werden in H5P.Blanks und H5P.DragText als *Antwort* markiert
+_BLANK_PATTERN = r"\*[^*\s][^*]*\*"
+
+BLANKS_RULES = obj(
+    "H5P muss ein JSON-Objekt sein",
+    required=("questions",),
+    missing="Fehlendes Pflichtfeld: {field}",
+    fields=(
+        ("text", string("Feld 'text' muss ein String sein", non_empty=False)),
+        ("questions", arr(
+            "Feld 'questions' muss eine Liste sein",
+            min_items=1,
+            min_error="Mindestens 1 Lückensatz erforderlich",
+            items=string(
+                "Satz {n} muss ein nicht-leerer String sein",
+                pattern=_BLANK_PATTERN,
+                pattern_error="Satz {n}: keine Lücke (*Antwort*) gefunden"
+            ),
+        )),
+        ("behaviour", obj(
+            "Feld 'behaviour' muss ein Objekt sein",
+            fields=(("caseSensitive", boolean("'caseSensitive' muss true oder false sein")),),
+        )),
+    ),
+)
+
+DRAGTEXT_RULES = obj(
+    "H5P muss ein JSON-Objekt sein",
+    required=("textField",),
+    missing="Fehlendes Pflichtfeld: {field}",
+    fields=(
+        ("taskDescription", string("Feld 'taskDescription' muss ein String sein", non_empty=False)),
+        ("textField", string(
+            "Feld 'textField' muss ein nicht-leerer String sein",
+            pattern=_BLANK_PATTERN,
+            pattern_error="Feld 'textField': kein Ziehfeld (*Wort*) gefunden"
+        )),
+        ("behaviour", obj(
+            "Feld 'behaviour' muss ein Objekt sein",
+            fields=(("enableRetry", boolean("'enableRetry' muss true oder false sein")),),
+        )),
+    ),
+)
+
+register(
+    "H5P.MultiChoice", MULTICHOICE_RULES, signature=("answers",),
+    sample={
+        "question": "Was ist ein VPN?",
+        "answers": [
+            {"text": "Ein Virus-Schutz", "correct": False},
+            {"text": "Ein verschlüsseltes Netzwerk", "correct": True},
+        ],
+        "behaviour": {"singleAnswer": True},
+        "overallFeedback": [{"from": 0, "to": 100}],
+    },
+)
+register(
+    "H5P.TrueFalse", TRUEFALSE_RULES, signature=("question", "correct"),
+    sample={"question": "<p>HTTPS verschlüsselt die Verbindung.</p>", "correct": "true",
+            "behaviour": {"enableRetry": True, "enableSolutionsButton": True}},
+)
+register(
+    "H5P.Blanks", BLANKS_RULES, signature=("questions",),
+    sample={"text": "<p>Fülle die Lücken.</p>",
+            "questions": ["<p>Ein *Passwort* sollte lang sein.</p>", "<p>*Phishing* ist Betrug.</p>"],
+            "behaviour": {"caseSensitive": False}},
+)
+register(
+    "H5P.DragText", DRAGTEXT_RULES, signature=("textField",),
+    sample={"taskDescription": "Ziehe die Wörter in die Lücken.",
+            "textField": "Eine *Firewall* filtert *Netzwerkverkehr*.",
+            "behaviour": {"enableRetry": True}},
+)
+
+
+# --------------------------------------
+# Micro-Benchmark
+# --------------------------------------
+
+def benchmark(records: int = 20000) -> Dict[str, float]:
+    """Datensätze/s pro Typ (Parsen + Prüfen), gültige und absichtlich fehlerhafte Beispiele gemischt"""
+    rates = {}
+    for main_library, validator in _REGISTRY.items():
+        broken = {key: None for key in validator.sample}
+        lines = [json.dumps(validator.sample), json.dumps(broken)]
+        start = time.perf_counter()
+        for i in range(records):
+            validate(json.loads(lines[i & 1]), main_library)
+        rates[main_library] = records / (time.perf_counter() - start)
+        print(f"⚡ {main_library:<18} {rates[main_library]:>12,.0f} Datensätze/s")
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-Benchmark der Content-Type-Validatoren")
+    parser.add_argument("--records", type=int, default=20000)
+    args = parser.parse_args()
+    benchmark(args.records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Multi-Prozess-Inferenz auf CPU: N Worker mit je eigener Modellkopie, festem
+Thread-Budget (torch.set_num_threads) und fest zugewiesenen CPU-Kernen.
+
+share_weights=True (nur Linux/fork): Das Modell wird einmal im Elternprozess
+geladen und per Copy-on-Write an die Worker vererbt, statt N Kopien zu laden.
+
+Benchmark der Aufteilung workers × threads:
+    python -m src.worker_pool --layouts 1x32,2x16,4x8,8x4 --num-questions 64
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import torch
+
+from src import inference
+
+_STOP = None
+
+
+def _available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _pin_worker(worker_id: int, threads: int):
+    """Setzt Thread-Budget und CPU-Affinität für diesen Prozess"""
+    torch.set_num_threads(threads)
+    cores = _available_cores()
+    if hasattr(os, "sched_setaffinity") and len(cores) >= threads:
+        start = (worker_id * threads) % len(cores)
+        assigned = [cores[(start + i) % len(cores)] for i in range(threads)]
+        os.sched_setaffinity(0, assigned)
+
+
+def _worker_main(worker_id: int, threads: int, model_path: Optional[str], constrained: bool, tasks, results):
+    _pin_worker(worker_id, threads)
+    if inference.model is None:
+        inference.load_model(model_path)
+
+    while True:
+        task = tasks.get()
+        if task is _STOP:
+            break
+        generation, chunk_id, questions = task
+        try:
+            answers, stats = inference.model_answers_batch(questions, batch_size=len(questions), constrained=constrained)
+            results.put((generation, chunk_id, answers, stats.generated_tokens, None))
+        except Exception as e:
+            results.put((generation, chunk_id, [""] * len(questions), 0, repr(e)))
+
+
+class InferenceWorkerPool:
+    """
+    Verteilt Fragen in Chunks auf Worker-Prozesse. Die Task-Queue ist begrenzt
+    (Back-Pressure), Ergebnisse werden in Originalreihenfolge zurückgegeben.
+    """
+
+    def __init__(
+        self,
+        num_workers: int = 4,
+        threads_per_worker: int = 8,
+        model_path: Optional[Path] = None,
+        chunk_size: int = 4,
+        max_pending_chunks: Optional[int] = None,
+        share_weights: bool = False,
+        constrained: bool = False
+    ):
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self.model_path = str(model_path) if model_path else None
+        self.chunk_size = chunk_size
+        self.share_weights = share_weights
+        self.constrained = constrained
+        self.generated_tokens = 0
+        self._generation = 0  # pro map()-Aufruf, trennt Ergebnisse abgebrochener Aufrufe
+
+        self._ctx = mp.get_context("fork" if share_weights else "spawn")
+        self._tasks = self._ctx.Queue(maxsize=max_pending_chunks or 2 * num_workers)
+        self._results = self._ctx.Queue()
+        self._workers: List[mp.Process] = []
+
+    def start(self):
+        if self.share_weights and inference.model is None:
+            inference.load_model(self.model_path)
+
+        for worker_id in range(self.num_workers):
+            worker = self._ctx.Process(
+                target=_worker_main,
+                args=(worker_id, self.threads_per_worker, self.model_path, self.constrained,
+                      self._tasks, self._results),
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+        return self
+
+    def close(self):
+        for _ in self._workers:
+            self._tasks.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _feed(self, questions: Iterable[str], generation: int, state: dict):
+        try:
+            chunk: List[str] = []
+            for question in questions:
+                chunk.append(question)
+                if len(chunk) == self.chunk_size:
+                    self._tasks.put((generation, state["chunks"], chunk))  # blockiert bei voller Queue
+                    state["chunks"] += 1
+                    chunk = []
+            if chunk:
+                self._tasks.put((generation, state["chunks"], chunk))
+                state["chunks"] += 1
+        except BaseException as e:
+            state["error"] = e
+        finally:
+            state["done"] = True  # Markierung: alle Chunks eingereiht (oder Fehler)
+
+    def map(self, questions: Iterable[str]) -> Iterator[str]:
+        """
+        Liefert Antworten in Originalreihenfolge (auch für Iteratoren).
+        Wirft RuntimeError, sobald ein Worker bei einem Chunk eine Exception meldet.
+        """
+        self._generation += 1
+        generation = self._generation
+        state = {"chunks": 0, "done": False, "error": None}
+        feeder = threading.Thread(target=self._feed, args=(questions, generation, state), daemon=True)
+        feeder.start()
+
+        pending = {}
+        next_chunk = 0
+        while True:
+            if state["done"]:
+                if state["error"] is not None:
+                    raise state["error"]
+                if next_chunk == state["chunks"]:
+                    break
+
+            try:
+                result_generation, chunk_id, answers, tokens, error = self._results.get(timeout=0.1)
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self._workers):
+                    raise RuntimeError("Ein Inferenz-Worker ist unerwartet beendet worden")
+                continue
+            if result_generation != generation:
+                continue  # verspätetes Ergebnis eines früher abgebrochenen map()-Aufrufs
+            if error is not None:
+                # Nicht als leere Antworten weiterreichen: wäre von ungültiger Modellausgabe
+                # nicht zu unterscheiden und zählte im Benchmark als erledigte Arbeit
+                raise RuntimeError(f"Worker-Fehler in Chunk {chunk_id}: {error}")
+            self.generated_tokens += tokens
+            pending[chunk_id] = answers
+
+            while next_chunk in pending:
+                yield from pending.pop(next_chunk)
+                next_chunk += 1
+
+        feeder.join()
+
+
+def benchmark_layouts(
+    questions: List[str],
+    layouts: List[Tuple[int, int]],
+    model_path: Optional[Path] = None,
+    chunk_size: int = 4,
+    share_weights: bool = False
+) -> List[dict]:
+    """Misst Durchsatz pro Aufteilung (workers, threads_per_worker); fehlerhafte Aufteilungen werden übersprungen"""
+    rows = []
+    for workers, threads in layouts:
+        with InferenceWorkerPool(workers, threads, model_path, chunk_size, share_weights=share_weights) as pool:
+            try:
+                # Aufwärmen: ein Chunk pro Worker (Modell-Laden nicht mitmessen)
+                list(pool.map(questions[:workers * chunk_size]))
+                pool.generated_tokens = 0
+
+                start = time.perf_counter()
+                answers = list(pool.map(questions))
+                elapsed = time.perf_counter() - start
+            except RuntimeError as e:
+                print(f"❌ {workers:>2} × {threads:>2} Threads: {e}")
+                continue
+
+        rows.append({
+            "workers": workers,
+            "threads": threads,
+            "questions": len(answers),
+            "seconds": elapsed,
+            "questions_per_second": len(answers) / elapsed,
+            "tokens_per_second": pool.generated_tokens / elapsed,
+        })
+        print(
+            f"📊 {workers:>2} × {threads:>2} Threads: "
+            f"{rows[-1]['questions_per_second']:.2f} Fragen/s, {rows[-1]['tokens_per_second']:.1f} Tokens/s"
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark workers × threads für CPU-Inferenz")
+    parser.add_argument("--layouts", default="1x8,2x4,4x2", help="z.B. 1x32,2x16,4x8")
+    parser.add_argument("--num-questions", type=int, default=32)
+    parser.add_argument("--chunk-size", type=int, default=4)
+    parser.add_argument("--model-path", type=Path, default=None)
+    parser.add_argument("--share-weights", action="store_true", help="Modell per fork teilen (Linux)")
+    args = parser.parse_args()
+
+    layouts = [tuple(int(x) for x in layout.split("x")) for layout in args.layouts.split(",")]
+    questions = [
+        f"Erstelle eine Multiple-Choice-Frage über IT-Sicherheit (Variante {i + 1})."
+        for i in range(args.num_questions)
+    ]
+
+    rows = benchmark_layouts(questions, layouts, args.model_path, args.chunk_size, args.share_weights)
+    if not rows:
+        raise SystemExit("❌ Keine Aufteilung lief fehlerfrei")
+    best = max(rows, key=lambda r: r["questions_per_second"])
+    print(f"🏆 Beste Aufteilung: {best['workers']} × {best['threads']} Threads")
+
+
+if __name__ == "__main__":
+    main()